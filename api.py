@@ -3,11 +3,20 @@ API para Papayas Tierlist
 Compatible con Render + Vercel (CORS arreglado)
 """
 
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
+from contextlib import contextmanager
+import functools
 import os
 import psycopg2
 
+import database
+import persistence
+import response_cache
+from circuit_breaker import CircuitBreaker
+from leaderboard import leaderboards
+from response_cache import api_cache
+
 app = Flask(__name__)
 
 # ✅ CORS CONFIGURADO PARA VERCEL
@@ -30,18 +39,159 @@ def after_request(response):
 # DATABASE
 # ===============================
 
-def get_db_connection():
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        return None
+# Conexiones del pool compartido (database.py): una por petición, de solo
+# lectura y con statement_timeout propio. Con la base de datos caída o lenta
+# el circuit breaker corta enseguida en vez de bloquear los hilos de Waitress
+API_DB_POOL_TIMEOUT = float(os.getenv("API_DB_POOL_TIMEOUT", 2))          # Segundos esperando conexión libre
+API_STATEMENT_TIMEOUT_MS = int(os.getenv("API_STATEMENT_TIMEOUT_MS", 3000))
+
+db_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("API_DB_FAILURE_THRESHOLD", 5)),
+    reset_timeout=float(os.getenv("API_DB_RESET_TIMEOUT", 30))
+)
+
+
+class DatabaseUnavailable(Exception):
+    """PostgreSQL no disponible: sin conexión, timeout o circuito abierto"""
+
+
+def get_db():
+    """Conexión de la petición actual (se devuelve al pool en el teardown)"""
+    if "db" in g:
+        return g.db
+
+    if not db_breaker.allow():
+        raise DatabaseUnavailable("circuito abierto")
+
+    conn = database.get_db_connection(timeout=API_DB_POOL_TIMEOUT)
+    if conn is None:
+        db_breaker.record_failure()
+        raise DatabaseUnavailable("sin conexión")
+    g.db = conn
+
+    # SET LOCAL: solo para esta transacción, el rollback al devolverla lo deshace
+    cur = conn.cursor()
+    cur.execute("SET TRANSACTION READ ONLY")
+    cur.execute("SET LOCAL statement_timeout = %s", (API_STATEMENT_TIMEOUT_MS,))
+    return conn
+
+
+@contextmanager
+def db_cursor():
+    """
+    with db_cursor() as cur: ... — caídas y timeouts (OperationalError, incluye
+    QueryCanceled) cuentan para el circuit breaker y salen como DatabaseUnavailable
+    """
     try:
-        return psycopg2.connect(
-            database_url,
-            sslmode="require"
-        )
-    except Exception as e:
-        print("DB Error:", e)
-        return None
+        yield get_db().cursor()
+    except psycopg2.OperationalError as e:
+        db_breaker.record_failure()
+        raise DatabaseUnavailable(str(e)) from e
+    except DatabaseUnavailable:
+        raise
+    except Exception:
+        # La base de datos respondió (error de la consulta, no de disponibilidad)
+        db_breaker.record_success()
+        raise
+    db_breaker.record_success()
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    conn = g.pop("db", None)
+    if conn is not None:
+        database.release_db_connection(conn)
+
+
+def database_unavailable_response(error, body=None):
+    response = jsonify(body or {"error": "Database unavailable", "detail": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(db_breaker.retry_after() or 1)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.errorhandler(DatabaseUnavailable)
+def handle_database_unavailable(error):
+    return database_unavailable_response(error)
+
+
+# ===============================
+# CACHE HTTP
+# ===============================
+
+# El CDN puede servir la copia vieja mientras revalida en segundo plano
+CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("API_CACHE_SWR", 60))
+
+
+def cache_headers(response, entry):
+    response.set_etag(entry.etag)
+    response.headers["Cache-Control"] = (
+        f"public, max-age={api_cache.ttl}, "
+        f"stale-while-revalidate={CACHE_STALE_WHILE_REVALIDATE}"
+    )
+    response.headers["Age"] = str(entry.age())
+    return response
+
+
+def cached(view):
+    """
+    Cachea la respuesta de una ruta GET (clave = ruta + query string).
+    Solo se guardan respuestas 200; responde 304 si el ETag coincide.
+    Si PostgreSQL no está disponible sirve la última respuesta guardada
+    aunque haya caducado (X-Cache: STALE), o 503 si no hay ninguna.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = response_cache.make_key(request.path, request.args)
+        entry = api_cache.get(key)
+        status = "HIT"
+
+        if entry is None:
+            status = "MISS"
+            generation = api_cache.generation
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except DatabaseUnavailable as e:
+                entry = api_cache.get_stale(key)
+                if entry is None:
+                    return database_unavailable_response(e)
+                response = app.response_class(entry.body, mimetype=entry.mimetype)
+                response.headers["X-Cache"] = "STALE"
+                response.headers["Age"] = str(entry.age())
+                # Que el CDN no guarde la copia vieja
+                response.headers["Cache-Control"] = "no-cache"
+                return response
+            if response.status_code != 200:
+                response.headers["Cache-Control"] = "no-store"
+                return response
+            entry = api_cache.set(key, response.get_data(), response.mimetype, generation)
+
+        if request.if_none_match.contains(entry.etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(entry.body, mimetype=entry.mimetype)
+        response.headers["X-Cache"] = status
+        return cache_headers(response, entry)
+
+    return wrapper
+
+
+# ===============================
+# HELPERS
+# ===============================
+
+def build_modalidades(tiers_json, puntos_json):
+    mods = {}
+    if tiers_json:
+        for m, t in tiers_json.items():
+            p = puntos_json.get(m, 0) if puntos_json else 0
+            mods[m] = {
+                "tier": t,
+                "tier_display": t,
+                "puntos": p
+            }
+    return mods
 
 
 # ===============================
@@ -58,81 +208,180 @@ def home():
 
 @app.route("/health")
 def health():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"status": "error", "database": "disconnected"}), 500
-
+    # Solo comprueba que hay conexión: los totales están en /api/stats
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM resultados")
-        count = cur.fetchone()[0]
-        conn.close()
-        return jsonify({"status": "ok", "total_tests": count})
-    except:
-        conn.close()
-        return jsonify({"status": "error"}), 500
+        with db_cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        return jsonify({"status": "ok", "database": "ok"})
+    except DatabaseUnavailable as e:
+        return database_unavailable_response(e, {
+            "status": "error",
+            "database": "unavailable",
+            "detail": str(e),
+            "circuit": db_breaker.state
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "detail": str(e)}), 500
+
+
+RANKING_FIELDS = ("id", "name", "points", "mode_points", "es_premium", "modalidades")
+MAX_RANKING_LIMIT = 500
+
+
+def parse_ranking_args(args):
+    """Lee limit/offset/premium/tier/fields de la query string (ValueError si no son válidos)"""
+    limit = args.get("limit", type=int)
+    if "limit" in args and limit is None:
+        raise ValueError("limit debe ser un número")
+    if limit is not None:
+        limit = max(1, min(limit, MAX_RANKING_LIMIT))
+
+    offset = args.get("offset", 0, type=int)
+    if offset is None or offset < 0:
+        raise ValueError("offset debe ser un número >= 0")
+
+    premium = args.get("premium")
+    if premium is not None and premium not in ("si", "no"):
+        raise ValueError("premium debe ser 'si' o 'no'")
+
+    tier = args.get("tier") or None
+
+    fields = RANKING_FIELDS
+    if args.get("fields"):
+        fields = tuple(f.strip() for f in args["fields"].split(",") if f.strip())
+        unknown = [f for f in fields if f not in RANKING_FIELDS]
+        if unknown:
+            raise ValueError(f"Campos no válidos: {', '.join(unknown)}")
+
+    return limit, offset, premium, tier, fields
+
+
+def ranking_entry(fields, did, name, points, mode_points, premium, tiers_json, puntos_json):
+    """Fila del ranking con solo los campos pedidos (fields=)"""
+    entry = {}
+    for field in fields:
+        if field == "id":
+            entry["id"] = did
+        elif field == "name":
+            entry["name"] = name
+        elif field == "points":
+            entry["points"] = points or 0
+        elif field == "mode_points":
+            entry["mode_points"] = mode_points or 0
+        elif field == "es_premium":
+            entry["es_premium"] = "si" if premium == "si" else "no"
+        elif field == "modalidades":
+            entry["modalidades"] = build_modalidades(tiers_json, puntos_json)
+    return entry
+
+
+def query_rankings_db(cur, mode, limit, offset, premium, tier, with_modalidades):
+    """Filtra, ordena y pagina en SQL. Devuelve (filas, total)"""
+    where = []
+    params = []
+
+    if mode == "overall":
+        mode_points_sql = "puntos_totales"
+        if tier:
+            where.append("EXISTS (SELECT 1 FROM jsonb_each_text(tier_por_modalidad) t WHERE t.value = %s)")
+            params.append(tier)
+    else:
+        mode_points_sql = "COALESCE((puntos_por_modalidad->>%s)::int, 0)"
+        where.append("tier_por_modalidad ? %s")
+        params.append(mode)
+        if tier:
+            where.append("tier_por_modalidad->>%s = %s")
+            params.extend([mode, tier])
+
+    if premium == "si":
+        where.append("es_premium = 'si'")
+    elif premium == "no":
+        where.append("COALESCE(es_premium, 'no') <> 'si'")
+
+    json_columns = "tier_por_modalidad, puntos_por_modalidad" if with_modalidades else "NULL, NULL"
+    select_params = [mode] if mode != "overall" else []
+
+    sql = f"""
+        SELECT discord_id, nick_mc, discord_name, puntos_totales, es_premium,
+               {mode_points_sql} AS mode_points,
+               {json_columns},
+               COUNT(*) OVER () AS total
+        FROM jugadores
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY mode_points DESC, discord_id
+        LIMIT %s OFFSET %s
+    """
+    cur.execute(sql, select_params + params + [limit, offset])
+    rows = cur.fetchall()
+
+    if rows:
+        total = rows[0][-1]
+    elif offset:
+        # Página fuera de rango: contar aparte
+        cur.execute(
+            f"SELECT COUNT(*) FROM jugadores {'WHERE ' + ' AND '.join(where) if where else ''}",
+            params
+        )
+        total = cur.fetchone()[0]
+    else:
+        total = 0
+
+    return rows, total
 
 
 @app.route("/api/rankings/<mode>")
+@cached
 def get_rankings(mode):
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"mode": mode, "players": [], "total_players": 0})
-
     try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT discord_id, nick_mc, discord_name,
-                   tier_por_modalidad, puntos_por_modalidad,
-                   puntos_totales, es_premium
-            FROM jugadores
-            ORDER BY puntos_totales DESC
-        """)
-
-        rows = cur.fetchall()
-        players_list = []
-
-        for row in rows:
-            did, nick, dname, tiers_json, puntos_json, ptotal, premium = row
+        limit, offset, premium, tier, fields = parse_ranking_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Ranking ya ordenado en memoria (bot en el mismo proceso): sin tocar PostgreSQL
+    if leaderboards.ready:
+        rows, total = leaderboards.query(mode, offset, limit, premium=premium, tier=tier)
+        players_list = [
+            ranking_entry(
+                fields, did, jugador.nick_mc or jugador.discord_name,
+                jugador.puntos_totales, mode_points, jugador.es_premium,
+                jugador.tier_por_modalidad, jugador.puntos_por_modalidad
+            )
+            for did, mode_points, jugador in rows
+        ]
 
-            mods = {}
-            if tiers_json:
-                for m, t in tiers_json.items():
-                    p = puntos_json.get(m, 0) if puntos_json else 0
-                    mods[m] = {
-                        "tier": t,
-                        "tier_display": t,
-                        "puntos": p
-                    }
-
-            if mode != "overall" and mode not in mods:
-                continue
-
-            sort_points = ptotal if mode == "overall" else mods.get(mode, {}).get("puntos", 0)
-
-            players_list.append({
-                "id": did,
-                "name": nick or dname,
-                "points": ptotal or 0,
-                "mode_points": sort_points,
-                "es_premium": "si" if premium == "si" else "no",
-                "modalidades": mods
-            })
+        return jsonify({
+            "mode": mode,
+            "players": players_list,
+            "total_players": total,
+            "limit": limit,
+            "offset": offset
+        })
 
-        if mode != "overall":
-            players_list.sort(key=lambda x: x["mode_points"], reverse=True)
+    try:
+        with db_cursor() as cur:
+            rows, total = query_rankings_db(
+                cur, mode, limit, offset, premium, tier,
+                with_modalidades="modalidades" in fields
+            )
 
-        conn.close()
+        players_list = [
+            ranking_entry(fields, did, nick or dname, ptotal, mode_points, premium_value, tiers_json, puntos_json)
+            for did, nick, dname, ptotal, premium_value, mode_points, tiers_json, puntos_json, _ in rows
+        ]
 
         return jsonify({
             "mode": mode,
             "players": players_list,
-            "total_players": len(players_list)
+            "total_players": total,
+            "limit": limit,
+            "offset": offset
         })
 
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
-        conn.close()
         return jsonify({
             "mode": mode,
             "players": [],
@@ -141,79 +390,110 @@ def get_rankings(mode):
         }), 500
 
 
-@app.route("/api/player/<discord_id>")
-def get_player(discord_id):
+def player_payload(did, nick, dname, tiers_json, puntos_json, ptotal, premium, positions):
+    tiers_dict = {}
+    if tiers_json:
+        for m, t in tiers_json.items():
+            p = puntos_json.get(m, 0) if puntos_json else 0
+            tiers_dict[m] = {"tier": t, "puntos": p}
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database error"}), 500
+    return {
+        "id": did,
+        "nick": nick,
+        "discord_name": dname,
+        "position": positions.get("overall"),
+        "positions": positions,
+        "total_points": ptotal or 0,
+        "tiers": tiers_dict,
+        "es_premium": premium
+    }
 
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT discord_id, nick_mc, discord_name,
-                   tier_por_modalidad, puntos_por_modalidad,
-                   puntos_totales, es_premium
-            FROM jugadores
-            WHERE discord_id = %s
-        """, (discord_id,))
 
-        row = cur.fetchone()
-        if not row:
-            conn.close()
-            return jsonify({"error": "Player not found"}), 404
+@app.route("/api/player/<discord_id>")
+@cached
+def get_player(discord_id):
 
-        did, nick, dname, tiers_json, puntos_json, ptotal, premium = row
+    # Jugador en el ranking en memoria: perfil y posiciones sin tocar PostgreSQL
+    jugador = leaderboards.get_player(discord_id) if leaderboards.ready else None
+    if jugador:
+        return jsonify(player_payload(
+            discord_id, jugador.nick_mc, jugador.discord_name,
+            jugador.tier_por_modalidad, jugador.puntos_por_modalidad,
+            jugador.puntos_totales, jugador.es_premium,
+            leaderboards.positions(discord_id)
+        ))
 
-        cur.execute("SELECT COUNT(*) + 1 FROM jugadores WHERE puntos_totales > %s", (ptotal,))
-        pos = cur.fetchone()[0]
+    try:
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT discord_id, nick_mc, discord_name,
+                       tier_por_modalidad, puntos_por_modalidad,
+                       puntos_totales, es_premium
+                FROM jugadores
+                WHERE discord_id = %s
+            """, (discord_id,))
+
+            row = cur.fetchone()
+            if not row:
+                return jsonify({"error": "Player not found"}), 404
 
-        tiers_dict = {}
-        if tiers_json:
-            for m, t in tiers_json.items():
-                p = puntos_json.get(m, 0) if puntos_json else 0
-                tiers_dict[m] = {"tier": t, "puntos": p}
+            did, nick, dname, tiers_json, puntos_json, ptotal, premium = row
 
-        conn.close()
+            # Misma regla de empates que el bot: 1 + jugadores con más puntos
+            positions = database.query_posiciones(cur, ptotal, tiers_json, puntos_json)
 
-        return jsonify({
-            "id": did,
-            "nick": nick,
-            "discord_name": dname,
-            "position": pos,
-            "total_points": ptotal or 0,
-            "tiers": tiers_dict,
-            "es_premium": premium
-        })
+        return jsonify(player_payload(did, nick, dname, tiers_json, puntos_json, ptotal, premium, positions))
 
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
-        conn.close()
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/stats")
+@cached
 def get_stats():
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database error"}), 500
-
     try:
-        cur = conn.cursor()
-
-        cur.execute("SELECT COUNT(*) FROM resultados")
-        total_tests = cur.fetchone()[0]
+        with db_cursor() as cur:
+            # tester_stats conserva también los meses archivados (desenganchados)
+            cur.execute("SELECT COALESCE(SUM(tests), 0) FROM tester_stats")
+            total_tests = cur.fetchone()[0]
 
-        cur.execute("SELECT COUNT(*) FROM jugadores")
-        total_players = cur.fetchone()[0]
-
-        conn.close()
+            cur.execute("SELECT COUNT(*) FROM jugadores")
+            total_players = cur.fetchone()[0]
 
         return jsonify({
             "total_tests": total_tests,
             "total_players": total_players
         })
 
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
-        conn.close()
         return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/metrics/persistence")
+def get_persistence_metrics():
+    # Solo disponible si el bot corre en el mismo proceso (main.py)
+    metrics = persistence.get_metrics()
+    if metrics is None:
+        return jsonify({"status": "inactive"})
+
+    return jsonify({"status": "ok", **metrics})
+
+
+@app.route("/api/metrics/cache")
+def get_cache_metrics():
+    return jsonify({"status": "ok", **api_cache.metrics()})
+
+
+@app.route("/api/metrics/database")
+def get_database_metrics():
+    return jsonify({
+        "status": "ok",
+        "circuit": db_breaker.metrics(),
+        "statement_timeout_ms": API_STATEMENT_TIMEOUT_MS,
+        "pool_timeout": API_DB_POOL_TIMEOUT
+    })
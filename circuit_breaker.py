@@ -0,0 +1,102 @@
+"""
+Circuit breaker para Papayas Tierlist
+Si PostgreSQL falla varias veces seguidas, la API deja de intentarlo durante
+un rato y responde al momento (caché vieja o 503) en vez de dejar sus hilos
+de Waitress esperando a una base de datos caída o lenta
+"""
+
+import math
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """
+    closed -> open tras `failure_threshold` fallos seguidos; pasados
+    `reset_timeout` segundos pasa a half_open y deja pasar una sola petición
+    de prueba, que lo cierra (éxito) o lo vuelve a abrir (fallo)
+
+    Seguro entre hilos (hilos de Waitress).
+
+    Uso:
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        if not breaker.allow():
+            ...responder sin base de datos...
+        breaker.record_success()   # o breaker.record_failure()
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False   # Petición de prueba en vuelo (half_open)
+
+        # Métricas
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """True si la petición puede ir a la base de datos"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self._state = HALF_OPEN
+                self._trial = False
+            if self._trial:
+                self.rejected += 1
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def retry_after(self):
+        """Segundos hasta el próximo intento (0 si está cerrado)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            return max(0, math.ceil(remaining))
+
+    def metrics(self):
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'failures': self._failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout
+            }
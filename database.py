@@ -4,95 +4,838 @@ Guarda resultados en PostgreSQL para persistencia permanente
 """
 
 import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
 import os
+import io
+import csv
+import gzip
 import json
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-def get_db_connection():
-    """Obtiene conexión a PostgreSQL con SSL (requerido por Render)"""
+# === POOL DE CONEXIONES ===
+# Tamaño configurable por variables de entorno
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))          # Segundos esperando una conexión libre
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))  # Ping solo si la conexión lleva X segundos sin usarse
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used = {}  # {id(conn): time.monotonic()}
+
+def _create_pool():
+    """Crea el pool de conexiones a PostgreSQL con SSL (requerido por Render)"""
     database_url = os.getenv("DATABASE_URL")
 
     if not database_url:
         print("❌ No se encontró DATABASE_URL")
         return None
 
-    print("🔗 Conectando a PostgreSQL...")
+    print(f"🔗 Creando pool PostgreSQL ({DB_POOL_MIN}-{DB_POOL_MAX} conexiones)...")
 
     try:
-        conn = psycopg2.connect(
+        new_pool = pg_pool.ThreadedConnectionPool(
+            DB_POOL_MIN,
+            DB_POOL_MAX,
             database_url,
             sslmode="require",  # IMPORTANTE PARA RENDER
             connect_timeout=10,
             options='-c statement_timeout=30000'
         )
-        print("✅ Conexión exitosa")
-        return conn
+        print("✅ Pool de conexiones creado")
+        return new_pool
     except Exception as e:
         print(f"❌ Error conectando a PostgreSQL: {e}")
         return None
 
-def init_database():
-    """Inicializa las tablas de la base de datos"""
+def get_pool():
+    """Devuelve el pool compartido, creándolo (o recreándolo) si hace falta"""
+    global _pool
+    if _pool is not None and not _pool.closed:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = _create_pool()
+        return _pool
+
+def _connection_is_healthy(conn):
+    """Comprueba que una conexión del pool sigue viva antes de entregarla"""
+    if conn.closed:
+        return False
+
+    # Conexiones usadas recientemente se dan por buenas (evita un round trip extra)
+    last_used = _last_used.get(id(conn))
+    if last_used is not None and time.monotonic() - last_used < DB_POOL_PING_INTERVAL:
+        return True
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+def get_db_connection(timeout=None):
+    """
+    Obtiene una conexión sana del pool (devolver con release_db_connection)
+
+    Args:
+        timeout: segundos esperando una conexión libre (None = DB_POOL_TIMEOUT)
+    """
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT if timeout is None else timeout):
+        print("❌ Pool de PostgreSQL agotado (timeout esperando conexión)")
+        return None
+
+    try:
+        # Un intento por conexión posible: las rotas se descartan y se abre otra
+        for _ in range(DB_POOL_MAX + 1):
+            db_pool = get_pool()
+            if db_pool is None:
+                break
+
+            try:
+                conn = db_pool.getconn()
+            except Exception as e:
+                print(f"❌ Error obteniendo conexión del pool: {e}")
+                break
+
+            if _connection_is_healthy(conn):
+                return conn
+
+            # Conexión muerta: cerrarla y reconectar
+            print("⚠️ Conexión PostgreSQL caída, reconectando...")
+            _last_used.pop(id(conn), None)
+            try:
+                db_pool.putconn(conn, close=True)
+            except Exception:
+                pass
+    except Exception as e:
+        print(f"❌ Error conectando a PostgreSQL: {e}")
+
+    _pool_slots.release()
+    return None
+
+def release_db_connection(conn):
+    """Devuelve una conexión al pool (la descarta si quedó rota)"""
+    if conn is None:
+        return
+
+    broken = bool(conn.closed)
+    if not broken:
+        try:
+            # No dejar transacciones abiertas en conexiones reutilizadas
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            broken = True
+
+    try:
+        if broken:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        db_pool = _pool
+        if db_pool is not None and not db_pool.closed:
+            db_pool.putconn(conn, close=broken)
+        else:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ Error devolviendo conexión al pool: {e}")
+    finally:
+        _pool_slots.release()
+
+@contextmanager
+def db_connection():
+    """Context manager: with db_connection() as conn (conn puede ser None)"""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        release_db_connection(conn)
+
+def close_pool():
+    """Cierra todas las conexiones del pool (al apagar)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
+
+# === MIGRACIONES ===
+# Modalidades con índice propio para el ranking por modalidad (mismas que MODE_EMOJIS del bot)
+MODALIDADES = ('Mace', 'Sword', 'UHC', 'Crystal', 'NethOP', 'SMP', 'Axe', 'Dpot')
+
+# Clave del advisory lock: si bot y API arrancan a la vez, solo uno migra
+MIGRATION_LOCK_ID = 72731001
+
+def _migration_base_tables(cur):
+    # Tabla de resultados (lo MÁS IMPORTANTE)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS resultados (
+            id SERIAL PRIMARY KEY,
+            nick_mc VARCHAR(100),
+            jugador_id VARCHAR(50) NOT NULL,
+            jugador_name VARCHAR(100),
+            tester_id VARCHAR(50) NOT NULL,
+            tester_name VARCHAR(100),
+            modalidad VARCHAR(50),
+            tier_antiguo VARCHAR(10),
+            tier_nuevo VARCHAR(10),
+            puntos_obtenidos INTEGER,
+            puntos_totales INTEGER,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Tabla de jugadores
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS jugadores (
+            discord_id VARCHAR(50) PRIMARY KEY,
+            nick_mc VARCHAR(100),
+            discord_name VARCHAR(100),
+            tier_por_modalidad JSONB,
+            puntos_por_modalidad JSONB,
+            puntos_totales INTEGER DEFAULT 0,
+            es_premium VARCHAR(10)
+        )
+    """)
+    
+    # Tabla de cooldowns
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cooldowns (
+            id SERIAL PRIMARY KEY,
+            jugador_id VARCHAR(50) NOT NULL,
+            modalidad VARCHAR(50) NOT NULL,
+            start_date TIMESTAMP,
+            end_date TIMESTAMP,
+            UNIQUE(jugador_id, modalidad)
+        )
+    """)
+
+def _migration_hot_indexes(cur):
+    # delete_tester_resultados / get_tester_stats
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resultados_tester_id ON resultados (tester_id)")
+    # get_all_resultados (ORDER BY fecha DESC)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resultados_fecha ON resultados (fecha DESC)")
+    # Rankings overall y posición en /miperfil
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jugadores_puntos_totales ON jugadores (puntos_totales DESC)")
+    # get_active_cooldowns / delete_expired_cooldowns
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_cooldowns_end_date ON cooldowns (end_date)")
+
+def _migration_mode_ranking_indexes(cur):
+    # WHERE tier_por_modalidad ? 'modo' (y filtros por tier) para cualquier modalidad
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jugadores_tiers_gin ON jugadores USING GIN (tier_por_modalidad)")
+    
+    # Ranking de cada modalidad ya ordenado: índice parcial sobre la expresión del ORDER BY
+    for modo in MODALIDADES:
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_jugadores_puntos_{modo.lower()}
+            ON jugadores ((COALESCE((puntos_por_modalidad->>%s)::int, 0)) DESC)
+            WHERE tier_por_modalidad ? %s
+        """, (modo, modo))
+
+# Contadores de tests por (tester, modalidad, mes) a partir de filas de resultados.
+# Sin modalidad -> '' y sin fecha -> '' (forman parte de la clave primaria)
+_TESTER_STATS_GROUP = """
+    SELECT tester_id,
+           COALESCE(modalidad, '') AS modalidad,
+           COALESCE(TO_CHAR(fecha, 'YYYY-MM'), '') AS year_month,
+           (ARRAY_AGG(tester_name ORDER BY fecha DESC NULLS LAST))[1] AS tester_name,
+           COUNT(*) AS tests
+    FROM {source}
+    GROUP BY 1, 2, 3
+"""
+
+def _migration_tester_stats(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tester_stats (
+            tester_id VARCHAR(50) NOT NULL,
+            modalidad VARCHAR(50) NOT NULL DEFAULT '',
+            year_month VARCHAR(7) NOT NULL DEFAULT '',
+            tester_name VARCHAR(100),
+            tests INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tester_id, modalidad, year_month)
+        )
+    """)
+    
+    # Triggers por sentencia con tablas de transición: un INSERT multi-fila
+    # (add_resultados) o un DELETE masivo (delete_tester_resultados) actualiza
+    # cada grupo una sola vez, no una vez por fila
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION tester_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE tester_stats s
+                SET tests = s.tests - d.tests
+                FROM ({_TESTER_STATS_GROUP.format(source='viejos')}) d
+                WHERE s.tester_id = d.tester_id
+                  AND s.modalidad = d.modalidad
+                  AND s.year_month = d.year_month;
+                DELETE FROM tester_stats WHERE tests <= 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO tester_stats (tester_id, modalidad, year_month, tester_name, tests)
+                SELECT tester_id, modalidad, year_month, tester_name, tests
+                FROM ({_TESTER_STATS_GROUP.format(source='nuevos')}) n
+                ON CONFLICT (tester_id, modalidad, year_month) DO UPDATE SET
+                    tests = tester_stats.tests + EXCLUDED.tests,
+                    tester_name = COALESCE(EXCLUDED.tester_name, tester_stats.tester_name);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    _create_tester_stats_triggers(cur, "resultados")
+    
+    # Rellenar con el historial existente
+    cur.execute("DELETE FROM tester_stats")
+    cur.execute(f"""
+        INSERT INTO tester_stats (tester_id, modalidad, year_month, tester_name, tests)
+        SELECT tester_id, modalidad, year_month, tester_name, tests
+        FROM ({_TESTER_STATS_GROUP.format(source='resultados')}) r
+    """)
+
+def _create_tester_stats_triggers(cur, table):
+    # Una tabla de transición solo admite un evento por trigger: tres triggers, una función
+    cur.execute(f"""
+        DROP TRIGGER IF EXISTS tester_stats_insert ON {table};
+        DROP TRIGGER IF EXISTS tester_stats_delete ON {table};
+        DROP TRIGGER IF EXISTS tester_stats_update ON {table};
+        CREATE TRIGGER tester_stats_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS nuevos
+            FOR EACH STATEMENT EXECUTE FUNCTION tester_stats_apply();
+        CREATE TRIGGER tester_stats_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS viejos
+            FOR EACH STATEMENT EXECUTE FUNCTION tester_stats_apply();
+        CREATE TRIGGER tester_stats_update AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+            FOR EACH STATEMENT EXECUTE FUNCTION tester_stats_apply();
+    """)
+
+def _migration_partition_resultados(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = 'resultados'::regclass")
+    if cur.fetchone()[0] == 'p':
+        return  # Ya particionada
+
+    # La tabla vieja se copia y se borra; la secuencia se conserva para no repetir ids
+    cur.execute("ALTER TABLE resultados RENAME TO resultados_sin_particionar")
+    cur.execute("SELECT pg_get_serial_sequence('resultados_sin_particionar', 'id')")
+    secuencia = cur.fetchone()[0]
+    cur.execute(f"ALTER SEQUENCE {secuencia} OWNED BY NONE")
+
+    # Sin PRIMARY KEY: en una tabla particionada tendría que incluir fecha, que
+    # puede ser NULL (esas filas van a la partición por defecto). El id sigue
+    # saliendo de la secuencia y tiene su índice
+    cur.execute(f"""
+        CREATE TABLE resultados (
+            id INTEGER NOT NULL DEFAULT nextval('{secuencia}'),
+            nick_mc VARCHAR(100),
+            jugador_id VARCHAR(50) NOT NULL,
+            jugador_name VARCHAR(100),
+            tester_id VARCHAR(50) NOT NULL,
+            tester_name VARCHAR(100),
+            modalidad VARCHAR(50),
+            tier_antiguo VARCHAR(10),
+            tier_nuevo VARCHAR(10),
+            puntos_obtenidos INTEGER,
+            puntos_totales INTEGER,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (fecha)
+    """)
+    cur.execute("CREATE TABLE resultados_default PARTITION OF resultados DEFAULT")
+
+    # Particiones de todos los meses con historial (y los próximos) antes de copiar
+    cur.execute("""
+        SELECT DISTINCT TO_CHAR(fecha, 'YYYY-MM') FROM resultados_sin_particionar
+        WHERE fecha IS NOT NULL
+    """)
+    meses = {_parse_year_month(row[0]) for row in cur.fetchall()}
+    _ensure_partitions(cur, meses | set(_upcoming_months(RESULTADOS_MONTHS_AHEAD)))
+
+    # Los triggers de tester_stats se crean después: la copia no cuenta dos veces
+    cur.execute(f"""
+        INSERT INTO resultados ({_RESULTADO_COLUMNS_WITH_ID})
+        SELECT {_RESULTADO_COLUMNS_WITH_ID} FROM resultados_sin_particionar
+    """)
+    cur.execute("DROP TABLE resultados_sin_particionar")
+    cur.execute(f"ALTER SEQUENCE {secuencia} OWNED BY resultados.id")
+
+    # Índices en la tabla padre: se crean en cada partición (y en las futuras)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resultados_id ON resultados (id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resultados_tester_id ON resultados (tester_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resultados_fecha ON resultados (fecha DESC)")
+    _create_tester_stats_triggers(cur, "resultados")
+
+    # Catálogo de meses exportados por archive_resultados_partitions
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS resultados_archivo (
+            year_month VARCHAR(7) PRIMARY KEY,
+            archivo VARCHAR(300) NOT NULL,
+            filas INTEGER NOT NULL,
+            desenganchada BOOLEAN NOT NULL DEFAULT TRUE,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# Lista ordenada (versión, descripción, función). Nunca modificar una migración
+# ya publicada: añadir una nueva al final
+MIGRATIONS = [
+    (1, "Tablas base (resultados, jugadores, cooldowns)", _migration_base_tables),
+    (2, "Índices de consultas frecuentes", _migration_hot_indexes),
+    (3, "Índices de ranking por modalidad (GIN + parciales)", _migration_mode_ranking_indexes),
+    (4, "Tabla tester_stats mantenida por triggers", _migration_tester_stats),
+    (5, "resultados particionada por mes", _migration_partition_resultados),
+]
+
+def _applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(200),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cur.fetchall()}
+
+def run_migrations():
+    """
+    Aplica en orden las migraciones pendientes, cada una en su transacción
+    
+    Returns:
+        bool: True si el esquema quedó al día
+    """
     conn = get_db_connection()
     if not conn:
         return False
     
+    locked = False
     try:
         cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        locked = True
         
-        # Tabla de resultados (lo MÁS IMPORTANTE)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS resultados (
-                id SERIAL PRIMARY KEY,
-                nick_mc VARCHAR(100),
-                jugador_id VARCHAR(50) NOT NULL,
-                jugador_name VARCHAR(100),
-                tester_id VARCHAR(50) NOT NULL,
-                tester_name VARCHAR(100),
-                modalidad VARCHAR(50),
-                tier_antiguo VARCHAR(10),
-                tier_nuevo VARCHAR(10),
-                puntos_obtenidos INTEGER,
-                puntos_totales INTEGER,
-                fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        applied = _applied_versions(cur)
+        conn.commit()
         
-        # Tabla de jugadores
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS jugadores (
-                discord_id VARCHAR(50) PRIMARY KEY,
-                nick_mc VARCHAR(100),
-                discord_name VARCHAR(100),
-                tier_por_modalidad JSONB,
-                puntos_por_modalidad JSONB,
-                puntos_totales INTEGER DEFAULT 0,
-                es_premium VARCHAR(10)
+        for version, description, migration in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                migration(cur)
+                cur.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                print(f"✅ Migración {version} aplicada: {description}")
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error en migración {version} ({description}): {e}")
+                return False
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error aplicando migraciones: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if locked:
+            try:
+                conn.cursor().execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+        release_db_connection(conn)
+
+def get_schema_version():
+    """Última migración aplicada (0 si no hay ninguna)"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cur.fetchone()[0]
+    except Exception:
+        conn.rollback()
+        return 0
+    finally:
+        release_db_connection(conn)
+
+def init_database():
+    """Inicializa las tablas de la base de datos (aplica las migraciones pendientes)"""
+    if not run_migrations():
+        return False
+    # Particiones de los próximos meses (no es fatal: sin ellas se usa la de por defecto)
+    ensure_resultados_partitions()
+    print("✅ Base de datos inicializada correctamente")
+    return True
+
+# === PARTICIONES MENSUALES DE RESULTADOS ===
+# resultados_YYYY_MM con [día 1 del mes, día 1 del siguiente); lo que no
+# encaja (fecha NULL, meses sin partición) cae en resultados_default
+RESULTADOS_MONTHS_AHEAD = int(os.getenv("RESULTADOS_MONTHS_AHEAD", "2"))
+RESULTADOS_RETENTION_MONTHS = int(os.getenv("RESULTADOS_RETENTION_MONTHS", "24"))
+RESULTADOS_ARCHIVE_DIR = os.getenv("RESULTADOS_ARCHIVE_DIR", "archivo_resultados")
+
+def _partition_name(year, month):
+    # Solo se forma con enteros: seguro para interpolar en el SQL
+    return f"resultados_{int(year):04d}_{int(month):02d}"
+
+def _add_months(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+def _upcoming_months(months_ahead):
+    """Mes actual y los `months_ahead` siguientes como (año, mes)"""
+    now = datetime.now()
+    return [_add_months(now.year, now.month, delta) for delta in range(months_ahead + 1)]
+
+def _list_partitions(cur):
+    """{(año, mes): nombre} de las particiones mensuales enganchadas a resultados"""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'resultados'::regclass
+    """)
+    partitions = {}
+    for (name,) in cur.fetchall():
+        parts = name.split('_')
+        if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+            partitions[(int(parts[1]), int(parts[2]))] = name
+    return partitions
+
+def _ensure_partitions(cur, months):
+    """
+    Crea las particiones que falten para `months`. Las filas de ese mes que
+    estén en resultados_default se mueven a la nueva antes de engancharla
+    (sin pasar por la tabla padre: los triggers de tester_stats no se disparan)
+    """
+    existing = _list_partitions(cur)
+    created = []
+    for year, month in sorted(months):
+        if (year, month) in existing:
+            continue
+        name = _partition_name(year, month)
+        desde = f"{year:04d}-{month:02d}-01"
+        hasta = "{:04d}-{:02d}-01".format(*_add_months(year, month, 1))
+        cur.execute(f"CREATE TABLE {name} (LIKE resultados INCLUDING DEFAULTS)")
+        cur.execute(f"""
+            WITH movidas AS (
+                DELETE FROM resultados_default
+                WHERE fecha >= %s AND fecha < %s
+                RETURNING *
             )
+            INSERT INTO {name} SELECT * FROM movidas
+        """, (desde, hasta))
+        cur.execute(
+            f"ALTER TABLE resultados ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+            (desde, hasta)
+        )
+        created.append(name)
+    return created
+
+def ensure_resultados_partitions(months_ahead=RESULTADOS_MONTHS_AHEAD):
+    """
+    Crea las particiones del mes actual y los próximos, y las de los meses
+    que hayan caído en resultados_default (importaciones de historial)
+
+    Returns:
+        list: Nombres de las particiones creadas (None si falla)
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
+        # Bot y API pueden arrancar a la vez: que solo uno cree particiones
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        cur.execute("""
+            SELECT DISTINCT TO_CHAR(fecha, 'YYYY-MM') FROM resultados_default
+            WHERE fecha IS NOT NULL
         """)
-        
-        # Tabla de cooldowns
+        months = {_parse_year_month(row[0]) for row in cur.fetchall()}
+        created = _ensure_partitions(cur, months | set(_upcoming_months(months_ahead)))
+        conn.commit()
+        for name in created:
+            print(f"🗂️ Partición creada: {name}")
+        return created
+    except Exception as e:
+        print(f"❌ Error creando particiones de resultados: {e}")
+        conn.rollback()
+        return None
+    finally:
+        release_db_connection(conn)
+
+def list_resultados_partitions():
+    """[(nombre, 'YYYY-MM', filas aproximadas)] de las particiones enganchadas"""
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    try:
+        cur = conn.cursor()
+        partitions = _list_partitions(cur)
+        names = [partitions[month] for month in sorted(partitions)]
+        cur.execute(
+            "SELECT relname, GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = ANY(%s)",
+            (names,)
+        )
+        rows = dict(cur.fetchall())
+        return [(partitions[month], f"{month[0]:04d}-{month[1]:02d}", rows.get(partitions[month], 0))
+                for month in sorted(partitions)]
+    except Exception as e:
+        print(f"❌ Error listando particiones: {e}")
+        return []
+    finally:
+        release_db_connection(conn)
+
+def get_archived_months():
+    """
+    Meses archivados y desenganchados de resultados (no salen en
+    get_all_resultados ni en /backup): [{'year_month', 'archivo', 'filas'}]
+
+    Returns:
+        list (None si falla la consulta)
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS cooldowns (
-                id SERIAL PRIMARY KEY,
-                jugador_id VARCHAR(50) NOT NULL,
-                modalidad VARCHAR(50) NOT NULL,
-                start_date TIMESTAMP,
-                end_date TIMESTAMP,
-                UNIQUE(jugador_id, modalidad)
-            )
+            SELECT year_month, archivo, filas FROM resultados_archivo
+            WHERE desenganchada ORDER BY year_month
         """)
-        
+        return [{'year_month': row[0], 'archivo': row[1], 'filas': row[2]} for row in cur.fetchall()]
+    except Exception as e:
+        print(f"❌ Error listando meses archivados: {e}")
+        return None
+    finally:
+        release_db_connection(conn)
+
+def archive_resultados_partitions(retention_months=RESULTADOS_RETENTION_MONTHS,
+                                  directory=RESULTADOS_ARCHIVE_DIR, detach=True, drop=False):
+    """
+    Exporta a JSONL comprimido (directory/resultados_YYYY_MM.jsonl.gz) las
+    particiones de meses anteriores a la retención y las desengancha
+
+    tester_stats conserva los contadores de los meses desenganchados (DETACH
+    no dispara triggers), así /toptester sigue contando todo el historial.
+    Un archivo se puede volver a cargar con import_resultados (después,
+    borrar su fila de resultados_archivo y ejecutar rebuild-stats para no
+    contar ese mes dos veces).
+
+    Args:
+        retention_months: meses completos que se quedan en resultados
+        detach: desenganchar la partición tras exportarla
+        drop: además borrar la tabla desenganchada
+
+    Returns:
+        list: [{'particion', 'archivo', 'filas'}, ...] (None si falla alguna)
+    """
+    now = datetime.now()
+    cutoff = _add_months(now.year, now.month, -retention_months)
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        partitions = _list_partitions(conn.cursor())
         conn.commit()
-        print("✅ Base de datos inicializada correctamente")
-        return True
-        
     except Exception as e:
-        print(f"❌ Error inicializando base de datos: {e}")
+        print(f"❌ Error listando particiones: {e}")
         conn.rollback()
-        return False
+        return None
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+    os.makedirs(directory, exist_ok=True)
+    archived = []
+    for month in sorted(m for m in partitions if m < cutoff):
+        path = os.path.join(directory, f"{partitions[month]}.jsonl.gz")
+        filas = _archive_partition(partitions[month], month, path, detach, drop)
+        if filas is None:
+            return None
+        archived.append({'particion': partitions[month], 'archivo': path, 'filas': filas})
+        print(f"📦 {partitions[month]} archivada: {filas} resultados -> {path}")
+    return archived
+
+def _archive_partition(name, month, path, detach, drop):
+    """Exporta una partición y la desengancha en la misma transacción"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    tmp_path = path + ".tmp"
+    try:
+        cur = conn.cursor()
+        # Nadie escribe en el mes mientras se exporta: lo exportado es lo que se desengancha
+        cur.execute(f"LOCK TABLE {name} IN SHARE MODE")
+        reader = conn.cursor(name=f"archivo_{name}")
+        reader.itersize = 1000
+        reader.execute(f"SELECT {_RESULTADO_COLUMNS} FROM {name} ORDER BY fecha, id")
+        filas = 0
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for row in reader:
+                f.write(json.dumps(_resultado_from_row(row), ensure_ascii=False))
+                f.write("\n")
+                filas += 1
+        reader.close()
+        os.replace(tmp_path, path)
+
+        year_month = f"{month[0]:04d}-{month[1]:02d}"
+        cur.execute("""
+            INSERT INTO resultados_archivo (year_month, archivo, filas, desenganchada)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (year_month) DO UPDATE SET
+                archivo = EXCLUDED.archivo,
+                filas = EXCLUDED.filas,
+                desenganchada = EXCLUDED.desenganchada,
+                archived_at = CURRENT_TIMESTAMP
+        """, (year_month, path, filas, detach))
+        if detach:
+            cur.execute(f"ALTER TABLE resultados DETACH PARTITION {name}")
+            if drop:
+                cur.execute(f"DROP TABLE {name}")
+        conn.commit()
+        return filas
+    except Exception as e:
+        print(f"❌ Error archivando {name}: {e}")
+        conn.rollback()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    finally:
+        release_db_connection(conn)
+
+# === EXPLAIN DE CONSULTAS FRECUENTES ===
+HOT_QUERIES = [
+    ("resultados por tester",
+     "SELECT id FROM resultados WHERE tester_id = %s", ("0",)),
+    ("stats de testers",
+     "SELECT tester_id, SUM(tests) AS tests FROM tester_stats "
+     "GROUP BY tester_id ORDER BY tests DESC", ()),
+    ("historial por fecha",
+     "SELECT * FROM resultados ORDER BY fecha DESC LIMIT 100", ()),
+    ("resultados de un mes (una partición)",
+     "SELECT id FROM resultados WHERE fecha >= date_trunc('month', LOCALTIMESTAMP) "
+     "AND fecha < date_trunc('month', LOCALTIMESTAMP) + INTERVAL '1 month'", ()),
+    ("cooldowns activos",
+     "SELECT jugador_id, modalidad, end_date FROM cooldowns WHERE end_date > NOW()", ()),
+    ("ranking overall",
+     "SELECT discord_id, puntos_totales FROM jugadores ORDER BY puntos_totales DESC LIMIT 10", ()),
+    ("posición de un jugador",
+     "SELECT COUNT(*) + 1 FROM jugadores WHERE puntos_totales > %s", (0,)),
+    ("ranking por modalidad",
+     "SELECT discord_id FROM jugadores WHERE tier_por_modalidad ? %s "
+     "ORDER BY COALESCE((puntos_por_modalidad->>%s)::int, 0) DESC LIMIT 10", ("Sword", "Sword")),
+]
+
+def explain_hot_queries(analyze=False):
+    """
+    Ejecuta EXPLAIN sobre las consultas frecuentes para comprobar que usan índices
+    
+    Returns:
+        dict: {nombre: [líneas del plan]}
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    plans = {}
+    try:
+        cur = conn.cursor()
+        for name, sql, params in HOT_QUERIES:
+            try:
+                cur.execute(prefix + sql, params)
+                plans[name] = [row[0] for row in cur.fetchall()]
+            except Exception as e:
+                conn.rollback()
+                plans[name] = [f"ERROR: {e}"]
+        # EXPLAIN ANALYZE ejecuta la consulta: no dejar nada abierto
+        conn.rollback()
+        return plans
+    finally:
+        release_db_connection(conn)
+
+# Columnas y parámetros compartidos por las escrituras sueltas y por lotes
+_RESULTADO_COLUMNS = """nick_mc, jugador_id, jugador_name, tester_id, tester_name,
+    modalidad, tier_antiguo, tier_nuevo, puntos_obtenidos, puntos_totales, fecha"""
+_RESULTADO_COLUMNS_WITH_ID = "id, " + _RESULTADO_COLUMNS
+
+_RESULTADO_INSERT = """
+    INSERT INTO resultados
+    (nick_mc, jugador_id, jugador_name, tester_id, tester_name,
+     modalidad, tier_antiguo, tier_nuevo, puntos_obtenidos, puntos_totales, fecha)
+    VALUES %s
+"""
+
+_JUGADOR_UPSERT = """
+    INSERT INTO jugadores
+    (discord_id, nick_mc, discord_name, tier_por_modalidad,
+     puntos_por_modalidad, puntos_totales, es_premium)
+    VALUES %s
+    ON CONFLICT (discord_id) DO UPDATE SET
+        nick_mc = EXCLUDED.nick_mc,
+        discord_name = EXCLUDED.discord_name,
+        tier_por_modalidad = EXCLUDED.tier_por_modalidad,
+        puntos_por_modalidad = EXCLUDED.puntos_por_modalidad,
+        puntos_totales = EXCLUDED.puntos_totales,
+        es_premium = EXCLUDED.es_premium
+"""
+
+_COOLDOWN_UPSERT = """
+    INSERT INTO cooldowns (jugador_id, modalidad, start_date, end_date)
+    VALUES %s
+    ON CONFLICT (jugador_id, modalidad) DO UPDATE SET
+        start_date = EXCLUDED.start_date,
+        end_date = EXCLUDED.end_date
+"""
+
+def _resultado_params(resultado_data):
+    fecha = resultado_data.get('fecha')
+    if isinstance(fecha, str):
+        fecha = datetime.fromisoformat(fecha)
+    return (
+        resultado_data.get('nick_mc'),
+        resultado_data['jugador_id'],
+        resultado_data.get('jugador_name'),
+        resultado_data['tester_id'],
+        resultado_data.get('tester_name'),
+        resultado_data.get('modalidad'),
+        resultado_data.get('tier_antiguo'),
+        resultado_data.get('tier_nuevo'),
+        resultado_data.get('puntos_obtenidos'),
+        resultado_data.get('puntos_totales'),
+        fecha or datetime.now()
+    )
+
+def _jugador_params(jugador_data):
+    return (
+        jugador_data['discord_id'],
+        jugador_data.get('nick_mc'),
+        jugador_data.get('discord_name'),
+        json.dumps(jugador_data.get('tier_por_modalidad', {})),
+        json.dumps(jugador_data.get('puntos_por_modalidad', {})),
+        jugador_data.get('puntos_totales', 0),
+        jugador_data.get('es_premium', 'no')
+    )
 
 def add_resultado(resultado_data):
     """Añade un resultado a la base de datos"""
@@ -102,24 +845,7 @@ def add_resultado(resultado_data):
     
     try:
         cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO resultados 
-            (nick_mc, jugador_id, jugador_name, tester_id, tester_name, 
-             modalidad, tier_antiguo, tier_nuevo, puntos_obtenidos, puntos_totales, fecha)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            resultado_data.get('nick_mc'),
-            resultado_data['jugador_id'],
-            resultado_data.get('jugador_name'),
-            resultado_data['tester_id'],
-            resultado_data.get('tester_name'),
-            resultado_data.get('modalidad'),
-            resultado_data.get('tier_antiguo'),
-            resultado_data.get('tier_nuevo'),
-            resultado_data.get('puntos_obtenidos'),
-            resultado_data.get('puntos_totales'),
-            datetime.fromisoformat(resultado_data['fecha']) if 'fecha' in resultado_data else datetime.now()
-        ))
+        execute_values(cur, _RESULTADO_INSERT, [_resultado_params(resultado_data)])
         conn.commit()
         return True
     except Exception as e:
@@ -127,59 +853,17 @@ def add_resultado(resultado_data):
         conn.rollback()
         return False
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 def save_or_update_jugador(jugador_data):
-    """Guarda o actualiza un jugador en la base de datos"""
+    """Guarda o actualiza un jugador en la base de datos (un solo UPSERT)"""
     conn = get_db_connection()
     if not conn:
         return False
     
     try:
         cur = conn.cursor()
-        
-        # Verificar si el jugador ya existe
-        cur.execute("SELECT discord_id FROM jugadores WHERE discord_id = %s", 
-                   (jugador_data['discord_id'],))
-        exists = cur.fetchone()
-        
-        if exists:
-            # Actualizar jugador existente
-            cur.execute("""
-                UPDATE jugadores 
-                SET nick_mc = %s,
-                    discord_name = %s,
-                    tier_por_modalidad = %s,
-                    puntos_por_modalidad = %s,
-                    puntos_totales = %s,
-                    es_premium = %s
-                WHERE discord_id = %s
-            """, (
-                jugador_data.get('nick_mc'),
-                jugador_data.get('discord_name'),
-                json.dumps(jugador_data.get('tier_por_modalidad', {})),
-                json.dumps(jugador_data.get('puntos_por_modalidad', {})),
-                jugador_data.get('puntos_totales', 0),
-                jugador_data.get('es_premium', 'no'),
-                jugador_data['discord_id']
-            ))
-        else:
-            # Insertar nuevo jugador
-            cur.execute("""
-                INSERT INTO jugadores 
-                (discord_id, nick_mc, discord_name, tier_por_modalidad, 
-                 puntos_por_modalidad, puntos_totales, es_premium)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                jugador_data['discord_id'],
-                jugador_data.get('nick_mc'),
-                jugador_data.get('discord_name'),
-                json.dumps(jugador_data.get('tier_por_modalidad', {})),
-                json.dumps(jugador_data.get('puntos_por_modalidad', {})),
-                jugador_data.get('puntos_totales', 0),
-                jugador_data.get('es_premium', 'no')
-            ))
-        
+        execute_values(cur, _JUGADOR_UPSERT, [_jugador_params(jugador_data)])
         conn.commit()
         return True
     except Exception as e:
@@ -187,50 +871,63 @@ def save_or_update_jugador(jugador_data):
         conn.rollback()
         return False
     finally:
-        conn.close()
+        release_db_connection(conn)
 
-def get_all_resultados():
-    """Obtiene todos los resultados"""
+def _resultado_from_row(row):
+    """Fila con las columnas de _RESULTADO_COLUMNS -> dict (fecha en ISO)"""
+    return {
+        'nick_mc': row[0],
+        'jugador_id': row[1],
+        'jugador_name': row[2],
+        'tester_id': row[3],
+        'tester_name': row[4],
+        'modalidad': row[5],
+        'tier_antiguo': row[6],
+        'tier_nuevo': row[7],
+        'puntos_obtenidos': row[8],
+        'puntos_totales': row[9],
+        'fecha': row[10].isoformat() if row[10] else None
+    }
+
+def get_all_resultados(desde=None, hasta=None):
+    """
+    Obtiene todos los resultados (o los de [desde, hasta) si se indica: solo
+    se leen las particiones de esos meses)
+    """
     conn = get_db_connection()
     if not conn:
         return []
     
     try:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT nick_mc, jugador_id, jugador_name, tester_id, tester_name,
-                   modalidad, tier_antiguo, tier_nuevo, puntos_obtenidos, 
-                   puntos_totales, fecha
+        where = []
+        params = []
+        if desde is not None:
+            where.append("fecha >= %s")
+            params.append(desde)
+        if hasta is not None:
+            where.append("fecha < %s")
+            params.append(hasta)
+        cur.execute(f"""
+            SELECT {_RESULTADO_COLUMNS}
             FROM resultados
+            {"WHERE " + " AND ".join(where) if where else ""}
             ORDER BY fecha DESC
-        """)
+        """, params)
         
-        rows = cur.fetchall()
-        resultados = []
-        for row in rows:
-            resultados.append({
-                'nick_mc': row[0],
-                'jugador_id': row[1],
-                'jugador_name': row[2],
-                'tester_id': row[3],
-                'tester_name': row[4],
-                'modalidad': row[5],
-                'tier_antiguo': row[6],
-                'tier_nuevo': row[7],
-                'puntos_obtenidos': row[8],
-                'puntos_totales': row[9],
-                'fecha': row[10].isoformat() if row[10] else None
-            })
-        
-        return resultados
+        return [_resultado_from_row(row) for row in cur.fetchall()]
     except Exception as e:
         print(f"❌ Error obteniendo resultados: {e}")
         return []
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 def delete_tester_resultados(tester_id):
-    """Elimina todos los resultados de un tester"""
+    """
+    Elimina todos los resultados de un tester, y sus contadores de
+    tester_stats en la misma transacción: el trigger solo descuenta las
+    filas borradas, no las de meses archivados (desenganchados)
+    """
     conn = get_db_connection()
     if not conn:
         return 0
@@ -239,6 +936,7 @@ def delete_tester_resultados(tester_id):
         cur = conn.cursor()
         cur.execute("DELETE FROM resultados WHERE tester_id = %s", (tester_id,))
         deleted = cur.rowcount
+        cur.execute("DELETE FROM tester_stats WHERE tester_id = %s", (tester_id,))
         conn.commit()
         return deleted
     except Exception as e:
@@ -246,10 +944,17 @@ def delete_tester_resultados(tester_id):
         conn.rollback()
         return 0
     finally:
-        conn.close()
+        release_db_connection(conn)
 
-def get_tester_stats():
-    """Obtiene estadísticas de testers para /toptester"""
+def get_tester_stats(modalidad=None, year_month=None):
+    """
+    Estadísticas de testers para /toptester, leídas de tester_stats
+    (decenas de filas en vez de agrupar toda la tabla resultados)
+
+    Args:
+        modalidad: filtrar por modalidad (None = todas)
+        year_month: 'YYYY-MM' para un mes concreto (None = todos los tiempos)
+    """
     conn = get_db_connection()
     if not conn:
         return {}
@@ -257,18 +962,22 @@ def get_tester_stats():
     try:
         cur = conn.cursor()
         cur.execute("""
-            SELECT tester_id, tester_name, COUNT(*) as tests
-            FROM resultados
-            GROUP BY tester_id, tester_name
+            SELECT tester_id,
+                   (ARRAY_AGG(tester_name ORDER BY year_month DESC))[1],
+                   SUM(tests) AS tests
+            FROM tester_stats
+            WHERE (%s IS NULL OR modalidad = %s)
+              AND (%s IS NULL OR year_month = %s)
+            GROUP BY tester_id
             ORDER BY tests DESC
-        """)
+        """, (modalidad, modalidad, year_month, year_month))
         
         rows = cur.fetchall()
         stats = {}
         for row in rows:
             stats[row[0]] = {
                 'name': row[1],
-                'count': row[2]
+                'count': int(row[2])
             }
         
         return stats
@@ -276,7 +985,53 @@ def get_tester_stats():
         print(f"❌ Error obteniendo stats: {e}")
         return {}
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+def rebuild_tester_stats():
+    """
+    Recalcula tester_stats desde resultados (reparar desajustes). Bloquea las
+    escrituras en resultados mientras tanto para no perder ningún test.
+    Los meses archivados y desenganchados ya no están en resultados: sus
+    contadores se conservan tal cual
+
+    Returns:
+        dict: {'grupos': filas resultantes, 'corregidos': grupos que no cuadraban}
+              o None si falla
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    try:
+        cur = conn.cursor()
+        cur.execute("LOCK TABLE resultados IN SHARE MODE")
+        archivados = "(SELECT year_month FROM resultados_archivo WHERE desenganchada)"
+        cur.execute(f"""
+            SELECT COUNT(*)
+            FROM ({_TESTER_STATS_GROUP.format(source='resultados')}) r
+            FULL JOIN (SELECT * FROM tester_stats WHERE year_month NOT IN {archivados}) s
+                USING (tester_id, modalidad, year_month)
+            WHERE r.tests IS DISTINCT FROM s.tests
+        """)
+        corregidos = cur.fetchone()[0]
+        cur.execute(f"DELETE FROM tester_stats WHERE year_month NOT IN {archivados}")
+        cur.execute(f"""
+            INSERT INTO tester_stats (tester_id, modalidad, year_month, tester_name, tests)
+            SELECT tester_id, modalidad, year_month, tester_name, tests
+            FROM ({_TESTER_STATS_GROUP.format(source='resultados')}) r
+            ON CONFLICT (tester_id, modalidad, year_month) DO UPDATE SET
+                tests = tester_stats.tests + EXCLUDED.tests,
+                tester_name = EXCLUDED.tester_name
+        """)
+        grupos = cur.rowcount
+        conn.commit()
+        return {'grupos': grupos, 'corregidos': corregidos}
+    except Exception as e:
+        print(f"❌ Error reconstruyendo tester_stats: {e}")
+        conn.rollback()
+        return None
+    finally:
+        release_db_connection(conn)
 
 def save_cooldown(jugador_id, modalidad, start_date, end_date):
     """Guarda un cooldown en PostgreSQL"""
@@ -287,19 +1042,7 @@ def save_cooldown(jugador_id, modalidad, start_date, end_date):
     try:
         cur = conn.cursor()
         # Usar UPSERT (INSERT con ON CONFLICT)
-        cur.execute("""
-            INSERT INTO cooldowns (jugador_id, modalidad, start_date, end_date)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (jugador_id, modalidad)
-            DO UPDATE SET
-                start_date = EXCLUDED.start_date,
-                end_date = EXCLUDED.end_date
-        """, (
-            jugador_id,
-            modalidad,
-            start_date,
-            end_date
-        ))
+        execute_values(cur, _COOLDOWN_UPSERT, [(jugador_id, modalidad, start_date, end_date)])
         conn.commit()
         return True
     except Exception as e:
@@ -307,7 +1050,270 @@ def save_cooldown(jugador_id, modalidad, start_date, end_date):
         conn.rollback()
         return False
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+# === ALTAS MASIVAS ===
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+_RESULTADO_FIELDS = (
+    'nick_mc', 'jugador_id', 'jugador_name', 'tester_id', 'tester_name',
+    'modalidad', 'tier_antiguo', 'tier_nuevo', 'puntos_obtenidos',
+    'puntos_totales', 'fecha'
+)
+_INT_FIELDS = ('puntos_obtenidos', 'puntos_totales')
+
+def add_resultados(resultados, page_size=1000):
+    """
+    Inserta muchos resultados con INSERTs multi-fila y un solo commit
+
+    Returns:
+        int: Resultados insertados (False si falla: no se inserta ninguno)
+    """
+    rows = [_resultado_params(r) for r in resultados]
+    if not rows:
+        return 0
+    
+    conn = get_db_connection()
+    if not conn:
+        return False
+    
+    try:
+        cur = conn.cursor()
+        execute_values(cur, _RESULTADO_INSERT, rows, page_size=page_size)
+        conn.commit()
+        return len(rows)
+    except Exception as e:
+        print(f"❌ Error insertando {len(rows)} resultados: {e}")
+        conn.rollback()
+        return False
+    finally:
+        release_db_connection(conn)
+
+# Igual que _RESULTADO_INSERT, pero sin las filas que ya están en resultados
+# (mismo jugador, tester, modalidad y fecha) ni repetidas dentro del lote.
+# Casts en la plantilla: en VALUES una columna solo con NULL sería texto
+_RESULTADO_INSERT_NUEVOS = f"""
+    INSERT INTO resultados ({_RESULTADO_COLUMNS})
+    SELECT DISTINCT ON (v.jugador_id, v.tester_id, v.modalidad, v.fecha) {_RESULTADO_COLUMNS}
+    FROM (VALUES %s) AS v ({_RESULTADO_COLUMNS})
+    WHERE NOT EXISTS (
+        SELECT 1 FROM resultados r
+        WHERE r.jugador_id = v.jugador_id
+          AND r.tester_id = v.tester_id
+          AND r.modalidad IS NOT DISTINCT FROM v.modalidad
+          AND r.fecha IS NOT DISTINCT FROM v.fecha
+    )
+    RETURNING jugador_id, tester_id, modalidad, fecha
+"""
+_RESULTADO_TEMPLATE_NUEVOS = "(%s, %s, %s, %s, %s, %s, %s, %s, %s::int, %s::int, %s::timestamp)"
+
+def add_resultados_nuevos(resultados, page_size=1000):
+    """
+    Como add_resultados, pero omite los resultados que ya existen (mismo
+    jugador_id, tester_id, modalidad y fecha): importar dos veces el mismo
+    export, o un /backup, no duplica filas
+
+    Returns:
+        list: Los resultados realmente insertados (False si falla: no se inserta ninguno)
+    """
+    # Clave -> (resultado, parámetros). La fecha va sin zona horaria, como la
+    # columna: así la fila que devuelve RETURNING encuentra su resultado
+    pendientes = {}
+    for resultado in resultados:
+        params = _resultado_params(resultado)
+        params = params[:10] + (params[10].replace(tzinfo=None),)
+        pendientes.setdefault((params[1], params[3], params[5], params[10]), (resultado, params))
+    if not pendientes:
+        return []
+    
+    conn = get_db_connection()
+    if not conn:
+        return False
+    
+    try:
+        cur = conn.cursor()
+        insertadas = execute_values(
+            cur, _RESULTADO_INSERT_NUEVOS,
+            [params for _, params in pendientes.values()],
+            template=_RESULTADO_TEMPLATE_NUEVOS, page_size=page_size, fetch=True
+        )
+        conn.commit()
+        return [pendientes[tuple(row)][0] for row in insertadas]
+    except Exception as e:
+        print(f"❌ Error insertando {len(pendientes)} resultados: {e}")
+        conn.rollback()
+        return False
+    finally:
+        release_db_connection(conn)
+
+def normalize_resultado(row):
+    """
+    Fila de un export (JSON o CSV) -> dict para add_resultados, o None si no
+    es válida (sin jugador_id / tester_id o con fecha o puntos ilegibles).
+    Sin fecha se fecha ahora, aquí y no al insertar: PostgreSQL (tester_stats)
+    y los contadores en memoria cuentan el test en el mismo mes
+    """
+    if not isinstance(row, dict):
+        return None
+    resultado = {}
+    for field in _RESULTADO_FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip() or None
+        resultado[field] = value
+    if not resultado['jugador_id'] or not resultado['tester_id']:
+        return None
+    try:
+        for field in _INT_FIELDS:
+            if resultado[field] is not None:
+                resultado[field] = int(resultado[field])
+        if resultado['fecha'] is not None:
+            datetime.fromisoformat(resultado['fecha'])
+        else:
+            resultado['fecha'] = datetime.now().isoformat()
+    except (TypeError, ValueError):
+        return None
+    resultado['jugador_id'] = str(resultado['jugador_id'])
+    resultado['tester_id'] = str(resultado['tester_id'])
+    return resultado
+
+def iter_resultados_export(source, fmt):
+    """
+    Recorre un export de resultados sin validar
+
+    Args:
+        source: archivo de texto abierto (o str con el contenido)
+        fmt: 'json' (lista o backup de /backup con clave 'resultados'), 'csv'
+             o 'jsonl' (un resultado por línea, como los archivos de
+             archive_resultados_partitions)
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    if fmt == 'csv':
+        yield from csv.DictReader(source)
+        return
+    if fmt == 'jsonl':
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+        return
+    content = json.load(source)
+    if isinstance(content, dict):
+        content = content.get('resultados', [])
+    yield from content
+
+def chunked(items, size=IMPORT_CHUNK_SIZE):
+    """Agrupa un iterable en listas de `size` elementos"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_resultados(path, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Importa un export histórico (.json, .csv o un .jsonl.gz archivado) por
+    lotes: un commit por lote, así un fallo a mitad no deshace lo ya importado.
+    Los resultados que ya están en la base de datos se omiten (duplicados),
+    así repetir una importación interrumpida no cuenta dos veces
+
+    Args:
+        progress: callback(importados, omitidos, duplicados) tras cada lote
+
+    Returns:
+        dict: {'importados', 'omitidos', 'duplicados', 'completo'}
+    """
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+        opener = gzip.open
+    else:
+        opener = open
+    fmt = 'csv' if name.endswith('.csv') else 'jsonl' if name.endswith('.jsonl') else 'json'
+    importados = omitidos = duplicados = 0
+    with opener(path, 'rt', encoding='utf-8-sig', newline='') as f:
+        for chunk in chunked(iter_resultados_export(f, fmt), chunk_size):
+            validos = [r for r in map(normalize_resultado, chunk) if r is not None]
+            omitidos += len(chunk) - len(validos)
+            inserted = add_resultados_nuevos(validos)
+            if inserted is False:
+                return {'importados': importados, 'omitidos': omitidos,
+                        'duplicados': duplicados, 'completo': False}
+            importados += len(inserted)
+            duplicados += len(validos) - len(inserted)
+            if progress:
+                progress(importados, omitidos, duplicados)
+    return {'importados': importados, 'omitidos': omitidos,
+            'duplicados': duplicados, 'completo': True}
+
+# === RESULTADO DE UN TEST (UNA TRANSACCIÓN) ===
+def _write_outcomes(cur, outcomes, page_size):
+    """
+    Escribe resultados, jugadores y cooldowns con un INSERT multi-fila por tabla
+
+    Un mismo jugador o cooldown puede repetirse en el lote: gana el último
+    (ON CONFLICT no admite tocar la misma fila dos veces en una sentencia).
+    """
+    resultados = []
+    jugadores = {}
+    cooldowns = {}
+    for resultado_data, jugador_data, cooldown in outcomes:
+        if resultado_data is not None:
+            resultados.append(_resultado_params(resultado_data))
+        if jugador_data is not None:
+            jugadores[jugador_data['discord_id']] = _jugador_params(jugador_data)
+        if cooldown is not None:
+            cooldowns[(cooldown[0], cooldown[1])] = tuple(cooldown)
+
+    if resultados:
+        execute_values(cur, _RESULTADO_INSERT, resultados, page_size=page_size)
+    if jugadores:
+        execute_values(cur, _JUGADOR_UPSERT, list(jugadores.values()), page_size=page_size)
+    if cooldowns:
+        execute_values(cur, _COOLDOWN_UPSERT, list(cooldowns.values()), page_size=page_size)
+    return len(resultados)
+
+def record_test_outcome(resultado_data, jugador_data, cooldown=None):
+    """
+    Guarda el resultado de un test, el perfil del jugador y su cooldown con
+    una sola conexión y un solo commit (o no se guarda nada)
+
+    Args:
+        resultado_data: dict como en add_resultado
+        jugador_data: dict como en save_or_update_jugador
+        cooldown: (jugador_id, modalidad, start_date, end_date) o None
+    """
+    return record_test_outcomes([(resultado_data, jugador_data, cooldown)]) == 1
+
+def record_test_outcomes(outcomes, page_size=500):
+    """
+    Variante por lotes de record_test_outcome (importaciones, reintentos)
+
+    Args:
+        outcomes: iterable de (resultado_data, jugador_data, cooldown);
+                  cualquiera de los tres puede ser None
+
+    Returns:
+        int: Resultados insertados (False si falla: se deshace todo el lote)
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    
+    try:
+        cur = conn.cursor()
+        inserted = _write_outcomes(cur, list(outcomes), page_size)
+        conn.commit()
+        return inserted
+    except Exception as e:
+        print(f"❌ Error guardando resultados de tests: {e}")
+        conn.rollback()
+        return False
+    finally:
+        release_db_connection(conn)
 
 def get_active_cooldowns():
     """Obtiene todos los cooldowns activos desde PostgreSQL"""
@@ -343,7 +1349,7 @@ def get_active_cooldowns():
         print(f"❌ Error obteniendo cooldowns: {e}")
         return {}
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 def delete_expired_cooldowns():
     """Elimina cooldowns expirados de PostgreSQL"""
@@ -365,7 +1371,7 @@ def delete_expired_cooldowns():
         conn.rollback()
         return 0
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 def get_all_jugadores():
     """Obtiene todos los jugadores de PostgreSQL para cargar en memoria al iniciar"""
@@ -386,15 +1392,7 @@ def get_all_jugadores():
         jugadores = {}
         
         for row in rows:
-            discord_id = row[0]
-            jugadores[discord_id] = {
-                'nick_mc': row[1],
-                'discord_name': row[2],
-                'tier_por_modalidad': row[3] if isinstance(row[3], dict) else {},
-                'puntos_por_modalidad': row[4] if isinstance(row[4], dict) else {},
-                'puntos_totales': row[5] or 0,
-                'es_premium': row[6] or 'no'
-            }
+            jugadores[row[0]] = _jugador_from_row(row)
         
         print(f"✅ {len(jugadores)} jugadores cargados de PostgreSQL")
         return jugadores
@@ -403,7 +1401,80 @@ def get_all_jugadores():
         print(f"❌ Error obteniendo jugadores: {e}")
         return {}
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+def _jugador_from_row(row):
+    """(discord_id, nick, name, tiers, puntos, total, premium) -> dict de data['jugadores']"""
+    return {
+        'nick_mc': row[1],
+        'discord_name': row[2],
+        'tier_por_modalidad': row[3] if isinstance(row[3], dict) else {},
+        'puntos_por_modalidad': row[4] if isinstance(row[4], dict) else {},
+        'puntos_totales': row[5] or 0,
+        'es_premium': row[6] or 'no'
+    }
+
+# === LECTURA EN STREAMING (cursor de servidor) ===
+# Generadores que devuelven lotes de `batch_size` filas: nunca se tiene toda
+# la tabla en memoria. La conexión se mantiene hasta agotar o cerrar el generador.
+# Un fallo (también sin conexión) se propaga: el llamador no debe confundir una
+# lectura a medias con la tabla completa
+def _iter_batches(name, sql, params=(), batch_size=1000):
+    conn = get_db_connection()
+    if not conn:
+        raise ConnectionError(f"Sin conexión a PostgreSQL para {name}")
+    
+    try:
+        cur = conn.cursor(name=name)
+        cur.itersize = batch_size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        cur.close()
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Error leyendo {name}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        release_db_connection(conn)
+
+def iter_jugadores(batch_size=1000):
+    """Lotes de [(discord_id, dict del jugador), ...] de toda la tabla jugadores"""
+    for rows in _iter_batches("iter_jugadores", """
+        SELECT discord_id, nick_mc, discord_name,
+               tier_por_modalidad, puntos_por_modalidad,
+               puntos_totales, es_premium
+        FROM jugadores
+    """, batch_size=batch_size):
+        yield [(row[0], _jugador_from_row(row)) for row in rows]
+
+def iter_tests_agregados(batch_size=1000):
+    """
+    Lotes de tests agrupados por tester, modalidad y mes (para los contadores
+    de /toptester y /stats sin cargar el historial completo)
+    
+    Yields:
+        list: [(tester_id, tester_name, modalidad, (año, mes) | None, tests), ...]
+    """
+    for rows in _iter_batches("iter_tests_agregados", """
+        SELECT tester_id, tester_name, modalidad, year_month, tests
+        FROM tester_stats
+    """, batch_size=batch_size):
+        yield [
+            (tester_id, tester_name, modalidad or None, _parse_year_month(year_month), tests)
+            for tester_id, tester_name, modalidad, year_month, tests in rows
+        ]
+
+def _parse_year_month(year_month):
+    """'YYYY-MM' -> (año, mes); '' (resultados sin fecha) -> None"""
+    if not year_month:
+        return None
+    year, month = year_month.split('-')
+    return int(year), int(month)
 
 def get_jugador_by_id(discord_id):
     """Obtiene información de un jugador por su Discord ID"""
@@ -440,4 +1511,160 @@ def get_jugador_by_id(discord_id):
         print(f"❌ Error obteniendo jugador: {e}")
         return None
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+def delete_cooldown(jugador_id, modalidad):
+    """Elimina el cooldown de un jugador en una modalidad"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM cooldowns
+            WHERE jugador_id = %s AND modalidad = %s
+        """, (jugador_id, modalidad))
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"❌ Error eliminando cooldown: {e}")
+        conn.rollback()
+        return False
+    finally:
+        release_db_connection(conn)
+
+def query_posiciones(cur, ptotal, tiers_json, puntos_json):
+    """
+    Posiciones overall y por modalidad de un jugador con esos puntos, con el
+    cursor dado (lo usan get_posiciones_jugador y la API)
+    
+    Returns:
+        dict: {'overall': n, 'Sword': n, ...}
+    """
+    puntos_json = puntos_json or {}
+    
+    # Un conteo por ranking, con la modalidad como literal para que use su índice parcial
+    queries = ["SELECT 'overall', COUNT(*) + 1 FROM jugadores WHERE puntos_totales > %s"]
+    params = [ptotal or 0]
+    for modo in (tiers_json or {}):
+        queries.append("""
+            SELECT %s, COUNT(*) + 1 FROM jugadores
+            WHERE tier_por_modalidad ? %s
+              AND COALESCE((puntos_por_modalidad->>%s)::int, 0) > %s
+        """)
+        params.extend([modo, modo, modo, int(puntos_json.get(modo, 0) or 0)])
+    
+    cur.execute(" UNION ALL ".join(queries), params)
+    return {modo: posicion for modo, posicion in cur.fetchall()}
+
+def get_posiciones_jugador(discord_id):
+    """
+    Posición de un jugador en el ranking overall y en cada modalidad con tier
+    
+    Empates comparten posición (1 + jugadores con MÁS puntos), igual que el
+    ranking en memoria. Cada conteo usa los índices de la migración 2/3.
+    
+    Returns:
+        dict: {'overall': n, 'Sword': n, ...} o {} si el jugador no existe
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT puntos_totales, tier_por_modalidad, puntos_por_modalidad
+            FROM jugadores
+            WHERE discord_id = %s
+        """, (discord_id,))
+        
+        row = cur.fetchone()
+        if not row:
+            return {}
+        
+        ptotal, tiers_json, puntos_json = row
+        return query_posiciones(cur, ptotal, tiers_json, puntos_json)
+    except Exception as e:
+        print(f"❌ Error obteniendo posición: {e}")
+        return {}
+    finally:
+        release_db_connection(conn)
+
+def get_top_rankings(modo, limit=10):
+    """Obtiene el top de jugadores overall o de una modalidad para /rankings"""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    
+    try:
+        cur = conn.cursor()
+        
+        if modo == "overall":
+            cur.execute("""
+                SELECT discord_id, nick_mc, discord_name, puntos_totales, tier_por_modalidad
+                FROM jugadores
+                ORDER BY puntos_totales DESC
+                LIMIT %s
+            """, (limit,))
+        else:
+            # Filtrar por modalidad específica
+            cur.execute("""
+                SELECT discord_id, nick_mc, discord_name, puntos_totales, 
+                       tier_por_modalidad, puntos_por_modalidad
+                FROM jugadores
+                WHERE tier_por_modalidad ? %s
+                ORDER BY COALESCE((puntos_por_modalidad->>%s)::int, 0) DESC
+                LIMIT %s
+            """, (modo, modo, limit))
+        
+        return cur.fetchall()
+    except Exception as e:
+        print(f"Error obteniendo rankings: {e}")
+        return []
+    finally:
+        release_db_connection(conn)
+
+if __name__ == "__main__":
+    # python database.py migrate | status | explain [--analyze] | rebuild-stats | import <archivo.json|csv|jsonl.gz>
+    #                    | partitions | archive [--keep-attached] [--drop]
+    import sys
+    
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    
+    if command == "migrate":
+        sys.exit(0 if run_migrations() else 1)
+    elif command == "status":
+        print(f"📦 Versión del esquema: {get_schema_version()} / {MIGRATIONS[-1][0]}")
+    elif command == "partitions":
+        creadas = ensure_resultados_partitions()
+        for name, year_month, filas in list_resultados_partitions():
+            print(f"🗂️ {name} ({year_month}): ~{filas} resultados")
+        sys.exit(0 if creadas is not None else 1)
+    elif command == "archive":
+        archivadas = archive_resultados_partitions(
+            detach="--keep-attached" not in sys.argv,
+            drop="--drop" in sys.argv
+        )
+        print(f"{'✅' if archivadas is not None else '❌'} Particiones archivadas: {len(archivadas or [])}")
+        sys.exit(0 if archivadas is not None else 1)
+    elif command == "rebuild-stats":
+        resumen = rebuild_tester_stats()
+        print(f"{'✅' if resumen else '❌'} tester_stats: {resumen}")
+        sys.exit(0 if resumen else 1)
+    elif command == "import" and len(sys.argv) > 2:
+        def _progress(importados, omitidos, duplicados):
+            print(f"📥 {importados} importados, {omitidos} omitidos, {duplicados} ya existían")
+        resumen = import_resultados(sys.argv[2], progress=_progress)
+        print(f"{'✅' if resumen['completo'] else '❌'} Importación: {resumen}")
+        sys.exit(0 if resumen['completo'] else 1)
+    elif command == "explain":
+        for name, plan in explain_hot_queries(analyze="--analyze" in sys.argv).items():
+            print(f"\n🔎 {name}")
+            for line in plan:
+                print(f"   {line}")
+    else:
+        print("Uso: python database.py [migrate|status|explain [--analyze]|rebuild-stats|"
+              "import <archivo.json|csv|jsonl.gz>|partitions|archive [--keep-attached] [--drop]]")
+        sys.exit(1)
@@ -0,0 +1,79 @@
+"""
+Capa asíncrona sobre database.py para Papayas Tierlist
+Ejecuta las funciones psycopg2 en un executor dedicado para no bloquear
+el event loop de discord.py (heartbeats, botones, comandos)
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+# Un hilo por conexión del pool: nunca hay más consultas en vuelo que conexiones
+_executor = ThreadPoolExecutor(
+    max_workers=database.DB_POOL_MAX,
+    thread_name_prefix="db"
+)
+
+async def run(func, *args, **kwargs):
+    """Ejecuta func(*args, **kwargs) en el executor de base de datos"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _async(func):
+    """Convierte una función síncrona de database.py en una corrutina"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+# Mismas consultas y mismos valores de retorno que database.py, pero con await
+init_database = _async(database.init_database)
+add_resultado = _async(database.add_resultado)
+save_or_update_jugador = _async(database.save_or_update_jugador)
+get_all_resultados = _async(database.get_all_resultados)
+delete_tester_resultados = _async(database.delete_tester_resultados)
+get_tester_stats = _async(database.get_tester_stats)
+ensure_resultados_partitions = _async(database.ensure_resultados_partitions)
+get_archived_months = _async(database.get_archived_months)
+save_cooldown = _async(database.save_cooldown)
+record_test_outcome = _async(database.record_test_outcome)
+add_resultados = _async(database.add_resultados)
+add_resultados_nuevos = _async(database.add_resultados_nuevos)
+get_active_cooldowns = _async(database.get_active_cooldowns)
+delete_expired_cooldowns = _async(database.delete_expired_cooldowns)
+get_all_jugadores = _async(database.get_all_jugadores)
+get_jugador_by_id = _async(database.get_jugador_by_id)
+delete_cooldown = _async(database.delete_cooldown)
+get_posiciones_jugador = _async(database.get_posiciones_jugador)
+get_top_rankings = _async(database.get_top_rankings)
+run_migrations = _async(database.run_migrations)
+get_schema_version = _async(database.get_schema_version)
+explain_hot_queries = _async(database.explain_hot_queries)
+
+_DONE = object()
+
+async def iterate(func, *args, **kwargs):
+    """
+    Recorre un generador de database.py (iter_*) lote a lote: cada next()
+    corre en el executor, así el event loop nunca espera a PostgreSQL
+
+    Uso:
+        async for lote in database_async.iterate(database.iter_jugadores):
+            ...
+    """
+    gen = func(*args, **kwargs)
+    try:
+        while True:
+            batch = await run(next, gen, _DONE)
+            if batch is _DONE:
+                return
+            yield batch
+    finally:
+        await run(gen.close)
+
+def shutdown():
+    """Espera a que terminen las consultas pendientes y cierra el pool"""
+    _executor.shutdown(wait=True)
+    database.close_pool()
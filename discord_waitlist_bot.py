@@ -5,14 +5,30 @@ import json
 import os
 from datetime import datetime, timedelta
 import asyncio
+import time
+import atexit
+import signal
 
 import requests
-import zipfile
 import io
 
+from persistence import DataJournal, PersistenceScheduler
+import transcripts
+from result_store import ResultStore, OVERALL
+from leaderboard import leaderboards, OVERALL as OVERALL_RANKING
+import response_cache
+import records
+from records import Cooldown, Ticket
+from expiry import ExpiryScheduler
+from notifications import NotificationDispatcher
+from user_cache import UserResolver, mention
+from panel_renderer import PanelRenderer
+from waitlist import new_waitlist, load_waitlists, WaitlistLocks
+
 # Importar módulo de base de datos PostgreSQL
 try:
     import database
+    import database_async  # Mismas funciones pero con await (no bloquea el event loop)
     POSTGRESQL_AVAILABLE = True
     print("✅ Módulo PostgreSQL importado")
 except ImportError:
@@ -163,13 +179,15 @@ MODE_EMOJIS = {
     'Dpot': '🧪'
 }
 
-DATA_FILE = '/data/waitlist_data.json' if os.path.exists('/data') else 'waitlist_data.json'
+DATA_FILE = os.getenv('DATA_FILE') or ('/data/waitlist_data.json' if os.path.exists('/data') else 'waitlist_data.json')
 COOLDOWN_DAYS = 10
-MAX_QUEUE_SIZE = 20
+TRANSCRIPT_FORMAT = os.getenv('TRANSCRIPT_FORMAT', transcripts.FORMAT_TXT)  # txt, json o html
+MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', '20'))
+PANEL_QUEUE_CHARS = 1000  # Límite de Discord por campo: 1024 caracteres
 
 def create_initial_data():
     return {
-        'waitlists': {mode: {'active': False, 'queue': [], 'testers': []} for mode in GAME_MODES},
+        'waitlists': {mode: new_waitlist() for mode in GAME_MODES},
         'jugadores': {},
         'resultados': [],
         'castigos': [],
@@ -184,85 +202,111 @@ def create_initial_data():
         }
     }
 
+# Journal de mutaciones: cada cambio escribe un registro pequeño en vez de reescribir todo el JSON
+journal = DataJournal(DATA_FILE, json_default=records.to_json)
+
 def load_data():
     if not os.path.exists(DATA_FILE):
         print(f"⚠️ {DATA_FILE} no existe, creando nuevo...")
         initial_data = create_initial_data()
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(initial_data, f, indent=2, ensure_ascii=False)
+        journal.compact(initial_data)
         print(f"✅ {DATA_FILE} creado exitosamente")
         return initial_data
     
     try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if 'waitlists' not in data:
-                data['waitlists'] = {mode: {'active': False, 'queue': [], 'testers': []} for mode in GAME_MODES}
-            if 'jugadores' not in data:
-                data['jugadores'] = {}
-            if 'cooldowns' not in data:
-                data['cooldowns'] = {}
-            if 'bans_temporales' not in data:
-                data['bans_temporales'] = {}
-            if 'resultados' not in data:
-                data['resultados'] = []
-            if 'castigos' not in data:
-                data['castigos'] = []
-            if 'tickets' not in data:
-                data['tickets'] = {}
-            if 'panel_messages' not in data:
-                data['panel_messages'] = {}
-            if 'config' not in data:
-                data['config'] = {
-                    'ticket_category_id': None,
-                    'ticket_logs_channel_id': 1459298622930813121,
-                    'resultado_channel_id': 1459289305414635560
-                }
-            # Migrar log_channel_id antiguo a ticket_logs_channel_id
-            if 'log_channel_id' in data['config'] and 'ticket_logs_channel_id' not in data['config']:
-                data['config']['ticket_logs_channel_id'] = data['config']['log_channel_id']
-            # Agregar resultado_channel_id si no existe
-            if 'resultado_channel_id' not in data['config']:
-                data['config']['resultado_channel_id'] = 1459289305414635560
-            return data
+        # Snapshot + reproducción del journal
+        data, replayed = journal.load()
+        if replayed:
+            print(f"📜 Reproducidos {replayed} cambios del journal")
+        if 'waitlists' not in data:
+            data['waitlists'] = {}
+        if 'jugadores' not in data:
+            data['jugadores'] = {}
+        if 'cooldowns' not in data:
+            data['cooldowns'] = {}
+        if 'bans_temporales' not in data:
+            data['bans_temporales'] = {}
+        if 'resultados' not in data:
+            data['resultados'] = []
+        if 'castigos' not in data:
+            data['castigos'] = []
+        if 'tickets' not in data:
+            data['tickets'] = {}
+        if 'panel_messages' not in data:
+            data['panel_messages'] = {}
+        # Registros compactos en memoria (en disco siguen con el formato JSON de siempre)
+        data['cooldowns'] = records.load_cooldowns(data['cooldowns'], GAME_MODES)
+        data['waitlists'] = load_waitlists(data['waitlists'], GAME_MODES)
+        data['tickets'] = {
+            ticket_id: Ticket.from_dict(ticket) for ticket_id, ticket in data['tickets'].items()
+        }
+        if 'config' not in data:
+            data['config'] = {
+                'ticket_category_id': None,
+                'ticket_logs_channel_id': 1459298622930813121,
+                'resultado_channel_id': 1459289305414635560
+            }
+        # Migrar log_channel_id antiguo a ticket_logs_channel_id
+        if 'log_channel_id' in data['config'] and 'ticket_logs_channel_id' not in data['config']:
+            data['config']['ticket_logs_channel_id'] = data['config']['log_channel_id']
+        # Agregar resultado_channel_id si no existe
+        if 'resultado_channel_id' not in data['config']:
+            data['config']['resultado_channel_id'] = 1459289305414635560
+        return data
     except Exception as e:
         print(f"❌ Error cargando {DATA_FILE}: {e}")
         initial_data = create_initial_data()
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(initial_data, f, indent=2, ensure_ascii=False)
+        journal.compact(initial_data)
         return initial_data
 
 def save_data():
+    """Pide un snapshot completo (solo para cambios masivos, el resto va al journal)"""
+    journal.request_compaction()
+
+def shutdown_persistence():
+    """Escritura forzada al apagar: journal pendiente + snapshot completo"""
     try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        persistence_scheduler.flush_now()
+        print("💾 Datos guardados antes de apagar")
     except Exception as e:
-        print(f"❌ Error guardando datos: {e}")
+        print(f"❌ Error guardando datos al apagar: {e}")
 
 data = load_data()
 
+# Escrituras agrupadas en segundo plano (como mucho una cada PERSIST_INTERVAL_MS)
+persistence_scheduler = PersistenceScheduler(
+    journal,
+    lambda: data,
+    interval_ms=int(os.getenv('PERSIST_INTERVAL_MS', '250'))
+)
+atexit.register(shutdown_persistence)
+
+# Índices sobre data['resultados'] (por tester, modalidad y mes) para /toptester y /stats
+result_store = ResultStore(data['resultados'])
+
+# Rankings ordenados en memoria (se recalientan con PostgreSQL en on_ready)
+leaderboards.warm(data['jugadores'])
+
 
 # === FUNCIÓN DE LIMPIEZA ===
 def cleanup_old_data():
-    """Limpia cooldowns y bans expirados para liberar memoria"""
+    """Limpia bans expirados y cooldowns sin fecha válida para liberar memoria"""
     now = datetime.now()
     cleaned_cooldowns = 0
     cleaned_bans = 0
     
-    # Limpiar cooldowns expirados
-    expired_cooldowns = []
-    for key, cooldown_data in list(data.get('cooldowns', {}).items()):
-        if cooldown_data.get('end_date'):
-            try:
-                end_date = datetime.fromisoformat(cooldown_data['end_date'])
-                if end_date < now:
-                    expired_cooldowns.append(key)
-            except:
-                expired_cooldowns.append(key)
-    
-    for key in expired_cooldowns:
-        del data['cooldowns'][key]
-        cleaned_cooldowns += 1
+    # Los cooldowns vencidos con fecha válida los quita el expiry_scheduler
+    # (expirar_cooldown avisa por DM, también de los que vencieron con el bot
+    # apagado); aquí solo se descartan los que no tienen fecha de fin válida
+    for user_id, modes_data in list(data.get('cooldowns', {}).items()):
+        for mode, cooldown in list(modes_data.items()):
+            if cooldown.end is None:
+                del modes_data[mode]
+                journal.delete(('cooldowns', user_id, mode))
+                cleaned_cooldowns += 1
+        if not modes_data:
+            del data['cooldowns'][user_id]
+            journal.delete(('cooldowns', user_id))
     
     # Limpiar bans temporales expirados
     expired_bans = []
@@ -277,10 +321,10 @@ def cleanup_old_data():
     
     for user_id in expired_bans:
         del data['bans_temporales'][user_id]
+        journal.delete(('bans_temporales', user_id))
         cleaned_bans += 1
     
     if cleaned_cooldowns or cleaned_bans:
-        save_data()
         print(f"🧹 Limpiados {cleaned_cooldowns} cooldowns y {cleaned_bans} bans expirados")
     
     return cleaned_cooldowns, cleaned_bans
@@ -289,46 +333,83 @@ def cleanup_old_data():
 # === TICKET MESSAGE LOGGER ===
 ticket_logs = {}  # {channel_id: [messages]}
 
+_hidratado = False  # True tras cargar PostgreSQL en el primer on_ready
+
+async def hidratar_desde_postgresql():
+    """
+    Carga al arrancar solo lo que el bot necesita en memoria: jugadores (y
+    rankings), contadores de tests y cooldowns activos. El historial completo
+    de resultados se queda en PostgreSQL y se consulta bajo demanda (/backup).
+    """
+    if not await database_async.init_database():
+        print('⚠️ PostgreSQL no pudo inicializarse, usando solo memoria')
+        return False
+    print('✅ PostgreSQL inicializado correctamente')
+    
+    # Contadores de /toptester y /stats a partir de un GROUP BY leído por lotes.
+    # Se construyen aparte y solo sustituyen a los locales si la lectura termina:
+    # una lectura a medias no debe borrar el historial ni acabar en el snapshot
+    global result_store
+    contadores = ResultStore([])
+    grupos = 0
+    try:
+        async for lote in database_async.iterate(database.iter_tests_agregados):
+            for tester_id, tester_name, modalidad, mes, tests in lote:
+                contadores.add_aggregate(tester_id, tester_name, modalidad, mes, tests)
+            grupos += len(lote)
+    except Exception as e:
+        print(f'⚠️ No se pudieron cargar los contadores de tests: {e}')
+        return False
+    if grupos:
+        # PostgreSQL tiene el historial: descartar la copia local
+        data['resultados'].clear()
+        contadores.resultados = data['resultados']
+        result_store = contadores
+        print(f'📊 Cargados {len(result_store)} tests ({grupos} grupos) desde PostgreSQL')
+    
+    # Jugadores en memoria (publicar_resultado los necesita) y rankings
+    try:
+        cargados = 0
+        async for lote in database_async.iterate(database.iter_jugadores):
+            for jid, jdata in lote:
+                data['jugadores'][jid] = jdata
+            cargados += len(lote)
+        if cargados:
+            print(f'👥 Cargados {cargados} jugadores desde PostgreSQL')
+            leaderboards.warm(data['jugadores'])
+    except Exception as e:
+        # Reintentar en la próxima conexión en vez de guardar un snapshot incompleto
+        print(f'⚠️ No se pudieron cargar jugadores: {e}')
+        return False
+    
+    # Cargar cooldowns activos desde PostgreSQL
+    cooldowns_db = await database_async.get_active_cooldowns()
+    if cooldowns_db:
+        data['cooldowns'] = records.load_cooldowns(cooldowns_db, GAME_MODES)
+        print(f'⏰ Cargados {len(cooldowns_db)} cooldowns activos desde PostgreSQL')
+    
+    # Limpiar cooldowns expirados en PostgreSQL
+    deleted = await database_async.delete_expired_cooldowns()
+    if deleted > 0:
+        print(f'🧹 Eliminados {deleted} cooldowns expirados de PostgreSQL')
+    
+    # Los datos vienen de PostgreSQL: guardar un snapshot completo
+    save_data()
+    return True
+
 @bot.event
 async def on_ready():
     print('=' * 50)
     print(f'✅ Bot conectado como {bot.user}')
     print(f'📁 Archivo de datos: {DATA_FILE}')
     
-    # Inicializar PostgreSQL
-    if POSTGRESQL_AVAILABLE:
+    # Hidratar desde PostgreSQL solo la primera vez (on_ready se repite en cada reconexión)
+    global _hidratado
+    if POSTGRESQL_AVAILABLE and not _hidratado:
         print('🔧 Inicializando PostgreSQL...')
-        if database.init_database():
-            print('✅ PostgreSQL inicializado correctamente')
-            
-            # FIX: Cargar resultados en memoria (antes se descargaban pero no se usaban)
-            resultados_db = database.get_all_resultados()
-            if resultados_db:
-                data['resultados'] = resultados_db
-                print(f'📊 Cargados {len(resultados_db)} resultados desde PostgreSQL')
-            
-            # FIX: Cargar jugadores en memoria
-            try:
-                jugadores_db = database.get_all_jugadores()
-                if jugadores_db:
-                    for jid, jdata in jugadores_db.items():
-                        data['jugadores'][jid] = jdata
-                    print(f'👥 Cargados {len(jugadores_db)} jugadores desde PostgreSQL')
-            except Exception as e:
-                print(f'⚠️ No se pudieron cargar jugadores: {e}')
-            
-            # Cargar cooldowns activos desde PostgreSQL
-            cooldowns_db = database.get_active_cooldowns()
-            if cooldowns_db:
-                data['cooldowns'] = cooldowns_db
-                print(f'⏰ Cargados {len(cooldowns_db)} cooldowns activos desde PostgreSQL')
-            
-            # Limpiar cooldowns expirados en PostgreSQL
-            deleted = database.delete_expired_cooldowns()
-            if deleted > 0:
-                print(f'🧹 Eliminados {deleted} cooldowns expirados de PostgreSQL')
-        else:
-            print('⚠️ PostgreSQL no pudo inicializarse, usando solo memoria')
+        _hidratado = await hidratar_desde_postgresql()
+    elif _hidratado:
+        print('🔁 Reconexión: datos ya cargados, se omite la hidratación')
     
     print(f'👥 Jugadores: {len(data.get("jugadores", {}))}')
     print(f'⏰ Cooldowns activos: {len(data.get("cooldowns", {}))}')
@@ -339,17 +420,17 @@ async def on_ready():
     cleanup_old_data()
     
     # Iniciar tareas periódicas (prevenir duplicados)
-    if not check_cooldowns.is_running():
-        check_cooldowns.start()
-        print("✅ check_cooldowns iniciado")
-    else:
-        print("⚠️ check_cooldowns ya estaba corriendo")
+    if persistence_scheduler.start():
+        print("✅ Persistencia en segundo plano iniciada")
     
-    if not check_temp_bans.is_running():
-        check_temp_bans.start()
-        print("✅ check_temp_bans iniciado")
-    else:
-        print("⚠️ check_temp_bans ya estaba corriendo")
+    if notifier.start():
+        print("✅ Workers de DMs iniciados")
+    
+    # Vencimientos de cooldowns y bans: se reconstruyen una vez con los datos ya cargados
+    if not expiry_scheduler.is_running():
+        programar_vencimientos()
+        expiry_scheduler.start()
+        print("✅ Scheduler de vencimientos iniciado")
     
     if not cleanup_task.is_running():
         cleanup_task.start()
@@ -393,141 +474,117 @@ async def on_thread_delete(thread):
     """Cuando se cierra un ticket, genera log .zip"""
     
     if thread.id in ticket_logs:
-        # Crear archivo .txt con los mensajes
-        log_content = f"TICKET LOG - {thread.name}\n"
-        log_content += f"Creado: {thread.created_at}\n"
-        log_content += f"Cerrado: {datetime.now()}\n"
-        log_content += "=" * 50 + "\n\n"
-        
-        for msg in ticket_logs[thread.id]:
-            log_content += f"[{msg['timestamp']}] {msg['author']}:\n"
-            log_content += f"{msg['content']}\n"
-            if msg['attachments']:
-                log_content += f"Adjuntos: {', '.join(msg['attachments'])}\n"
-            log_content += "\n"
-        
-        # Crear .zip
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.writestr(f"{thread.name}.txt", log_content)
-        
-        zip_buffer.seek(0)
+        # Crear transcript comprimido con los mensajes (compresión fuera del event loop)
+        meta = [
+            ("Creado", thread.created_at),
+            ("Cerrado", datetime.now())
+        ]
+        zip_file, _ = await transcripts.build_transcript_zip(
+            f"TICKET LOG - {thread.name}",
+            meta,
+            ticket_logs[thread.id],
+            fmt=TRANSCRIPT_FORMAT,
+            entry_name=thread.name
+        )
         
         # Enviar a canal de TICKET logs
         ticket_logs_channel_id = data.get('config', {}).get('ticket_logs_channel_id', 1459298622930813121)
         logs_channel = bot.get_channel(ticket_logs_channel_id)
         
-        if logs_channel:
-            await logs_channel.send(
-                content=f"📁 Log del ticket **{thread.name}**",
-                file=discord.File(zip_buffer, filename=f"{thread.name}_log.zip")
-            )
+        with zip_file:
+            if logs_channel:
+                await logs_channel.send(
+                    content=f"📁 Log del ticket **{thread.name}**",
+                    file=discord.File(zip_file, filename=f"{thread.name}_log.zip")
+                )
         
         # Limpiar del dict
         del ticket_logs[thread.id]
 
-@tasks.loop(hours=1)
-async def check_cooldowns():
-    """Limpia cooldowns expirados por modalidad"""
-    now = datetime.now()
-    users_to_update = []
+async def expirar_cooldown(user_id: str, mode: str):
+    """Vence el cooldown de una modalidad: lo quita y avisa al jugador"""
+    modes_data = data.get('cooldowns', {}).get(user_id)
+    if not modes_data or mode not in modes_data:
+        return
+    if not modes_data[mode].is_expired():
+        # Se renovó sin pasar por el scheduler: volver a programarlo
+        expiry_scheduler.schedule(('cooldown', user_id, mode), modes_data[mode].end)
+        return
     
-    for user_id, modes_data in data.get('cooldowns', {}).items():
-        if not isinstance(modes_data, dict):
-            # Migrar formato antiguo
-            users_to_update.append(user_id)
-            continue
-            
-        modes_to_remove = []
-        
-        for mode, cooldown_data in modes_data.items():
-            try:
-                end_date = datetime.fromisoformat(cooldown_data['end_date'])
-                
-                if now >= end_date:
-                    modes_to_remove.append(mode)
-                    
-                    # Notificar que puede testearse en esa modalidad
-                    try:
-                        user = await bot.fetch_user(int(user_id))
-                        if user:
-                            embed = discord.Embed(
-                                title=f"✅ Cooldown Terminado - {mode}",
-                                description=f"Ya puedes testearte de nuevo en **{mode}**",
-                                color=discord.Color.green()
-                            )
-                            await user.send(embed=embed)
-                    except:
-                        pass
-            except:
-                modes_to_remove.append(mode)
-        
-        # Remover modalidades con cooldown expirado
-        for mode in modes_to_remove:
-            del data['cooldowns'][user_id][mode]
-        
-        # Si ya no tiene cooldowns en ninguna modalidad, remover usuario
-        if not data['cooldowns'][user_id]:
-            users_to_update.append(user_id)
+    del modes_data[mode]
+    journal.delete(('cooldowns', user_id, mode))
     
-    for user_id in users_to_update:
-        if user_id in data.get('cooldowns', {}):
-            del data['cooldowns'][user_id]
+    # Si ya no tiene cooldowns en ninguna modalidad, remover usuario
+    if not modes_data:
+        del data['cooldowns'][user_id]
+        journal.delete(('cooldowns', user_id))
     
-    if users_to_update or any(modes_data for modes_data in data.get('cooldowns', {}).values()):
-        save_data()
+    # Notificar que puede testearse en esa modalidad
+    embed = discord.Embed(
+        title=f"✅ Cooldown Terminado - {mode}",
+        description=f"Ya puedes testearte de nuevo en **{mode}**",
+        color=discord.Color.green()
+    )
+    notifier.enqueue(user_id, embed=embed, dedupe_key=f"cooldown-fin:{user_id}:{mode}")
+
+async def on_expiry(key):
+    """Callback del scheduler de vencimientos"""
+    if key[0] == 'cooldown':
+        await expirar_cooldown(key[1], key[2])
+    elif key[0] == 'ban':
+        await expirar_ban_temporal(key[1])
+
+# Vencimientos exactos de cooldowns y bans temporales (min-heap, sin revisar cada hora)
+expiry_scheduler = ExpiryScheduler(on_expiry)
+
+# Usuarios por id: caché del gateway, luego LRU con TTL, luego fetch_user
+users = UserResolver(bot)
+
+# DMs en segundo plano: los comandos y vencimientos encolan y siguen
+notifier = NotificationDispatcher(bot, workers=int(os.getenv('DM_WORKERS', '4')))
+
+def programar_vencimientos():
+    """Reconstruye el heap desde data (tras cargar cooldowns de PostgreSQL / data.json)"""
+    expiry_scheduler.clear()
+    for user_id, modes_data in data.get('cooldowns', {}).items():
+        for mode, cooldown in modes_data.items():
+            expiry_scheduler.schedule(('cooldown', user_id, mode), cooldown.end)
+    for user_id, ban_data in data.get('bans_temporales', {}).items():
+        expiry_scheduler.schedule(('ban', user_id), ban_data.get('end_date'))
+    print(f"⏳ {len(expiry_scheduler)} vencimientos programados")
 
 def check_user_cooldown(user_id: str, mode: str):
     """Verifica si un usuario tiene cooldown en una modalidad específica"""
     if user_id not in data.get('cooldowns', {}):
         return False, None
     
-    # Migrar formato antiguo (cooldown global)
-    if 'end_date' in data['cooldowns'][user_id]:
-        # Formato antiguo, aplicar a todas las modalidades
-        old_data = data['cooldowns'][user_id]
-        data['cooldowns'][user_id] = {}
-        for game_mode in GAME_MODES:
-            data['cooldowns'][user_id][game_mode] = old_data
-        save_data()
-    
     if mode not in data['cooldowns'][user_id]:
         return False, None
     
-    cooldown_data = data['cooldowns'][user_id][mode]
-    end_date = datetime.fromisoformat(cooldown_data['end_date'])
-    
-    if datetime.now() >= end_date:
+    cooldown = data['cooldowns'][user_id][mode]
+    if cooldown.is_expired():
+        expiry_scheduler.cancel(('cooldown', user_id, mode))
         del data['cooldowns'][user_id][mode]
+        journal.delete(('cooldowns', user_id, mode))
         if not data['cooldowns'][user_id]:
             del data['cooldowns'][user_id]
-        save_data()
+            journal.delete(('cooldowns', user_id))
         return False, None
     
-    return True, end_date
+    return True, cooldown.end_date
 
-def add_cooldown(user_id: str, mode: str):
-    """Agrega cooldown para una modalidad específica"""
+def set_cooldown(user_id: str, mode: str):
+    """Registra el cooldown en memoria (journal + vencimiento), sin tocar PostgreSQL"""
     end_date = datetime.now() + timedelta(days=COOLDOWN_DAYS)
     start_date = datetime.now()
     
     if user_id not in data['cooldowns']:
         data['cooldowns'][user_id] = {}
     
-    data['cooldowns'][user_id][mode] = {
-        'start_date': start_date.isoformat(),
-        'end_date': end_date.isoformat()
-    }
-    save_data()
-    
-    # Guardar también en PostgreSQL
-    if POSTGRESQL_AVAILABLE:
-        if database.save_cooldown(user_id, mode, start_date, end_date):
-            print(f"✅ Cooldown guardado en PostgreSQL: {user_id} - {mode}")
-        else:
-            print(f"⚠️ No se pudo guardar cooldown en PostgreSQL")
-    
-    return end_date
+    data['cooldowns'][user_id][mode] = Cooldown.from_datetimes(start_date, end_date)
+    expiry_scheduler.schedule(('cooldown', user_id, mode), end_date)
+    journal.set(('cooldowns', user_id, mode), data['cooldowns'][user_id][mode])
+    return start_date, end_date
 
 class TicketCloseView(discord.ui.View):
     def __init__(self, player_id: int):
@@ -554,7 +611,7 @@ class TicketCloseView(discord.ui.View):
             if log_channel:
                 # Obtener información del ticket
                 ticket_id = str(interaction.channel.id)
-                ticket_info = data['tickets'].get(ticket_id, {})
+                ticket_info = data['tickets'].get(ticket_id)
                 
                 # Crear embed de log
                 log_embed = discord.Embed(
@@ -568,8 +625,8 @@ class TicketCloseView(discord.ui.View):
                 tester_name = "Desconocido"
                 
                 if ticket_info:
-                    jugador = interaction.guild.get_member(int(ticket_info.get('jugador_id', 0)))
-                    tester = interaction.guild.get_member(int(ticket_info.get('tester_id', 0)))
+                    jugador = interaction.guild.get_member(int(ticket_info.jugador_id or 0))
+                    tester = interaction.guild.get_member(int(ticket_info.tester_id or 0))
                     
                     jugador_name = jugador.name if jugador else "Desconocido"
                     tester_name = tester.name if tester else "Desconocido"
@@ -586,12 +643,12 @@ class TicketCloseView(discord.ui.View):
                     )
                     log_embed.add_field(
                         name="🎮 Modalidad",
-                        value=ticket_info.get('modalidad', 'N/A'),
+                        value=ticket_info.modalidad or 'N/A',
                         inline=True
                     )
                     log_embed.add_field(
                         name="📅 Creado",
-                        value=f"<t:{int(datetime.fromisoformat(ticket_info['fecha']).timestamp())}:R>",
+                        value=f"<t:{records.unix_seconds(ticket_info.fecha)}:R>" if ticket_info.fecha else "N/A",
                         inline=True
                     )
                 
@@ -601,55 +658,37 @@ class TicketCloseView(discord.ui.View):
                     inline=True
                 )
                 
-                # GENERAR TRANSCRIPT.TXT CON TODO EL HISTORIAL
+                # GENERAR TRANSCRIPT CON TODO EL HISTORIAL (streaming, comprimido en otro hilo)
                 try:
-                    # Obtener todos los mensajes del canal
-                    messages = []
-                    async for msg in interaction.channel.history(limit=None, oldest_first=True):
-                        messages.append(msg)
-                    
-                    # Crear contenido del transcript
-                    transcript_content = f"TICKET TRANSCRIPT - {interaction.channel.name}\n"
-                    transcript_content += f"{'=' * 70}\n"
-                    transcript_content += f"Jugador: {jugador_name}\n"
-                    transcript_content += f"Tester: {tester_name}\n"
-                    transcript_content += f"Modalidad: {ticket_info.get('modalidad', 'N/A')}\n"
-                    transcript_content += f"Creado: {ticket_info.get('fecha', 'N/A')}\n"
-                    transcript_content += f"Cerrado: {datetime.now().isoformat()}\n"
-                    transcript_content += f"Cerrado por: {interaction.user.name}\n"
-                    transcript_content += f"{'=' * 70}\n\n"
-                    
-                    # Añadir todos los mensajes
-                    for msg in messages:
-                        timestamp = msg.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                        author = msg.author.name
-                        content = msg.content if msg.content else "[Sin texto]"
-                        
-                        transcript_content += f"[{timestamp}] {author}:\n"
-                        transcript_content += f"  {content}\n"
-                        
-                        # Añadir attachments si los hay
-                        if msg.attachments:
-                            for att in msg.attachments:
-                                transcript_content += f"  📎 Archivo: {att.url}\n"
-                        
-                        transcript_content += "\n"
-                    
-                    # Crear archivo .zip en memoria
-                    zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                        zip_file.writestr('transcript.txt', transcript_content.encode('utf-8'))
-                    
-                    zip_buffer.seek(0)
+                    meta = [
+                        ("Jugador", jugador_name),
+                        ("Tester", tester_name),
+                        ("Modalidad", ticket_info.modalidad if ticket_info else 'N/A'),
+                        ("Creado", records.to_iso(ticket_info.fecha) if ticket_info else 'N/A'),
+                        ("Cerrado", datetime.now().isoformat()),
+                        ("Cerrado por", interaction.user.name)
+                    ]
+                    # history() pagina de 100 en 100: nunca se carga el canal entero
+                    mensajes = (
+                        transcripts.message_from_discord(msg)
+                        async for msg in interaction.channel.history(limit=None, oldest_first=True)
+                    )
+                    zip_file, _ = await transcripts.build_transcript_zip(
+                        f"TICKET TRANSCRIPT - {interaction.channel.name}",
+                        meta,
+                        mensajes,
+                        fmt=TRANSCRIPT_FORMAT
+                    )
                     
                     # Enviar embed + archivo .zip
-                    await log_channel.send(
-                        embed=log_embed,
-                        file=discord.File(
-                            zip_buffer,
-                            filename=f"ticket_{interaction.channel.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+                    with zip_file:
+                        await log_channel.send(
+                            embed=log_embed,
+                            file=discord.File(
+                                zip_file,
+                                filename=f"ticket_{interaction.channel.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+                            )
                         )
-                    )
                     
                     print(f"✅ Transcript .zip generado para ticket {interaction.channel.name}")
                     
@@ -661,7 +700,7 @@ class TicketCloseView(discord.ui.View):
                 # Limpiar ticket de la data
                 if ticket_id in data['tickets']:
                     del data['tickets'][ticket_id]
-                    save_data()
+                    journal.delete(('tickets', ticket_id))
         except Exception as e:
             print(f"❌ Error enviando log de ticket: {e}")
         
@@ -703,19 +742,37 @@ class WaitlistView(discord.ui.View):
         # Defer inmediatamente para evitar timeouts
         await interaction.response.defer(ephemeral=True)
         
-        if self.modo not in data['waitlists']:
-            data['waitlists'][self.modo] = {'active': False, 'queue': [], 'testers': []}
-        
-        waitlist = data['waitlists'][self.modo]
+        user_id = str(interaction.user.id)
+        error = None
+        has_cooldown = False
+        
+        # Comprobar y encolar sin soltar el lock de la modalidad (sin awaits a Discord dentro)
+        async with waitlist_locks.hold(self.modo):
+            if self.modo not in data['waitlists']:
+                data['waitlists'][self.modo] = new_waitlist()
+                journal.set(('waitlists', self.modo), data['waitlists'][self.modo])
+            
+            waitlist = data['waitlists'][self.modo]
+            
+            if not waitlist['active']:
+                error = "❌ La waitlist está cerrada"
+            else:
+                # Verificar cooldown para esta modalidad específica
+                has_cooldown, end_date = check_user_cooldown(user_id, self.modo)
+                if not has_cooldown:
+                    if user_id in waitlist['queue']:
+                        error = "⚠️ Ya estás en la cola"
+                    elif len(waitlist['queue']) >= MAX_QUEUE_SIZE:
+                        error = f"⚠️ La cola está llena (máximo {MAX_QUEUE_SIZE} jugadores)"
+                    else:
+                        waitlist['queue'].append(user_id)
+                        journal.append(('waitlists', self.modo, 'queue'), user_id)
+                        position = waitlist['queue'].position(user_id)
         
-        if not waitlist['active']:
-            await interaction.followup.send("❌ La waitlist está cerrada", ephemeral=True)
+        if error:
+            await interaction.followup.send(error, ephemeral=True)
             return
         
-        user_id = str(interaction.user.id)
-        
-        # Verificar cooldown para esta modalidad específica
-        has_cooldown, end_date = check_user_cooldown(user_id, self.modo)
         if has_cooldown:
             time_left = end_date - datetime.now()
             days_left = time_left.days
@@ -732,18 +789,6 @@ class WaitlistView(discord.ui.View):
             await interaction.followup.send(embed=embed, ephemeral=True)
             return
         
-        if user_id in waitlist['queue']:
-            await interaction.followup.send("⚠️ Ya estás en la cola", ephemeral=True)
-            return
-        
-        if len(waitlist['queue']) >= MAX_QUEUE_SIZE:
-            await interaction.followup.send(f"⚠️ La cola está llena (máximo {MAX_QUEUE_SIZE} jugadores)", ephemeral=True)
-            return
-        
-        waitlist['queue'].append(user_id)
-        save_data()
-        
-        position = len(waitlist['queue'])
         await interaction.followup.send(
             f"✅ Te has unido a la waitlist de **{self.modo}**\nPosición: **#{position}**",
             ephemeral=True
@@ -755,16 +800,18 @@ class WaitlistView(discord.ui.View):
         # Defer inmediatamente para evitar timeouts
         await interaction.response.defer(ephemeral=True)
         
-        waitlist = data['waitlists'].get(self.modo, {'queue': []})
         user_id = str(interaction.user.id)
         
-        if user_id not in waitlist['queue']:
+        async with waitlist_locks.hold(self.modo):
+            waitlist = data['waitlists'].get(self.modo) or new_waitlist()
+            left = waitlist['queue'].discard(user_id)
+            if left:
+                journal.remove(('waitlists', self.modo, 'queue'), user_id)
+        
+        if not left:
             await interaction.followup.send("⚠️ No estás en la cola", ephemeral=True)
             return
         
-        waitlist['queue'].remove(user_id)
-        save_data()
-        
         await interaction.followup.send(f"✅ Has salido de la waitlist de **{self.modo}**", ephemeral=True)
         await self.update_panel(interaction)
     
@@ -781,22 +828,27 @@ class WaitlistView(discord.ui.View):
         # Defer inmediatamente para evitar timeouts
         await interaction.response.defer(ephemeral=True)
         
-        if self.modo not in data['waitlists']:
-            data['waitlists'][self.modo] = {'active': False, 'queue': [], 'testers': []}
-        
-        waitlist = data['waitlists'][self.modo]
         user_id = str(interaction.user.id)
         
-        if user_id in waitlist.get('testers', []):
-            waitlist['testers'].remove(user_id)
-            save_data()
-            await interaction.followup.send(f"✅ Has dejado de testear **{self.modo}**", ephemeral=True)
-        else:
-            if 'testers' not in waitlist:
-                waitlist['testers'] = []
-            waitlist['testers'].append(user_id)
-            save_data()
-            await interaction.followup.send(f"✅ Ahora estás testeando **{self.modo}**", ephemeral=True)
+        async with waitlist_locks.hold(self.modo):
+            if self.modo not in data['waitlists']:
+                data['waitlists'][self.modo] = new_waitlist()
+                journal.set(('waitlists', self.modo), data['waitlists'][self.modo])
+            
+            waitlist = data['waitlists'][self.modo]
+            
+            if user_id in waitlist.get('testers', []):
+                waitlist['testers'].remove(user_id)
+                journal.remove(('waitlists', self.modo, 'testers'), user_id)
+                reply = f"✅ Has dejado de testear **{self.modo}**"
+            else:
+                if 'testers' not in waitlist:
+                    waitlist['testers'] = []
+                waitlist['testers'].append(user_id)
+                journal.append(('waitlists', self.modo, 'testers'), user_id)
+                reply = f"✅ Ahora estás testeando **{self.modo}**"
+        
+        await interaction.followup.send(reply, ephemeral=True)
         
         await self.update_panel(interaction)
     
@@ -810,38 +862,48 @@ class WaitlistView(discord.ui.View):
             )
             return
         
-        waitlist = data['waitlists'].get(self.modo, {'queue': [], 'testers': []})
-        
-        if not waitlist['queue']:
-            await interaction.response.send_message("⚠️ No hay jugadores en cola", ephemeral=True)
-            return
-        
         tester_id = str(interaction.user.id)
-        if tester_id not in waitlist.get('testers', []):
-            await interaction.response.send_message("❌ Debes presionar el botón **Tester** primero", ephemeral=True)
-            return
+        error = None
         
-        # Defer inmediatamente DESPUÉS de verificaciones (crear ticket puede tardar)
-        await interaction.response.defer(ephemeral=True)
+        # Comprobar y sacar al siguiente en la misma sección crítica: dos testers
+        # pulsando Next a la vez nunca se llevan al mismo jugador
+        async with waitlist_locks.hold(self.modo):
+            waitlist = data['waitlists'].get(self.modo) or new_waitlist()
+            
+            if not waitlist['queue']:
+                error = "⚠️ No hay jugadores en cola"
+            elif tester_id not in waitlist.get('testers', []):
+                error = "❌ Debes presionar el botón **Tester** primero"
+            else:
+                next_user_id = waitlist['queue'].popleft()
+                journal.pop(('waitlists', self.modo, 'queue'), 0)
         
-        next_user_id = waitlist['queue'].pop(0)
-        save_data()
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
         
+        # Mientras no exista el canal del ticket, cualquier fallo devuelve al
+        # jugador al principio de la cola (ya se sacó de ella)
+        ticket_channel = None
         try:
-            next_user = await bot.fetch_user(int(next_user_id))
+            # Defer DESPUÉS de verificaciones, a la vez que se resuelve el jugador (independientes)
+            _, next_user = await asyncio.gather(
+                interaction.response.defer(ephemeral=True),
+                users.resolve(next_user_id)
+            )
+            if next_user is None:
+                raise ValueError(f"Usuario {next_user_id} no encontrado")
             guild = interaction.guild
             category_id = data['config'].get('ticket_category_id')
             
-            try:
-                dm_embed = discord.Embed(
-                    title=f"🎮 ¡Es tu turno para el test de {self.modo}!",
-                    description=f"El tester **{interaction.user.name}** te ha llamado para tu test.",
-                    color=discord.Color.blue()
-                )
-                dm_embed.add_field(name="Modalidad", value=f"{MODE_EMOJIS.get(self.modo, '🎮')} {self.modo}")
-                await next_user.send(embed=dm_embed)
-            except:
-                pass
+            dm_embed = discord.Embed(
+                title=f"🎮 ¡Es tu turno para el test de {self.modo}!",
+                description=f"El tester **{interaction.user.name}** te ha llamado para tu test.",
+                color=discord.Color.blue()
+            )
+            dm_embed.add_field(name="Modalidad", value=f"{MODE_EMOJIS.get(self.modo, '🎮')} {self.modo}")
+            # El DM sale en segundo plano, en paralelo con la creación del canal
+            notifier.enqueue(next_user.id, embed=dm_embed)
             
             if category_id:
                 category = guild.get_channel(category_id)
@@ -860,6 +922,11 @@ class WaitlistView(discord.ui.View):
                         overwrites=overwrites
                     )
                     
+                    # Registrar el ticket en cuanto existe el canal, antes de los mensajes
+                    ticket_id = str(ticket_channel.id)
+                    data['tickets'][ticket_id] = Ticket(next_user_id, tester_id, self.modo, datetime.now())
+                    journal.set(('tickets', ticket_id), data['tickets'][ticket_id])
+                    
                     ticket_embed = discord.Embed(
                         title=f"🎫 Test de {self.modo}",
                         description=f"**Jugador:** {next_user.mention}\n**Tester:** {interaction.user.mention}",
@@ -878,36 +945,60 @@ class WaitlistView(discord.ui.View):
                     
                     view = TicketCloseView(next_user.id)
                     
-                    # PRIMERO: Mensaje con menciones (esto SÍ notifica)
-                    await ticket_channel.send(f"{next_user.mention} {interaction.user.mention}")
-                    
-                    # DESPUÉS: Embeds con la información
-                    await ticket_channel.send(embed=ticket_embed)
-                    await ticket_channel.send(embed=form_embed, view=view)
-                    
-                    ticket_id = str(ticket_channel.id)
-                    data['tickets'][ticket_id] = {
-                        'jugador_id': next_user_id,
-                        'tester_id': tester_id,
-                        'modalidad': self.modo,
-                        'fecha': datetime.now().isoformat()
-                    }
-                    save_data()
+                    def send_intro():
+                        return ticket_channel.send(
+                            content=f"{next_user.mention} {interaction.user.mention}",
+                            embeds=[ticket_embed, form_embed],
+                            view=view
+                        )
                     
+                    # Un solo mensaje: menciones en el contenido (estas SÍ notifican) + ambos embeds,
+                    # enviado a la vez que la respuesta al tester
+                    intro, reply = await asyncio.gather(
+                        send_intro(),
+                        interaction.followup.send(
+                            f"✅ Ticket creado: {ticket_channel.mention}\n📩 DM enviado a {next_user.mention}",
+                            ephemeral=True
+                        ),
+                        return_exceptions=True
+                    )
+                    if isinstance(reply, Exception):
+                        print(f"⚠️ No se pudo confirmar el ticket {ticket_id} al tester: {reply}")
+                    if isinstance(intro, Exception):
+                        # Sin este mensaje el canal no tiene botón de cerrar: reintentar una vez
+                        print(f"⚠️ No se pudo enviar la presentación del ticket {ticket_id}, reintentando: {intro}")
+                        try:
+                            await send_intro()
+                        except Exception as e:
+                            print(f"❌ Ticket {ticket_id} sin presentación: {e}")
+                            try:
+                                await interaction.followup.send(
+                                    f"⚠️ No se pudo enviar la presentación en {ticket_channel.mention}: "
+                                    f"el ticket no tiene botón de cerrar, bórralo a mano al terminar",
+                                    ephemeral=True
+                                )
+                            except Exception as e:
+                                print(f"⚠️ No se pudo avisar al tester del ticket {ticket_id}: {e}")
+                else:
+                    await self._devolver_a_la_cola(next_user_id)
                     await interaction.followup.send(
-                        f"✅ Ticket creado: {ticket_channel.mention}\n📩 DM enviado a {next_user.mention}",
+                        "⚠️ Categoría no encontrada, el jugador vuelve a ser el primero de la cola",
                         ephemeral=True
                     )
-                else:
-                    await interaction.followup.send("⚠️ Categoría no encontrada", ephemeral=True)
             else:
+                await self._devolver_a_la_cola(next_user_id)
                 await interaction.followup.send(
-                    f"⚠️ Configura la categoría con `/configurar-tickets`",
+                    f"⚠️ Configura la categoría con `/configurar-tickets` (el jugador vuelve a ser el primero de la cola)",
                     ephemeral=True
                 )
         except Exception as e:
             print(f"Error: {e}")
-            await interaction.followup.send(f"❌ Error al procesar", ephemeral=True)
+            if ticket_channel is None:
+                await self._devolver_a_la_cola(next_user_id)
+            try:
+                await interaction.followup.send(f"❌ Error al procesar", ephemeral=True)
+            except Exception as e:
+                print(f"⚠️ No se pudo avisar al tester del error: {e}")
         
         await self.update_panel(interaction)
     
@@ -921,95 +1012,116 @@ class WaitlistView(discord.ui.View):
             )
             return
         
-        if self.modo not in data['waitlists']:
-            data['waitlists'][self.modo] = {'active': False, 'queue': [], 'testers': []}
-        
-        waitlist = data['waitlists'][self.modo]
-        
-        # Si se está cerrando la waitlist, limpiar la cola
-        if waitlist['active']:  # Si está activa y se va a cerrar
-            waitlist['queue'] = []  # LIMPIAR COLA
-            waitlist['testers'] = []  # También limpiar testers
-            status_msg = "🔴 Cerrada - Cola limpiada"
-        else:  # Si se va a abrir
-            status_msg = "🟢 Abierta"
-        
-        waitlist['active'] = not waitlist['active']
-        save_data()
+        async with waitlist_locks.hold(self.modo):
+            if self.modo not in data['waitlists']:
+                data['waitlists'][self.modo] = new_waitlist()
+                journal.set(('waitlists', self.modo), data['waitlists'][self.modo])
+            
+            waitlist = data['waitlists'][self.modo]
+            
+            # Si se está cerrando la waitlist, limpiar la cola
+            if waitlist['active']:  # Si está activa y se va a cerrar
+                waitlist['queue'].clear()  # LIMPIAR COLA
+                waitlist['testers'] = []  # También limpiar testers
+                status_msg = "🔴 Cerrada - Cola limpiada"
+            else:  # Si se va a abrir
+                status_msg = "🟢 Abierta"
+            
+            waitlist['active'] = not waitlist['active']
+            journal.set(('waitlists', self.modo), waitlist)
         
         await interaction.response.send_message(f"✅ Waitlist de **{self.modo}**: {status_msg}", ephemeral=True)
         await self.update_panel(interaction)
     
+    async def _devolver_a_la_cola(self, user_id):
+        """Vuelve a poner al jugador el primero de la cola (Next no llegó a crear su ticket)"""
+        async with waitlist_locks.hold(self.modo):
+            if self.modo not in data['waitlists']:
+                data['waitlists'][self.modo] = new_waitlist()
+                journal.set(('waitlists', self.modo), data['waitlists'][self.modo])
+            waitlist = data['waitlists'][self.modo]
+            if waitlist['queue'].appendleft(user_id):
+                journal.set(('waitlists', self.modo, 'queue'), waitlist['queue'].to_list())
+    
     async def update_panel(self, interaction: discord.Interaction):
-        waitlist = data['waitlists'].get(self.modo, {'active': False, 'queue': [], 'testers': []})
+        # No edita aquí: el renderer agrupa los clics y edita como mucho una vez por intervalo
+        panel_renderer.request(self.modo, interaction.message)
+
+def render_panel_embed(modo):
+    """Embed del panel de waitlist de modo con el estado actual"""
+    waitlist = data['waitlists'].get(modo) or new_waitlist()
+    
+    testers = waitlist.get('testers', [])
+    queue = waitlist['queue']
+    
+    # Si no hay testers activos
+    if not testers:
+        embed = discord.Embed(
+            title=f"{MODE_EMOJIS.get(modo, '🎮')} Queue Cerrada Temporalmente",
+            description="**No hay testers disponibles, la cola se encuentra cerrada.**",
+            color=discord.Color.red(),
+            timestamp=datetime.now()
+        )
+        embed.set_footer(text=f"Papayas tierlist - {modo}")
+    else:
+        # Formato vertical con testers y jugadores
+        color = discord.Color.green() if waitlist['active'] else discord.Color.red()
         
-        testers = waitlist.get('testers', [])
-        queue = waitlist['queue']
+        # Menciones construidas desde el id: sin ninguna llamada a la API
+        tester_mentions = [mention(t_id) for t_id in testers]
         
-        # Si no hay testers activos
-        if not testers:
-            embed = discord.Embed(
-                title=f"{MODE_EMOJIS.get(self.modo, '🎮')} Queue Cerrada Temporalmente",
-                description="**No hay testers disponibles, la cola se encuentra cerrada.**",
-                color=discord.Color.red(),
-                timestamp=datetime.now()
-            )
-            embed.set_footer(text=f"Papayas tierlist - {self.modo}")
-        else:
-            # Formato vertical con testers y jugadores
-            color = discord.Color.green() if waitlist['active'] else discord.Color.red()
-            
-            # Obtener menciones de testers
-            tester_mentions = []
-            for t_id in testers:
-                try:
-                    user = await bot.fetch_user(int(t_id))
-                    tester_mentions.append(user.mention)  # MENCIÓN REAL (azul, clickeable)
-                except:
-                    pass
-            
-            testers_text = " ".join(tester_mentions) if tester_mentions else "Ninguno"
+        testers_text = " ".join(tester_mentions) if tester_mentions else "Ninguno"
+        
+        embed = discord.Embed(
+            title=f"{MODE_EMOJIS.get(modo, '🎮')} Waitlist de {modo}",
+            color=color,
+            timestamp=datetime.now()
+        )
+        
+        embed.add_field(
+            name="**Testers en turno:**",
+            value=testers_text,
+            inline=False
+        )
+        
+        # Lista de espera
+        if queue:
+            # Con colas grandes solo caben los primeros: el resto se resume
+            lines = []
+            size = 0
+            for idx, player_id in enumerate(queue, 1):
+                line = f"{idx}. {mention(player_id)}\n"
+                if size + len(line) > PANEL_QUEUE_CHARS:
+                    lines.append(f"… y {len(queue) - idx + 1} más\n")
+                    break
+                lines.append(line)
+                size += len(line)
+            queue_text = "".join(lines)
             
-            embed = discord.Embed(
-                title=f"{MODE_EMOJIS.get(self.modo, '🎮')} Waitlist de {self.modo}",
-                color=color,
-                timestamp=datetime.now()
+            embed.add_field(
+                name="**Lista de espera:**",
+                value=queue_text if queue_text else "Vacía",
+                inline=False
             )
-            
+        else:
             embed.add_field(
-                name="**Testers en turno:**",
-                value=testers_text,
+                name="**Lista de espera:**",
+                value="Vacía",
                 inline=False
             )
-            
-            # Lista de espera
-            if queue:
-                queue_text = ""
-                for idx, player_id in enumerate(queue, 1):
-                    try:
-                        user = await bot.fetch_user(int(player_id))
-                        queue_text += f"{idx}. {user.mention}\n"  # MENCIÓN REAL (azul, clickeable)
-                    except:
-                        queue_text += f"{idx}. Usuario desconocido\n"
-                
-                embed.add_field(
-                    name="**Lista de espera:**",
-                    value=queue_text if queue_text else "Vacía",
-                    inline=False
-                )
-            else:
-                embed.add_field(
-                    name="**Lista de espera:**",
-                    value="Vacía",
-                    inline=False
-                )
-            
-            embed.set_footer(text=f"Papayas tierlist - {self.modo} | Máximo {MAX_QUEUE_SIZE} jugadores")
         
-        try:
-            await interaction.message.edit(embed=embed)
-        except:
-            pass
+        embed.set_footer(text=f"Papayas tierlist - {modo} | Máximo {MAX_QUEUE_SIZE} jugadores")
+    
+    return embed
+
+# Un lock por modalidad: comprobaciones y mutaciones de cada waitlist en serie, modalidades en paralelo
+waitlist_locks = WaitlistLocks()
+
+# Paneles de waitlist: ediciones coalescidas por modalidad (PANEL_EDIT_INTERVAL_MS entre ediciones)
+panel_renderer = PanelRenderer(
+    render_panel_embed,
+    interval=int(os.getenv('PANEL_EDIT_INTERVAL_MS', '1500')) / 1000
+)
 
 async def auto_close_ticket(channel, delay):
     await asyncio.sleep(delay)
@@ -1048,7 +1160,7 @@ async def crear_waitlist(interaction: discord.Interaction, modo: str):
     if 'panel_messages' not in data:
         data['panel_messages'] = {}
     data['panel_messages'][modo] = message.id
-    save_data()
+    journal.set(('panel_messages', modo), message.id)
     
     await interaction.response.send_message(f"✅ Panel de waitlist para **{modo}** creado", ephemeral=True)
 
@@ -1057,7 +1169,7 @@ async def crear_waitlist(interaction: discord.Interaction, modo: str):
 @app_commands.checks.has_permissions(administrator=True)
 async def configurar_tickets(interaction: discord.Interaction, categoria: discord.CategoryChannel):
     data['config']['ticket_category_id'] = categoria.id
-    save_data()
+    journal.set(('config', 'ticket_category_id'), categoria.id)
     await interaction.response.send_message(f"✅ Categoría de tickets configurada: {categoria.name}", ephemeral=True)
 
 @bot.tree.command(name="resultado", description="Publica resultado de test (tiers bajos)")
@@ -1244,6 +1356,8 @@ async def publicar_resultado(
     data['jugadores'][jugador_id]['nick_mc'] = nick_mc
     data['jugadores'][jugador_id]['discord_name'] = str(jugador_discord)
     data['jugadores'][jugador_id]['es_premium'] = es_premium
+    journal.set(('jugadores', jugador_id), data['jugadores'][jugador_id])
+    leaderboards.update_player(jugador_id, data['jugadores'][jugador_id])
     
     embed = discord.Embed(
         title=f"{tier_emoji} RESULTADO DE TEST - {modo.upper()}",
@@ -1272,7 +1386,7 @@ async def publicar_resultado(
     
     # SIN FOOTER
     
-    data['resultados'].append({
+    resultado = result_store.add({
         'nick_mc': nick_mc,
         'jugador_id': str(jugador_discord.id),
         'jugador_name': str(jugador_discord),
@@ -1285,28 +1399,11 @@ async def publicar_resultado(
         'puntos_totales': puntos_totales,
         'fecha': datetime.now().isoformat()
     })
+    journal.append(('resultados',), resultado)
     
-    # Guardar también en PostgreSQL
-    if POSTGRESQL_AVAILABLE:
-        resultado_obj = {
-            'nick_mc': nick_mc,
-            'jugador_id': str(jugador_discord.id),
-            'jugador_name': str(jugador_discord),
-            'tester_id': str(tester_discord.id),
-            'tester_name': str(tester_discord),
-            'modalidad': modo,
-            'tier_antiguo': tier_antiguo,
-            'tier_nuevo': tier_nuevo,
-            'puntos_obtenidos': puntos_tier,
-            'puntos_totales': puntos_totales,
-            'fecha': datetime.now().isoformat()
-        }
-        if database.add_resultado(resultado_obj):
-            print(f"✅ Resultado guardado en PostgreSQL")
-        else:
-            print(f"⚠️ No se pudo guardar en PostgreSQL (usando solo memoria)")
+    start_date, end_date = set_cooldown(jugador_id, modo)
     
-    # Guardar también jugador en PostgreSQL
+    # Resultado + jugador + cooldown en PostgreSQL: una conexión, un commit
     if POSTGRESQL_AVAILABLE:
         jugador_obj = {
             'discord_id': str(jugador_discord.id),
@@ -1317,13 +1414,14 @@ async def publicar_resultado(
             'puntos_totales': puntos_totales,
             'es_premium': es_premium
         }
-        if database.save_or_update_jugador(jugador_obj):
-            print(f"✅ Jugador guardado en PostgreSQL")
+        cooldown = (jugador_id, modo, start_date, end_date)
+        if await database_async.record_test_outcome(resultado.to_dict(), jugador_obj, cooldown):
+            print(f"✅ Resultado, jugador y cooldown guardados en PostgreSQL")
         else:
-            print(f"⚠️ No se pudo guardar jugador en PostgreSQL")
+            print(f"⚠️ No se pudo guardar en PostgreSQL (usando solo memoria)")
     
-    end_date = add_cooldown(jugador_id, modo)
-    save_data()
+    # Rankings / perfil / stats de la API ya no son válidos
+    response_cache.invalidate()
     
     # Enviar al canal de RESULTADOS con reacciones
     resultado_channel_id = data.get('config', {}).get('resultado_channel_id', 1459289305414635560)
@@ -1391,30 +1489,27 @@ async def publicar_resultado(
         traceback.print_exc()
     
     # DM de cooldown
-    try:
-        cooldown_embed = discord.Embed(
-            title=f"✅ ¡Gracias por testearte en {modo}!",
-            description=f"Para volver a testearte en **{modo}** tendrás que esperar **{COOLDOWN_DAYS} días**\n\n✨ Puedes testearte en otras modalidades sin esperar",
-            color=discord.Color.blue()
-        )
-        cooldown_embed.add_field(
-            name=f"🎮 Modalidad",
-            value=f"{MODE_EMOJIS.get(modo, '🎮')} {modo}",
-            inline=True
-        )
-        cooldown_embed.add_field(
-            name="📅 Disponible de nuevo",
-            value=f"<t:{int(end_date.timestamp())}:F>",
-            inline=False
-        )
-        cooldown_embed.add_field(
-            name="⏰ Tiempo restante",
-            value=f"<t:{int(end_date.timestamp())}:R>",
-            inline=False
-        )
-        await jugador_discord.send(embed=cooldown_embed)
-    except:
-        pass
+    cooldown_embed = discord.Embed(
+        title=f"✅ ¡Gracias por testearte en {modo}!",
+        description=f"Para volver a testearte en **{modo}** tendrás que esperar **{COOLDOWN_DAYS} días**\n\n✨ Puedes testearte en otras modalidades sin esperar",
+        color=discord.Color.blue()
+    )
+    cooldown_embed.add_field(
+        name=f"🎮 Modalidad",
+        value=f"{MODE_EMOJIS.get(modo, '🎮')} {modo}",
+        inline=True
+    )
+    cooldown_embed.add_field(
+        name="📅 Disponible de nuevo",
+        value=f"<t:{int(end_date.timestamp())}:F>",
+        inline=False
+    )
+    cooldown_embed.add_field(
+        name="⏰ Tiempo restante",
+        value=f"<t:{int(end_date.timestamp())}:R>",
+        inline=False
+    )
+    notifier.enqueue(jugador_id, embed=cooldown_embed, dedupe_key=f"cooldown:{jugador_id}:{modo}:{int(end_date.timestamp())}")
 
 @bot.tree.command(name="banchiterlist", description="Banea a un jugador de la chiterlist")
 @app_commands.describe(
@@ -1488,6 +1583,7 @@ async def banchiterlist(
     }
     
     data['castigos'].append(ban_data)
+    journal.append(('castigos',), ban_data)
     
     # Si es ban temporal (Alt), agregar a sistema de auto-unban
     if motivo == "alt" and finalizacion_date:
@@ -1499,8 +1595,10 @@ async def banchiterlist(
             'end_date': finalizacion_date.isoformat(),
             'motivo': motivo
         }
+        journal.set(('bans_temporales', str(jugador_discord.id)), data['bans_temporales'][str(jugador_discord.id)])
+        expiry_scheduler.schedule(('ban', str(jugador_discord.id)), finalizacion_date)
     
-    save_data()
+    response_cache.invalidate()
     
     await interaction.response.send_message(embed=embed)
     
@@ -1558,56 +1656,36 @@ async def banchiterlist(
                 inline=False
             )
         
-        await jugador_discord.send(embed=dm_embed)
-        print(f"✅ DM de ban enviado a {jugador_discord.name}")
+        notifier.enqueue(jugador_discord.id, embed=dm_embed, dedupe_key=f"ban:{jugador_discord.id}:{ban_data['fecha']}")
     except Exception as e:
-        print(f"❌ No se pudo enviar DM: {e}")
+        print(f"❌ No se pudo preparar el DM de ban: {e}")
 
-@tasks.loop(hours=1)
-async def check_temp_bans():
-    """Verifica bans temporales cada hora y los quita automáticamente"""
-    now = datetime.now()
-    bans_to_remove = []
-    
-    if 'bans_temporales' not in data:
+async def expirar_ban_temporal(user_id: str):
+    """Quita un ban temporal al vencer y avisa al jugador"""
+    ban_data = data.get('bans_temporales', {}).get(user_id)
+    if not ban_data:
+        return
+    end_ts = records.to_epoch(ban_data.get('end_date'))
+    if end_ts is not None and records.now_epoch() < end_ts:
+        expiry_scheduler.schedule(('ban', user_id), end_ts)
         return
     
-    for user_id, ban_data in data.get('bans_temporales', {}).items():
-        try:
-            end_date = datetime.fromisoformat(ban_data['end_date'])
-            
-            if now >= end_date:
-                # Ban expirado - notificar al jugador
-                user = await bot.fetch_user(int(user_id))
-                if user:
-                    try:
-                        unban_embed = discord.Embed(
-                            title="✅ Tu ban ha expirado",
-                            description="Ya puedes volver a testearte en Papayas tierlist",
-                            color=discord.Color.green()
-                        )
-                        unban_embed.add_field(
-                            name="ℹ️ Información",
-                            value=f"Tu ban de 30 días por uso de alt ha finalizado.\nYa puedes unirte a las waitlists normalmente.",
-                            inline=False
-                        )
-                        await user.send(embed=unban_embed)
-                        print(f"✅ Ban temporal expirado para {user.name}")
-                    except:
-                        pass
-                
-                bans_to_remove.append(user_id)
-        except:
-            bans_to_remove.append(user_id)
-    
-    # Remover bans expirados
-    for user_id in bans_to_remove:
-        if user_id in data.get('bans_temporales', {}):
-            del data['bans_temporales'][user_id]
+    del data['bans_temporales'][user_id]
+    journal.delete(('bans_temporales', user_id))
+    print(f"🔄 Ban temporal expirado: {user_id}")
     
-    if bans_to_remove:
-        save_data()
-        print(f"🔄 Removidos {len(bans_to_remove)} bans temporales expirados")
+    # Notificar al jugador
+    unban_embed = discord.Embed(
+        title="✅ Tu ban ha expirado",
+        description="Ya puedes volver a testearte en Papayas tierlist",
+        color=discord.Color.green()
+    )
+    unban_embed.add_field(
+        name="ℹ️ Información",
+        value=f"Tu ban de 30 días por uso de alt ha finalizado.\nYa puedes unirte a las waitlists normalmente.",
+        inline=False
+    )
+    notifier.enqueue(user_id, embed=unban_embed, dedupe_key=f"ban-fin:{user_id}")
 
 @tasks.loop(hours=6)
 async def cleanup_task():
@@ -1616,6 +1694,9 @@ async def cleanup_task():
         cleaned_c, cleaned_b = cleanup_old_data()
         if cleaned_c or cleaned_b:
             print(f"🧹 Limpieza automática: {cleaned_c} cooldowns, {cleaned_b} bans")
+        # Particiones de resultados de los próximos meses (el bot puede llevar meses sin reiniciar)
+        if POSTGRESQL_AVAILABLE:
+            await database_async.ensure_resultados_partitions()
     except Exception as e:
         print(f"❌ Error en limpieza: {e}")
 
@@ -1710,48 +1791,10 @@ class TopTesterView(discord.ui.View):
 async def create_toptester_embed(mode: str):
     """Crea el embed de top testers para el modo especificado"""
     
-    # Obtener stats de testers
-    tester_counts_global = {}  # Todos los tiempos
-    tester_counts_month = {}   # Solo este mes
-    
-    # Fecha actual para filtrar mes
+    # Contadores ya mantenidos por el store (sin recorrer todos los resultados)
     now = datetime.now()
-    current_month = now.month
-    current_year = now.year
-    
-    # Procesar resultados
-    for resultado in data.get('resultados', []):
-        tester_id = resultado.get('tester_id')
-        tester_name = resultado.get('tester_name', 'Unknown')
-        modalidad = resultado.get('modalidad', '')
-        fecha_str = resultado.get('fecha', '')
-        
-        # Filtrar por modo si no es Overall
-        if mode != 'Overall' and modalidad != mode:
-            continue
-        
-        if tester_id:
-            # Stats globales
-            if tester_id not in tester_counts_global:
-                tester_counts_global[tester_id] = {
-                    'name': tester_name,
-                    'count': 0
-                }
-            tester_counts_global[tester_id]['count'] += 1
-            
-            # Stats del mes
-            if fecha_str:
-                try:
-                    fecha = datetime.fromisoformat(fecha_str)
-                    if fecha.month == current_month and fecha.year == current_year:
-                        if tester_id not in tester_counts_month:
-                            tester_counts_month[tester_id] = {
-                                'name': tester_name,
-                                'count': 0
-                            }
-                        tester_counts_month[tester_id]['count'] += 1
-                except:
-                    pass
+    top_global = result_store.top_testers(mode, limit=10)
+    top_month = result_store.top_testers(mode, month=(now.year, now.month), limit=10)
     
     # Crear embed
     mode_emoji = MODE_EMOJIS.get(mode, '🏆')
@@ -1764,14 +1807,11 @@ async def create_toptester_embed(mode: str):
     )
     
     # Top Global (todos los tiempos)
-    if tester_counts_global:
-        sorted_global = sorted(tester_counts_global.items(), key=lambda x: x[1]['count'], reverse=True)
-        
+    if top_global:
         top_global_text = ""
-        for i, (tid, tdata) in enumerate(sorted_global[:10], 1):
+        for i, (tid, name, count) in enumerate(top_global, 1):
             # Usar nombre guardado en vez de fetch (más rápido)
-            name = tdata['name']
-            top_global_text += f"**#{i}** - {name} · **{tdata['count']} tests**\n"
+            top_global_text += f"**#{i}** - {name} · **{count} tests**\n"
         
         embed.add_field(
             name="🌍 Top Global",
@@ -1786,14 +1826,11 @@ async def create_toptester_embed(mode: str):
         )
     
     # Top del Mes
-    if tester_counts_month:
-        sorted_month = sorted(tester_counts_month.items(), key=lambda x: x[1]['count'], reverse=True)
-        
+    if top_month:
         top_month_text = ""
-        for i, (tid, tdata) in enumerate(sorted_month[:10], 1):
+        for i, (tid, name, count) in enumerate(top_month, 1):
             # Usar nombre guardado en vez de fetch (más rápido)
-            name = tdata['name']
-            top_month_text += f"**#{i}** - {name} · **{tdata['count']} tests**\n"
+            top_month_text += f"**#{i}** - {name} · **{count} tests**\n"
         
         embed.add_field(
             name="📅 Top del mes",  # SIN nombre de mes específico
@@ -1827,10 +1864,7 @@ async def sacatester(interaction: discord.Interaction, tester: discord.User):
     tester_id = str(tester.id)
     
     # Contar tests del tester ANTES de remover
-    tests_count = 0
-    for resultado in data.get('resultados', []):
-        if resultado.get('tester_id') == tester_id:
-            tests_count += 1
+    tests_count = result_store.count(tester_id=tester_id)
     
     if tests_count == 0:
         await interaction.response.send_message(
@@ -1865,21 +1899,18 @@ async def sacatester(interaction: discord.Interaction, tester: discord.User):
     # En producción, podrías agregar botones de confirmación
     
     # Remover tests del tester
-    resultados_originales = len(data.get('resultados', []))
-    data['resultados'] = [
-        resultado for resultado in data.get('resultados', [])
-        if resultado.get('tester_id') != tester_id
-    ]
-    resultados_nuevos = len(data['resultados'])
-    tests_removidos = resultados_originales - resultados_nuevos
+    tests_removidos = result_store.remove_tester(tester_id)
+    resultados_nuevos = len(result_store)
     
     save_data()
     
     # Eliminar también de PostgreSQL
     if POSTGRESQL_AVAILABLE:
-        deleted_db = database.delete_tester_resultados(tester_id)
+        deleted_db = await database_async.delete_tester_resultados(tester_id)
         print(f"✅ Eliminados {deleted_db} resultados de PostgreSQL")
     
+    response_cache.invalidate()
+    
     # Embed de confirmación
     embed_success = discord.Embed(
         title="✅ Tester Removido",
@@ -1936,11 +1967,10 @@ async def añadetesteratoptester(interaction: discord.Interaction, tester: disco
     tester_id = str(tester.id)
     tester_name = str(tester)
     
-    # Crear tests falsos
-    tests_creados = 0
-    for i in range(cantidad):
-        # Crear resultado falso con jugador genérico
-        fake_resultado = {
+    # Crear tests falsos con jugadores genéricos
+    fecha = datetime.now().isoformat()
+    fake_resultados = [
+        {
             'jugador_id': f'fake_player_{i}_{tester_id}',
             'jugador_name': f'FakePlayer{i}',
             'nick_mc': f'FakePlayer{i}',
@@ -1951,18 +1981,25 @@ async def añadetesteratoptester(interaction: discord.Interaction, tester: disco
             'tier_nuevo': 'LT4',
             'puntos_obtenidos': 100,
             'puntos_totales': 100,
-            'fecha': datetime.now().isoformat()
+            'fecha': fecha
         }
-        
-        data['resultados'].append(fake_resultado)
-        
-        # Guardar también en PostgreSQL
-        if POSTGRESQL_AVAILABLE:
-            database.add_resultado(fake_resultado)
-        
-        tests_creados += 1
+        for i in range(cantidad)
+    ]
     
+    # PostgreSQL: un solo INSERT multi-fila y un commit (en vez de una conexión por test)
+    if POSTGRESQL_AVAILABLE:
+        if await database_async.add_resultados(fake_resultados) is False:
+            await interaction.response.send_message(
+                "❌ No se pudieron guardar los tests en PostgreSQL, no se añadió ninguno",
+                ephemeral=True
+            )
+            return
+    
+    # Memoria: todos los índices de una vez y un snapshot en vez de cientos de registros de journal
+    tests_creados = len(result_store.add_many(fake_resultados))
     save_data()
+    response_cache.invalidate()
+    
     print(f"✅ {tests_creados} tests añadidos al tester {tester_name}")
     
     # Embed de confirmación
@@ -1983,7 +2020,7 @@ async def añadetesteratoptester(interaction: discord.Interaction, tester: disco
     )
     embed_success.add_field(
         name="📋 Total resultados",
-        value=f"**{len(data['resultados'])} tests**",
+        value=f"**{len(result_store)} tests**",
         inline=False
     )
     embed_success.add_field(
@@ -2010,6 +2047,92 @@ async def añadetesteratoptester(interaction: discord.Interaction, tester: disco
     
     print(f"✅ Tests añadidos: {tester.name} (+{tests_creados} tests)")
 
+@bot.tree.command(name="importar-resultados", description="Importa un historial de resultados (JSON o CSV)")
+@app_commands.describe(archivo="Export .json (lista o /backup) o .csv con las columnas de resultados")
+@app_commands.checks.has_permissions(administrator=True)
+async def importar_resultados(interaction: discord.Interaction, archivo: discord.Attachment):
+    """Importa resultados históricos a PostgreSQL por lotes, informando del progreso"""
+    if not POSTGRESQL_AVAILABLE:
+        await interaction.response.send_message("❌ PostgreSQL no está disponible", ephemeral=True)
+        return
+    
+    nombre = archivo.filename.lower()
+    if not nombre.endswith(('.json', '.csv')):
+        await interaction.response.send_message("❌ El archivo debe ser .json o .csv", ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True)
+    
+    try:
+        contenido = (await archivo.read()).decode('utf-8-sig')
+    except Exception as e:
+        await interaction.followup.send(f"❌ No se pudo leer el archivo: {e}", ephemeral=True)
+        return
+    
+    # Leer y validar lote a lote fuera del event loop, como import_resultados:
+    # nunca se tiene el export entero validado en memoria
+    lotes = database.chunked(
+        database.iter_resultados_export(contenido, 'csv' if nombre.endswith('.csv') else 'json')
+    )
+    
+    def siguiente_lote():
+        lote = next(lotes, None)
+        if lote is None:
+            return None
+        validos = [r for r in map(database.normalize_resultado, lote) if r is not None]
+        return validos, len(lote) - len(validos)
+    
+    importados = omitidos = duplicados = 0
+    completo = True
+    error_lectura = None
+    ultimo_aviso = 0.0
+    progreso = await interaction.followup.send("📥 Importando resultados...", ephemeral=True, wait=True)
+    
+    while True:
+        try:
+            paso = await asyncio.to_thread(siguiente_lote)
+        except Exception as e:
+            completo = False
+            error_lectura = e
+            break
+        if paso is None:
+            break
+        validos, descartados = paso
+        omitidos += descartados
+        if not validos:
+            continue
+        
+        # Los que ya están en PostgreSQL (reimportar un export o un /backup) se saltan
+        insertados = await database_async.add_resultados_nuevos(validos)
+        if insertados is False:
+            completo = False
+            break
+        importados += len(insertados)
+        duplicados += len(validos) - len(insertados)
+        # Contadores de /toptester y /stats, sin guardar los registros en memoria
+        result_store.add_history(insertados)
+        
+        # Editar el mensaje como mucho cada 2 segundos
+        if time.monotonic() - ultimo_aviso >= 2:
+            ultimo_aviso = time.monotonic()
+            await progreso.edit(content=f"📥 Importando... **{importados}** resultados ({omitidos} omitidos, {duplicados} ya existían)")
+    
+    response_cache.invalidate()
+    
+    if completo:
+        estado = "✅ Importación completa"
+    elif error_lectura is not None:
+        estado = f"⚠️ Importación interrumpida (archivo no válido: {error_lectura})"
+    else:
+        estado = "⚠️ Importación interrumpida (error de PostgreSQL)"
+    await progreso.edit(content=(
+        f"{estado}\n"
+        f"📥 Importados: **{importados}**\n"
+        f"⏭️ Filas omitidas (sin ids, fecha o puntos inválidos): **{omitidos}**\n"
+        f"♻️ Ya existían (no se duplican): **{duplicados}**"
+    ))
+    print(f"📥 Importación de {archivo.filename}: {importados} importados, {omitidos} omitidos, {duplicados} duplicados")
+
 @bot.tree.command(name="ver-cooldowns", description="Ver todos los cooldowns activos")
 @app_commands.checks.has_permissions(manage_roles=True)
 async def ver_cooldowns(interaction: discord.Interaction):
@@ -2025,39 +2148,26 @@ async def ver_cooldowns(interaction: discord.Interaction):
         color=discord.Color.orange()
     )
     
-    count = 0
-    for user_id, modes_data in list(cooldowns.items()):
-        if count >= 10:
-            break
-            
+    # Resolver los 10 usuarios a mostrar en paralelo (casi siempre desde caché)
+    mostrados = list(cooldowns.items())[:10]
+    resolved = await users.resolve_many(user_id for user_id, _ in mostrados)
+    
+    for user_id, modes_data in mostrados:
         try:
-            user = await bot.fetch_user(int(user_id))
+            user = resolved.get(int(user_id))
+            nombre = user.name if user else f"Usuario {user_id}"
             
-            # Si es formato antiguo (solo tiene end_date), mostrar como antes
-            if isinstance(modes_data, dict) and 'end_date' in modes_data:
-                end_date = datetime.fromisoformat(modes_data['end_date'])
-                time_left = end_date - datetime.now()
-                days = time_left.days
+            modes_text = ""
+            for mode, cooldown in modes_data.items():
+                modes_text += f"{MODE_EMOJIS.get(mode, '🎮')} {mode}: <t:{records.unix_seconds(cooldown.end)}:R>\n"
+            
+            if modes_text:
                 embed.add_field(
-                    name=f"👤 {user.name}",
-                    value=f"Todas las modalidades\nFinaliza: <t:{int(end_date.timestamp())}:R> ({days} días)",
+                    name=f"👤 {nombre}",
+                    value=modes_text.strip(),
                     inline=False
                 )
-            else:
-                # Formato nuevo (por modalidad)
-                modes_text = ""
-                for mode, cooldown_data in modes_data.items():
-                    end_date = datetime.fromisoformat(cooldown_data['end_date'])
-                    modes_text += f"{MODE_EMOJIS.get(mode, '🎮')} {mode}: <t:{int(end_date.timestamp())}:R>\n"
-                
-                if modes_text:
-                    embed.add_field(
-                        name=f"👤 {user.name}",
-                        value=modes_text.strip(),
-                        inline=False
-                    )
             
-            count += 1
         except Exception as e:
             print(f"Error mostrando cooldown de {user_id}: {e}")
             pass
@@ -2100,8 +2210,10 @@ async def cooldowndesactivar(
     
     if modo == "all":
         # Quitar cooldown de todas las modalidades
+        for game_mode in data['cooldowns'][jugador_id]:
+            expiry_scheduler.cancel(('cooldown', jugador_id, game_mode))
         del data['cooldowns'][jugador_id]
-        save_data()
+        journal.delete(('cooldowns', jugador_id))
         
         embed = discord.Embed(
             title="✅ Cooldown Eliminado",
@@ -2115,24 +2227,14 @@ async def cooldowndesactivar(
         await interaction.response.send_message(embed=embed)
         
         # Notificar al jugador
-        try:
-            dm_embed = discord.Embed(
-                title="✅ Cooldown Eliminado",
-                description="Un administrador eliminó tu cooldown. Ya puedes testearte en todas las modalidades.",
-                color=discord.Color.green()
-            )
-            await jugador.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="✅ Cooldown Eliminado",
+            description="Un administrador eliminó tu cooldown. Ya puedes testearte en todas las modalidades.",
+            color=discord.Color.green()
+        )
+        notifier.enqueue(jugador.id, embed=dm_embed)
     else:
         # Quitar cooldown de modalidad específica
-        if isinstance(data['cooldowns'][jugador_id], dict) and 'end_date' in data['cooldowns'][jugador_id]:
-            # Formato antiguo, convertir primero
-            old_data = data['cooldowns'][jugador_id]
-            data['cooldowns'][jugador_id] = {}
-            for game_mode in GAME_MODES:
-                data['cooldowns'][jugador_id][game_mode] = old_data
-        
         if modo not in data['cooldowns'][jugador_id]:
             await interaction.response.send_message(
                 f"❌ {jugador.mention} no tiene cooldown activo en **{modo}**",
@@ -2141,12 +2243,14 @@ async def cooldowndesactivar(
             return
         
         del data['cooldowns'][jugador_id][modo]
+        expiry_scheduler.cancel(('cooldown', jugador_id, modo))
         
         # Si ya no tiene cooldowns en ninguna modalidad, eliminar jugador
         if not data['cooldowns'][jugador_id]:
             del data['cooldowns'][jugador_id]
-        
-        save_data()
+            journal.delete(('cooldowns', jugador_id))
+        else:
+            journal.set(('cooldowns', jugador_id), data['cooldowns'][jugador_id])
         
         embed = discord.Embed(
             title="✅ Cooldown Eliminado",
@@ -2160,15 +2264,12 @@ async def cooldowndesactivar(
         await interaction.response.send_message(embed=embed)
         
         # Notificar al jugador
-        try:
-            dm_embed = discord.Embed(
-                title=f"✅ Cooldown Eliminado - {modo}",
-                description=f"Un administrador eliminó tu cooldown en **{modo}**. Ya puedes testearte en esta modalidad.",
-                color=discord.Color.green()
-            )
-            await jugador.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title=f"✅ Cooldown Eliminado - {modo}",
+            description=f"Un administrador eliminó tu cooldown en **{modo}**. Ya puedes testearte en esta modalidad.",
+            color=discord.Color.green()
+        )
+        notifier.enqueue(jugador.id, embed=dm_embed)
 
 
 
@@ -2199,6 +2300,17 @@ async def send_message(interaction: discord.Interaction, canal: discord.TextChan
 # Copiar y pegar ANTES de la línea: bot.run(os.getenv('DISCORD_TOKEN'))
 
 # COMANDO 1: /miperfil
+async def obtener_posiciones(jugador_id: str):
+    """Posiciones del jugador (overall + modalidades): ranking en memoria o PostgreSQL"""
+    posiciones = leaderboards.positions(jugador_id)
+    if posiciones or not POSTGRESQL_AVAILABLE:
+        return posiciones
+    try:
+        return await database_async.get_posiciones_jugador(jugador_id)
+    except Exception as e:
+        print(f"⚠️ Error obteniendo posición: {e}")
+        return {}
+
 @bot.tree.command(name="miperfil", description="Ver tu perfil y estadísticas")
 @app_commands.describe(usuario="Usuario a consultar (opcional, por defecto tú)")
 async def miperfil(interaction: discord.Interaction, usuario: discord.User = None):
@@ -2210,11 +2322,14 @@ async def miperfil(interaction: discord.Interaction, usuario: discord.User = Non
     
     jugador_id = str(usuario.id)
     
+    # Defer: las consultas a PostgreSQL pueden tardar más de 3 segundos
+    await interaction.response.defer(ephemeral=True)
+    
     # Buscar en PostgreSQL primero
     jugador_data = None
     if POSTGRESQL_AVAILABLE:
         try:
-            jugador_data = database.get_jugador_by_id(jugador_id)
+            jugador_data = await database_async.get_jugador_by_id(jugador_id)
         except:
             pass
     
@@ -2223,31 +2338,16 @@ async def miperfil(interaction: discord.Interaction, usuario: discord.User = Non
         jugador_data = data['jugadores'][jugador_id]
     
     if not jugador_data:
-        await interaction.response.send_message(
+        await interaction.followup.send(
             f"❌ {usuario.mention} no tiene datos registrados aún",
             ephemeral=True
         )
         return
     
-    # Calcular posición global
-    todos_jugadores = []
-    if POSTGRESQL_AVAILABLE:
-        try:
-            conn = database.get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                cur.execute("SELECT discord_id, puntos_totales FROM jugadores ORDER BY puntos_totales DESC")
-                todos_jugadores = cur.fetchall()
-                conn.close()
-        except:
-            pass
-    
-    posicion = 0
+    # Posición global y por modalidad: ranking en memoria, PostgreSQL como respaldo
+    posiciones = await obtener_posiciones(jugador_id)
+    posicion = posiciones.get(OVERALL_RANKING, 0)
     puntos_totales = jugador_data.get('puntos_totales', 0)
-    for idx, (jid, pts) in enumerate(todos_jugadores, 1):
-        if jid == jugador_id:
-            posicion = idx
-            break
     
     # Crear embed
     embed = discord.Embed(
@@ -2293,7 +2393,8 @@ async def miperfil(interaction: discord.Interaction, usuario: discord.User = Non
                 tier = tier_por_modalidad[modo]
                 puntos = puntos_por_modalidad.get(modo, 0)
                 emoji = MODE_EMOJIS.get(modo, '🎮')
-                modalidades_text += f"{emoji} **{modo}:** {tier} ({puntos} pts)\n"
+                posicion_modo = f" · #{posiciones[modo]}" if modo in posiciones else ""
+                modalidades_text += f"{emoji} **{modo}:** {tier} ({puntos} pts{posicion_modo})\n"
         
         if modalidades_text:
             embed.add_field(
@@ -2312,15 +2413,11 @@ async def miperfil(interaction: discord.Interaction, usuario: discord.User = Non
     cooldowns_activos = []
     if jugador_id in data.get('cooldowns', {}):
         now = datetime.now()
-        for modo, cooldown_data in data['cooldowns'][jugador_id].items():
-            try:
-                end_date = datetime.fromisoformat(cooldown_data['end_date'])
-                if end_date > now:
-                    dias_restantes = (end_date - now).days
-                    emoji = MODE_EMOJIS.get(modo, '🎮')
-                    cooldowns_activos.append(f"{emoji} {modo}: {dias_restantes} días")
-            except:
-                pass
+        for modo, cooldown in data['cooldowns'][jugador_id].items():
+            if not cooldown.is_expired():
+                dias_restantes = (cooldown.end_date - now).days
+                emoji = MODE_EMOJIS.get(modo, '🎮')
+                cooldowns_activos.append(f"{emoji} {modo}: {dias_restantes} días")
     
     if cooldowns_activos:
         embed.add_field(
@@ -2338,7 +2435,7 @@ async def miperfil(interaction: discord.Interaction, usuario: discord.User = Non
     
     embed.set_footer(text="Papayas Tierlist")
     
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 
 # COMANDO 2: /stats
@@ -2362,28 +2459,18 @@ async def stats(interaction: discord.Interaction):
     
     # Si no hay PostgreSQL, calcular desde memoria
     if not stats_data:
-        total_tests = len(data.get('resultados', []))
+        total_tests = len(result_store)
         total_players = len(data.get('jugadores', {}))
         
-        # Tests por modalidad
-        tests_by_mode = {}
-        for resultado in data.get('resultados', []):
-            modo = resultado.get('modalidad', 'Unknown')
-            tests_by_mode[modo] = tests_by_mode.get(modo, 0) + 1
-        
-        # Top testers
-        tester_counts = {}
-        for resultado in data.get('resultados', []):
-            tester_name = resultado.get('tester_name', 'Unknown')
-            tester_counts[tester_name] = tester_counts.get(tester_name, 0) + 1
-        
-        top_testers = sorted(tester_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        # Tests por modalidad y top testers desde los índices del store
+        tests_by_mode = result_store.tests_by_mode()
+        top_testers = result_store.top_testers(OVERALL, limit=5)
         
         stats_data = {
             'total_tests': total_tests,
             'total_players': total_players,
             'tests_by_mode': tests_by_mode,
-            'top_testers': [{'name': name, 'tests': count} for name, count in top_testers]
+            'top_testers': [{'name': name, 'tests': count} for _, name, count in top_testers]
         }
     
     # Crear embed
@@ -2461,34 +2548,22 @@ async def rankings(interaction: discord.Interaction, modo: str = "overall"):
     
     await interaction.response.defer(ephemeral=True)
     
-    # Obtener rankings desde PostgreSQL
-    jugadores = []
-    if POSTGRESQL_AVAILABLE:
+    # Rankings ya ordenados en memoria: [(nombre, puntos, tiers), ...]
+    jugadores = [
+        (jugador.nick_mc or jugador.discord_name, puntos, jugador.tier_por_modalidad)
+        for _, puntos, jugador in leaderboards.top(modo, 10)
+    ]
+    
+    # Si el ranking en memoria está vacío, consultar PostgreSQL
+    if not jugadores and POSTGRESQL_AVAILABLE:
         try:
-            conn = database.get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                
+            for jugador in await database_async.get_top_rankings(modo, limit=10):
                 if modo == "overall":
-                    cur.execute("""
-                        SELECT discord_id, nick_mc, discord_name, puntos_totales, tier_por_modalidad
-                        FROM jugadores
-                        ORDER BY puntos_totales DESC
-                        LIMIT 10
-                    """)
+                    discord_id, nick, dname, puntos, tiers = jugador
                 else:
-                    # Filtrar por modalidad específica
-                    cur.execute("""
-                        SELECT discord_id, nick_mc, discord_name, puntos_totales, 
-                               tier_por_modalidad, puntos_por_modalidad
-                        FROM jugadores
-                        WHERE tier_por_modalidad ? %s
-                        ORDER BY (puntos_por_modalidad->>%s)::int DESC
-                        LIMIT 10
-                    """, (modo, modo))
-                
-                jugadores = cur.fetchall()
-                conn.close()
+                    discord_id, nick, dname, puntos_totales, tiers, puntos_dict = jugador
+                    puntos = puntos_dict.get(modo, 0) if puntos_dict else 0
+                jugadores.append((nick or dname, puntos, tiers))
         except Exception as e:
             print(f"Error obteniendo rankings: {e}")
     
@@ -2510,15 +2585,7 @@ async def rankings(interaction: discord.Interaction, modo: str = "overall"):
     )
     
     ranking_text = ""
-    for idx, jugador in enumerate(jugadores, 1):
-        if modo == "overall":
-            discord_id, nick, dname, puntos, tiers = jugador
-        else:
-            discord_id, nick, dname, puntos_totales, tiers, puntos_dict = jugador
-            puntos = puntos_dict.get(modo, 0) if puntos_dict else 0
-        
-        nombre = nick or dname
-        
+    for idx, (nombre, puntos, tiers) in enumerate(jugadores, 1):
         # Obtener tier
         tier_display = "Sin Tier"
         if tiers and modo in tiers:
@@ -2557,11 +2624,24 @@ async def backup(interaction: discord.Interaction):
     
     await interaction.response.defer(ephemeral=True)
     
+    # El historial completo solo está en PostgreSQL: consultarlo ahora
+    resultados = data.get('resultados', [])
+    # Los meses archivados (desenganchados) no están en resultados: se listan con su archivo
+    archivados = []
+    if POSTGRESQL_AVAILABLE:
+        resultados_db, archivados = await asyncio.gather(
+            database_async.get_all_resultados(),
+            database_async.get_archived_months()
+        )
+        if resultados_db:
+            resultados = resultados_db
+    
     # Crear backup
     backup_data = {
         'fecha_backup': datetime.now().isoformat(),
         'jugadores': data.get('jugadores', {}),
-        'resultados': data.get('resultados', []),
+        'resultados': resultados,
+        'meses_archivados': archivados,
         'cooldowns': data.get('cooldowns', {}),
         'bans_temporales': data.get('bans_temporales', {}),
         'castigos': data.get('castigos', []),
@@ -2570,7 +2650,7 @@ async def backup(interaction: discord.Interaction):
     }
     
     # Convertir a JSON
-    json_content = json.dumps(backup_data, indent=2, ensure_ascii=False)
+    json_content = json.dumps(backup_data, indent=2, ensure_ascii=False, default=records.to_json)
     
     # Crear archivo
     filename = f"backup_papayas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -2581,8 +2661,17 @@ async def backup(interaction: discord.Interaction):
         filename=filename
     )
     
+    mensaje = "✅ Backup generado exitosamente"
+    if archivados is None:
+        mensaje += "\n⚠️ No se pudo comprobar si hay meses archivados: pueden faltar resultados antiguos"
+    elif archivados:
+        meses = "\n".join(f"• {m['year_month']}: `{m['archivo']}` ({m['filas']} resultados)" for m in archivados[:10])
+        if len(archivados) > 10:
+            meses += f"\n• ... y {len(archivados) - 10} meses más (ver `meses_archivados` en el backup)"
+        mensaje += f"\n📦 **No incluye** los meses archivados, están en sus archivos:\n{meses}"
+    
     await interaction.followup.send(
-        f"✅ Backup generado exitosamente",
+        mensaje,
         file=file,
         ephemeral=True
     )
@@ -2626,23 +2715,16 @@ async def cooldownreset(
     
     # Eliminar cooldown
     del data['cooldowns'][user_id][modo]
+    journal.delete(('cooldowns', user_id, modo))
+    expiry_scheduler.cancel(('cooldown', user_id, modo))
     if not data['cooldowns'][user_id]:  # Si no quedan cooldowns, eliminar entrada
         del data['cooldowns'][user_id]
-    
-    save_data()
+        journal.delete(('cooldowns', user_id))
     
     # Eliminar de PostgreSQL también
     if POSTGRESQL_AVAILABLE:
         try:
-            conn = database.get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                cur.execute("""
-                    DELETE FROM cooldowns
-                    WHERE jugador_id = %s AND modalidad = %s
-                """, (user_id, modo))
-                conn.commit()
-                conn.close()
+            await database_async.delete_cooldown(user_id, modo)
         except:
             pass
     
@@ -2662,17 +2744,14 @@ async def cooldownreset(
     await interaction.response.send_message(embed=embed, ephemeral=True)
     
     # Notificar al usuario por DM
-    try:
-        dm_embed = discord.Embed(
-            title="✅ Tu cooldown ha sido reiniciado",
-            description=f"Ya puedes volver a testearte en **{modo}**",
-            color=discord.Color.green()
-        )
-        dm_embed.add_field(name="🎮 Modalidad", value=f"{MODE_EMOJIS.get(modo, '🎮')} {modo}", inline=True)
-        dm_embed.add_field(name="📝 Razón", value=reason, inline=False)
-        await member.send(embed=dm_embed)
-    except:
-        pass
+    dm_embed = discord.Embed(
+        title="✅ Tu cooldown ha sido reiniciado",
+        description=f"Ya puedes volver a testearte en **{modo}**",
+        color=discord.Color.green()
+    )
+    dm_embed.add_field(name="🎮 Modalidad", value=f"{MODE_EMOJIS.get(modo, '🎮')} {modo}", inline=True)
+    dm_embed.add_field(name="📝 Razón", value=reason, inline=False)
+    notifier.enqueue(member.id, embed=dm_embed)
 
 
 # COMANDO 6: /add (añadir usuario a ticket)
@@ -2695,8 +2774,8 @@ async def add_user_to_ticket(interaction: discord.Interaction, user: discord.Mem
     
     # Buscar si el usuario actual es parte del ticket
     ticket_id = str(interaction.channel.id)
-    ticket_info = data.get('tickets', {}).get(ticket_id, {})
-    is_player = str(interaction.user.id) == ticket_info.get('jugador_id', '')
+    ticket_info = data.get('tickets', {}).get(ticket_id)
+    is_player = ticket_info is not None and str(interaction.user.id) == ticket_info.jugador_id
     
     if not (is_tester or is_player):
         await interaction.response.send_message(
@@ -2771,4 +2850,6 @@ if __name__ == "__main__":
     if not TOKEN:
         print("ERROR: No se encontró DISCORD_TOKEN en las variables de entorno")
         exit(1)
+    # SIGTERM (Render) se trata como Ctrl+C para cerrar limpio y guardar los datos
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     bot.run(TOKEN)
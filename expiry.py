@@ -0,0 +1,130 @@
+"""
+Vencimientos programados para Papayas Tierlist
+Min-heap de (fecha de fin, clave) que despierta exactamente cuando vence el
+próximo cooldown o ban temporal, en vez de revisar todo cada hora
+"""
+
+import asyncio
+import heapq
+import itertools
+
+from records import now_epoch, to_epoch
+
+MAX_SLEEP = 3600  # Segundos: revisar al menos cada hora (cambios de hora del sistema)
+
+class ExpiryScheduler:
+    """
+    Programa callbacks para claves que vencen en una fecha concreta
+
+    schedule() y cancel() son O(log n) / O(1): cancelar solo marca la entrada
+    como obsoleta y se descarta al salir del heap. Reprogramar una clave
+    sustituye su vencimiento anterior.
+
+    Uso:
+        scheduler = ExpiryScheduler(on_expire)      # async def on_expire(key)
+        scheduler.schedule(('cooldown', user_id, modo), end_date)
+        scheduler.cancel(('cooldown', user_id, modo))
+        scheduler.start()                           # con el event loop corriendo
+    """
+
+    def __init__(self, on_expire):
+        self.on_expire = on_expire
+        self._heap = []          # [(vencimiento, orden, clave), ...]
+        self._entries = {}       # clave -> (vencimiento, orden) vigente
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # === PROGRAMACIÓN ===
+    def schedule(self, key, when):
+        """Programa (o reprograma) key para `when` (datetime, ISO o epoch de records)"""
+        when = to_epoch(when)
+        if when is None:
+            return False
+        entry = (when, next(self._counter))
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (*entry, key))
+        # Despertar solo si el nuevo vencimiento es el más próximo
+        if self._heap[0][2] == key:
+            self._notify()
+        return True
+
+    def cancel(self, key):
+        """Cancela el vencimiento de key. Devuelve False si no estaba programado"""
+        return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        self._heap = []
+        self._entries = {}
+        self._notify()
+
+    def next_expiry(self):
+        """Vencimiento más próximo (epoch de records) o None"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self):
+        while self._heap:
+            when, order, key = self._heap[0]
+            if self._entries.get(key) == (when, order):
+                return
+            heapq.heappop(self._heap)
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # === BUCLE ===
+    def start(self):
+        """Arranca la tarea en segundo plano (llamar con el event loop corriendo)"""
+        if self.is_running():
+            return False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return True
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self._discard_stale()
+
+            if not self._heap:
+                timeout = MAX_SLEEP
+            else:
+                timeout = min(MAX_SLEEP, max(0, (self._heap[0][0] - now_epoch()) / 1_000_000))
+
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    continue  # Cambió el heap: recalcular
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._fire_due()
+
+    async def _fire_due(self):
+        now = now_epoch()
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return
+            _, _, key = heapq.heappop(self._heap)
+            del self._entries[key]
+            try:
+                await self.on_expire(key)
+            except Exception as e:
+                print(f"❌ Error procesando vencimiento {key}: {e}")
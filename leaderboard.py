@@ -0,0 +1,342 @@
+"""
+Motor de rankings en memoria para Papayas Tierlist
+Mantiene el ranking overall y uno por modalidad ya ordenados, actualizados
+al publicar resultados, para responder top-N, posición de un jugador y
+páginas del ranking sin consultar PostgreSQL
+"""
+
+import random
+import threading
+
+from records import Jugador
+
+OVERALL = 'overall'
+
+_MAX_LEVELS = 24   # Suficiente para millones de jugadores
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels   # Posiciones que salta cada enlace
+
+class _IndexableSkipList:
+    """
+    Lista ordenada de claves únicas con acceso por posición (skip list con
+    anchos en cada enlace): insertar, borrar, contar las menores que una
+    clave y localizar la k-ésima en O(log n) esperado, sin desplazar memoria
+    """
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVELS)
+        self._size = 0
+        self._random = random.Random()
+
+    def __len__(self):
+        return self._size
+
+    def _random_levels(self):
+        # Geométrica con p = 1/2: 1 + ceros finales de un número aleatorio
+        bits = self._random.getrandbits(_MAX_LEVELS - 1) | (1 << (_MAX_LEVELS - 1))
+        return (bits & -bits).bit_length()
+
+    def build(self, keys):
+        """Sustituye el contenido por `keys` ya ordenadas, en O(n)"""
+        self._head = _Node(None, _MAX_LEVELS)
+        last = [self._head] * _MAX_LEVELS
+        last_position = [0] * _MAX_LEVELS
+        position = 0
+        for position, key in enumerate(keys, 1):
+            node = _Node(key, self._random_levels())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(_MAX_LEVELS):
+            last[level].width[level] = position + 1 - last_position[level]
+        self._size = position
+
+    def insert(self, key):
+        chain = [None] * _MAX_LEVELS
+        steps_at_level = [0] * _MAX_LEVELS
+        node = self._head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_levels()
+        new = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, _MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        """Quita key. Devuelve False si no estaba"""
+        chain = [None] * _MAX_LEVELS
+        node = self._head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            return False
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), _MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+        return True
+
+    def bisect_left(self, key):
+        """Número de claves menores que key"""
+        node = self._head
+        position = 0
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def iter_from(self, index):
+        """Claves desde la posición index (0-based) en orden"""
+        if index >= self._size:
+            return
+        node = self._head
+        remaining = index + 1
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+class Leaderboard:
+    """
+    Ranking ordenado por (puntos desc, discord_id asc)
+
+    Las claves (-puntos, discord_id) viven en una skip list indexable: mover a
+    un jugador, su posición y el inicio de una página son O(log n).
+    """
+
+    def __init__(self):
+        self._keys = _IndexableSkipList()   # (-puntos, discord_id) ordenadas
+        self._points = {}                   # discord_id -> puntos
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, player_id):
+        return player_id in self._points
+
+    def load(self, points_by_player):
+        """Carga {discord_id: puntos} de golpe (ordena una vez en vez de n inserciones)"""
+        self._points = dict(points_by_player)
+        self._keys.build(sorted((-points, player_id) for player_id, points in self._points.items()))
+
+    def update(self, player_id, points):
+        """Inserta o mueve a un jugador a su nueva puntuación"""
+        old = self._points.get(player_id)
+        if old == points:
+            return
+        if old is not None:
+            self._remove_key(old, player_id)
+        self._points[player_id] = points
+        self._keys.insert((-points, player_id))
+
+    def remove(self, player_id):
+        old = self._points.pop(player_id, None)
+        if old is not None:
+            self._remove_key(old, player_id)
+
+    def _remove_key(self, points, player_id):
+        self._keys.remove((-points, player_id))
+
+    def points(self, player_id):
+        return self._points.get(player_id)
+
+    def rank(self, player_id):
+        """
+        Posición del jugador (1 = primero) o None si no está en el ranking.
+        Empates comparten posición: 1 + número de jugadores con MÁS puntos.
+        """
+        points = self._points.get(player_id)
+        if points is None:
+            return None
+        return self._keys.bisect_left((-points,)) + 1
+
+    def page(self, offset=0, limit=None):
+        """[(discord_id, puntos), ...] desde la posición offset"""
+        rows = []
+        for neg_points, player_id in self._keys.iter_from(offset):
+            if limit is not None and len(rows) >= limit:
+                break
+            rows.append((player_id, -neg_points))
+        return rows
+
+    def top(self, n=10):
+        return self.page(0, n)
+
+class LeaderboardEngine:
+    """
+    Ranking overall + uno por modalidad, seguro entre hilos (la API lee
+    desde los hilos de Waitress mientras el bot actualiza desde el event loop)
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._boards = {OVERALL: Leaderboard()}
+        self._players = {}   # discord_id -> Jugador (snapshot, no se muta)
+        self.ready = False
+
+    def warm(self, jugadores):
+        """Carga todos los jugadores de golpe (al iniciar, desde get_all_jugadores())"""
+        with self._lock:
+            players = {}
+            points = {OVERALL: {}}
+            for player_id, jugador in jugadores.items():
+                snapshot = players[player_id] = Jugador.from_dict(jugador)
+                points[OVERALL][player_id] = snapshot.puntos_totales
+                for mode in snapshot.tier_por_modalidad:
+                    points.setdefault(mode, {})[player_id] = snapshot.puntos_por_modalidad.get(mode, 0) or 0
+
+            boards = {}
+            for mode, board_points in points.items():
+                board = boards[mode] = Leaderboard()
+                board.load(board_points)
+            self._boards = boards
+            self._players = players
+            self.ready = True
+
+    def update_player(self, player_id, jugador):
+        """Actualiza un jugador tras publicar un resultado"""
+        with self._lock:
+            self._update_locked(player_id, jugador)
+
+    def remove_player(self, player_id):
+        with self._lock:
+            self._players.pop(player_id, None)
+            for board in self._boards.values():
+                board.remove(player_id)
+
+    def _update_locked(self, player_id, jugador):
+        snapshot = Jugador.from_dict(jugador)
+        self._players[player_id] = snapshot
+
+        self._boards[OVERALL].update(player_id, snapshot.puntos_totales)
+
+        # Solo aparecen en el ranking de una modalidad los que tienen tier en ella
+        tiers = snapshot.tier_por_modalidad
+        puntos = snapshot.puntos_por_modalidad
+        for mode, board in self._boards.items():
+            if mode != OVERALL and mode not in tiers:
+                board.remove(player_id)
+        for mode in tiers:
+            board = self._boards.get(mode)
+            if board is None:
+                board = self._boards[mode] = Leaderboard()
+            board.update(player_id, puntos.get(mode, 0) or 0)
+
+    # === CONSULTAS ===
+    def total(self, mode=OVERALL):
+        with self._lock:
+            board = self._boards.get(mode)
+            return len(board) if board else 0
+
+    def page(self, mode=OVERALL, offset=0, limit=None):
+        """[(discord_id, puntos, Jugador), ...] de una página del ranking"""
+        with self._lock:
+            board = self._boards.get(mode)
+            if board is None:
+                return []
+            return [
+                (player_id, points, self._players[player_id])
+                for player_id, points in board.page(offset, limit)
+            ]
+
+    def top(self, mode=OVERALL, n=10):
+        return self.page(mode, 0, n)
+
+    def query(self, mode=OVERALL, offset=0, limit=None, premium=None, tier=None):
+        """
+        Página del ranking con filtros, ya ordenada
+
+        Args:
+            premium: 'si' / 'no' para filtrar por cuenta premium
+            tier: Tier exacto en la modalidad (en overall: en cualquier modalidad)
+
+        Returns:
+            tuple: ([(discord_id, puntos, Jugador), ...], total de jugadores que cumplen el filtro)
+        """
+        with self._lock:
+            board = self._boards.get(mode)
+            if board is None:
+                return [], 0
+
+            # Sin filtros: cortar la página directamente
+            if premium is None and tier is None:
+                rows = board.page(offset, limit)
+                return [(pid, pts, self._players[pid]) for pid, pts in rows], len(board)
+
+            matches = []
+            for player_id, points in board.page():
+                jugador = self._players[player_id]
+                if premium is not None and (jugador.es_premium == 'si') != (premium == 'si'):
+                    continue
+                if tier is not None:
+                    tiers = jugador.tier_por_modalidad
+                    if mode == OVERALL:
+                        if tier not in tiers.values():
+                            continue
+                    elif tiers.get(mode) != tier:
+                        continue
+                matches.append((player_id, points, jugador))
+
+            end = None if limit is None else offset + limit
+            return matches[offset:end], len(matches)
+
+    def rank(self, player_id, mode=OVERALL):
+        """Posición de un jugador en el ranking overall o de una modalidad"""
+        with self._lock:
+            board = self._boards.get(mode)
+            return board.rank(player_id) if board else None
+
+    def positions(self, player_id):
+        """
+        Posición del jugador en overall y en cada modalidad en la que tiene tier
+
+        Returns:
+            dict: {'overall': n, 'Sword': n, ...} o {} si no está en el ranking
+        """
+        with self._lock:
+            if player_id not in self._players:
+                return {}
+            return {
+                mode: board.rank(player_id)
+                for mode, board in self._boards.items()
+                if player_id in board
+            }
+
+    def get_player(self, player_id):
+        with self._lock:
+            return self._players.get(player_id)
+
+# Instancia compartida por el bot y la API (mismo proceso con main.py)
+leaderboards = LeaderboardEngine()
@@ -0,0 +1,175 @@
+"""
+Envío de DMs en segundo plano para Papayas Tierlist
+Cola con un número fijo de workers: los comandos y los vencimientos encolan
+el mensaje y siguen, sin esperar a la API de Discord. Deduplica, reintenta
+con backoff ante 429/5xx y guarda qué DMs fallaron (DMs cerrados, etc.)
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+
+import discord
+
+class NotificationDispatcher:
+    """
+    Dispatcher de mensajes directos
+
+    Los buckets por ruta de Discord los respeta el cliente HTTP de discord.py
+    (espera solo al recibir los headers de rate limit); aquí se limita la
+    concurrencia para no acumular cientos de peticiones en vuelo y se
+    reintentan los 429 globales y errores 5xx con backoff exponencial.
+
+    Uso:
+        notifier = NotificationDispatcher(bot, workers=4)
+        notifier.start()                                   # en on_ready
+        notifier.enqueue(user_id, embed=embed, dedupe_key="cooldown:123:Sword")
+    """
+
+    def __init__(self, bot, workers=4, max_queue=1000, max_retries=4,
+                 base_delay=1.0, dedupe_ttl=600, failed_history=200):
+        self.bot = bot
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.dedupe_ttl = dedupe_ttl
+
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        self._recent = {}     # dedupe_key -> momento en que se encoló
+        self._last_prune = time.monotonic()
+        self.failed = deque(maxlen=failed_history)
+
+        # Métricas
+        self.sent = 0
+        self.retries = 0
+        self.dropped = 0
+        self.deduplicated = 0
+
+    # === ENCOLAR ===
+    def enqueue(self, user_id, content=None, embed=None, dedupe_key=None):
+        """
+        Encola un DM (no bloquea). Devuelve False si es un duplicado reciente
+        o la cola está llena
+        """
+        now = time.monotonic()
+        if dedupe_key is not None:
+            self._prune_recent(now)
+            queued_at = self._recent.get(dedupe_key)
+            if queued_at is not None and now - queued_at <= self.dedupe_ttl:
+                self.deduplicated += 1
+                return False
+
+        job = {
+            'user_id': int(user_id),
+            'content': content,
+            'embed': embed,
+            'dedupe_key': dedupe_key,
+            'attempt': 0
+        }
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._record_failure(job, "cola llena")
+            return False
+
+        if dedupe_key is not None:
+            self._recent[dedupe_key] = now
+        return True
+
+    def _prune_recent(self, now):
+        # Barrido periódico: las claves caducadas ya no deduplican, solo ocupan memoria
+        if now - self._last_prune < self.dedupe_ttl:
+            return
+        self._last_prune = now
+        expired = [key for key, at in self._recent.items() if now - at > self.dedupe_ttl]
+        for key in expired:
+            del self._recent[key]
+
+    # === WORKERS ===
+    def start(self):
+        """Arranca los workers (llamar con el event loop corriendo)"""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        if self._tasks:
+            return False
+        loop = asyncio.get_running_loop()
+        self._tasks = [
+            loop.create_task(self._worker(), name=f"dm-worker-{i}")
+            for i in range(self.workers)
+        ]
+        return True
+
+    def is_running(self):
+        return any(not task.done() for task in self._tasks)
+
+    async def join(self):
+        """Espera a que se vacíe la cola (útil al apagar)"""
+        await self._queue.join()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._deliver(job)
+            except Exception as e:
+                self._record_failure(job, f"error inesperado: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, job):
+        while True:
+            try:
+                user = self.bot.get_user(job['user_id']) or await self.bot.fetch_user(job['user_id'])
+                await user.send(content=job['content'], embed=job['embed'])
+                self.sent += 1
+                return
+            except (discord.Forbidden, discord.NotFound) as e:
+                # DMs cerrados / usuario inexistente: reintentar no sirve
+                self._record_failure(job, f"{e.status} {e.text or type(e).__name__}")
+                return
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    self._record_failure(job, f"{e.status} {e.text}")
+                    return
+                delay = getattr(e, 'retry_after', None)
+                if not self._should_retry(job, f"{e.status} {e.text}"):
+                    return
+            except (asyncio.TimeoutError, OSError) as e:
+                delay = None
+                if not self._should_retry(job, f"red: {e}"):
+                    return
+
+            # Backoff exponencial con jitter (o lo que pida Discord)
+            if not delay:
+                delay = self.base_delay * (2 ** (job['attempt'] - 1))
+                delay += random.uniform(0, delay / 2)
+            await asyncio.sleep(delay)
+
+    def _should_retry(self, job, reason):
+        job['attempt'] += 1
+        if job['attempt'] > self.max_retries:
+            self._record_failure(job, f"{reason} (tras {self.max_retries} reintentos)")
+            return False
+        self.retries += 1
+        return True
+
+    def _record_failure(self, job, reason):
+        self.failed.append({
+            'user_id': str(job['user_id']),
+            'dedupe_key': job['dedupe_key'],
+            'reason': reason,
+            'at': time.time()
+        })
+        print(f"⚠️ DM no enviado a {job['user_id']}: {reason}")
+
+    def metrics(self):
+        return {
+            'queued': self._queue.qsize(),
+            'sent': self.sent,
+            'retries': self.retries,
+            'dropped': self.dropped,
+            'deduplicated': self.deduplicated,
+            'failed': len(self.failed)
+        }
@@ -0,0 +1,112 @@
+"""
+Re-render de los paneles de waitlist para Papayas Tierlist
+Cada botón solo marca el panel de su modalidad como pendiente: una tarea por
+modalidad edita el mensaje como mucho una vez por intervalo, siempre con el
+estado más reciente, y se salta la edición si el embed no ha cambiado
+"""
+
+import asyncio
+import json
+import time
+
+def embed_signature(embed):
+    """Bytes del embed tal como se envía, sin el timestamp (cambia en cada render)"""
+    payload = embed.to_dict()
+    payload.pop('timestamp', None)
+    return json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+class _PanelState:
+    __slots__ = ('message', 'dirty', 'task', 'last_edit', 'last_signature')
+
+    def __init__(self):
+        self.message = None
+        self.dirty = False
+        self.task = None
+        self.last_edit = 0.0
+        self.last_signature = None
+
+class PanelRenderer:
+    """
+    Coalesce las ediciones de los paneles por modalidad
+
+    La primera petición tras un periodo tranquilo edita enseguida; las que
+    llegan durante el intervalo se agrupan en una sola edición al final,
+    renderizada en ese momento (converge al último estado).
+
+    Uso:
+        renderer = PanelRenderer(render_panel_embed, interval=1.0)  # render(modo) -> Embed
+        renderer.request(modo, interaction.message)                 # no bloquea
+    """
+
+    def __init__(self, render, interval=1.0):
+        self.render = render
+        self.interval = interval
+        self._panels = {}    # modo -> _PanelState
+
+        # Métricas
+        self.requests = 0
+        self.edits = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def request(self, modo, message):
+        """Marca el panel de modo como pendiente de re-render"""
+        if message is None:
+            return
+        state = self._panels.get(modo)
+        if state is None:
+            state = self._panels[modo] = _PanelState()
+
+        self.requests += 1
+        if state.message is None or state.message.id != message.id:
+            state.last_signature = None  # Panel nuevo: no hay nada que comparar
+        state.message = message
+        state.dirty = True
+
+        if state.task is None or state.task.done():
+            state.task = asyncio.get_running_loop().create_task(
+                self._flush(modo, state), name=f"panel-{modo}"
+            )
+
+    async def _flush(self, modo, state):
+        while state.dirty:
+            wait = state.last_edit + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            # Todo lo que llegue a partir de aquí provoca otra vuelta
+            state.dirty = False
+            message = state.message
+            try:
+                embed = self.render(modo)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Error renderizando el panel de {modo}: {e}")
+                return
+
+            signature = embed_signature(embed)
+            if signature == state.last_signature:
+                self.skipped += 1
+                continue
+
+            state.last_edit = time.monotonic()
+            try:
+                await message.edit(embed=embed)
+                state.last_signature = signature
+                self.edits += 1
+            except Exception as e:
+                # Sin firma: la próxima petición vuelve a intentar la edición
+                state.last_signature = None
+                self.failed += 1
+                print(f"⚠️ No se pudo actualizar el panel de {modo}: {e}")
+
+    def metrics(self):
+        return {
+            'panels': len(self._panels),
+            'pending': sum(1 for state in self._panels.values() if state.dirty),
+            'requests': self.requests,
+            'edits': self.edits,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'interval': self.interval
+        }
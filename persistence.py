@@ -0,0 +1,383 @@
+"""
+Persistencia incremental para Papayas Tierlist
+Journal append-only de pequeñas mutaciones sobre el dict `data` del bot,
+con fsync por lotes y compactación periódica a un snapshot completo
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+# Operaciones que entiende el journal (path = lista de claves dentro de data)
+OP_SET = 'set'          # data[...][path] = value
+OP_DELETE = 'delete'    # del data[...][path]
+OP_APPEND = 'append'    # data[...][path].append(value)
+OP_REMOVE = 'remove'    # data[...][path].remove(value)
+OP_POP = 'pop'          # data[...][path].pop(value)
+
+SEQ_KEY = '_journal_seq'  # Último registro incluido en el snapshot
+
+def apply_record(data, record):
+    """Aplica un registro del journal sobre data (usado al reproducir el journal)"""
+    op = record['op']
+    path = record['path']
+    value = record.get('value')
+
+    # Navegar hasta el contenedor padre, creando dicts intermedios si faltan
+    container = data
+    for key in path[:-1]:
+        if key not in container or container[key] is None:
+            if op == OP_DELETE:
+                return
+            container[key] = {}
+        container = container[key]
+    last = path[-1]
+
+    if op == OP_SET:
+        container[last] = value
+    elif op == OP_DELETE:
+        container.pop(last, None)
+    elif op == OP_APPEND:
+        container.setdefault(last, []).append(value)
+    elif op == OP_REMOVE:
+        items = container.get(last, [])
+        if value in items:
+            items.remove(value)
+    elif op == OP_POP:
+        items = container.get(last, [])
+        if items:
+            items.pop(value or 0)
+    else:
+        raise ValueError(f"Operación de journal desconocida: {op}")
+
+class DataJournal:
+    """
+    Write-ahead journal del dict `data`
+
+    Las mutaciones se registran en memoria con record()/set()/delete()/...
+    (sin tocar disco), flush() las añade al journal con un único fsync por lote
+    y compact() escribe un snapshot completo de forma atómica y recorta el journal.
+    load() reconstruye el estado leyendo el snapshot y reproduciendo el journal.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, compact_every=2000, json_default=None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or f"{snapshot_path}.journal"
+        self.compact_every = compact_every
+        self.json_default = json_default  # Serializa objetos no-JSON (p. ej. records.to_json)
+
+        self._pending = []            # Líneas JSON aún no escritas a disco
+        self._seq = 0                 # Último número de secuencia asignado
+        self._journal_records = 0     # Registros en el journal desde el último snapshot
+        self._compaction_requested = False
+        self._lock = threading.Lock()     # Protege _pending / _seq
+        self._io_lock = threading.Lock()  # Serializa las escrituras a disco
+        self.on_record = None             # Callback tras cada mutación (marca dirty)
+
+    # === REGISTRO DE MUTACIONES ===
+    def record(self, op, path, value=None):
+        """Registra una mutación (no bloquea: solo la guarda en memoria)"""
+        with self._lock:
+            self._seq += 1
+            entry = {'seq': self._seq, 'op': op, 'path': list(path)}
+            if value is not None:
+                entry['value'] = value
+            # Serializar ya: el objeto original puede seguir mutando
+            self._pending.append(json.dumps(entry, ensure_ascii=False, default=self.json_default))
+            self._journal_records += 1
+        if self.on_record:
+            self.on_record()
+
+    def set(self, path, value):
+        self.record(OP_SET, path, value)
+
+    def delete(self, path):
+        self.record(OP_DELETE, path)
+
+    def append(self, path, value):
+        self.record(OP_APPEND, path, value)
+
+    def remove(self, path, value):
+        self.record(OP_REMOVE, path, value)
+
+    def pop(self, path, index=0):
+        self.record(OP_POP, path, index)
+
+    def request_compaction(self):
+        """Pide un snapshot completo en el próximo ciclo (cambios masivos)"""
+        self._compaction_requested = True
+        if self.on_record:
+            self.on_record()
+
+    @property
+    def pending(self):
+        """Registros en memoria pendientes de escribir"""
+        return len(self._pending)
+
+    def needs_compaction(self):
+        return self._compaction_requested or self._journal_records >= self.compact_every
+
+    # === ESCRITURA ===
+    def flush(self):
+        """Añade los registros pendientes al journal con un solo fsync (bloqueante)"""
+        with self._io_lock:
+            with self._lock:
+                lines, self._pending = self._pending, []
+            if not lines:
+                return 0
+
+            try:
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception:
+                # Devolverlos a la cola para el próximo intento
+                with self._lock:
+                    self._pending = lines + self._pending
+                raise
+            return len(lines)
+
+    def snapshot_blob(self, data):
+        """
+        Serializa data para un snapshot. Llamar desde el hilo que muta data
+        (el event loop) para obtener una foto consistente
+        """
+        with self._lock:
+            seq = self._seq
+            # Lo pendiente ya queda incluido en el snapshot
+            self._pending = []
+            self._journal_records = 0
+            self._compaction_requested = False
+        payload = dict(data)
+        payload[SEQ_KEY] = seq
+        return seq, json.dumps(payload, ensure_ascii=False, default=self.json_default)
+
+    def write_snapshot(self, seq, blob):
+        """Escribe el snapshot de forma atómica y recorta el journal (bloqueante)"""
+        with self._io_lock:
+            _atomic_write(self.snapshot_path, blob)
+            self._truncate_journal(seq)
+
+    def compact(self, data):
+        """Snapshot completo síncrono (arranque / apagado)"""
+        seq, blob = self.snapshot_blob(data)
+        self.write_snapshot(seq, blob)
+
+    def _truncate_journal(self, seq):
+        """Elimina del journal los registros ya incluidos en el snapshot"""
+        if not os.path.exists(self.journal_path):
+            return
+
+        kept = []
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = _parse_line(line)
+                if entry and entry['seq'] > seq:
+                    kept.append(line.rstrip('\n'))
+
+        if kept:
+            _atomic_write(self.journal_path, '\n'.join(kept) + '\n')
+        else:
+            os.remove(self.journal_path)
+
+    # === LECTURA ===
+    def load(self):
+        """
+        Reconstruye data desde snapshot + journal
+
+        Returns:
+            tuple: (data o None si no hay snapshot, registros reproducidos)
+        """
+        data = None
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            snapshot_seq = data.pop(SEQ_KEY, 0)
+
+        replayed = 0
+        last_seq = snapshot_seq
+        if data is not None and os.path.exists(self.journal_path):
+            valid_lines = []
+            torn = False
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = _parse_line(line)
+                    if not entry:
+                        torn = torn or bool(line.strip())  # Línea a medio escribir tras un crash
+                        continue
+                    if entry['seq'] <= snapshot_seq:
+                        continue
+                    valid_lines.append(line.rstrip('\n'))
+                    try:
+                        apply_record(data, entry)
+                        replayed += 1
+                    except Exception as e:
+                        print(f"⚠️ Registro de journal ignorado ({entry['seq']}): {e}")
+                    last_seq = max(last_seq, entry['seq'])
+
+            # Quitar la línea rota para que los próximos registros no se peguen a ella
+            if torn:
+                if valid_lines:
+                    _atomic_write(self.journal_path, '\n'.join(valid_lines) + '\n')
+                else:
+                    os.remove(self.journal_path)
+
+        with self._lock:
+            self._seq = last_seq
+            self._journal_records = replayed
+        return data, replayed
+
+# Scheduler activo (para exponer métricas en la API)
+_active_scheduler = None
+
+def get_metrics():
+    """Métricas del scheduler de persistencia activo (o None si no hay)"""
+    if _active_scheduler is None:
+        return None
+    return _active_scheduler.metrics()
+
+class PersistenceScheduler:
+    """
+    Escritura en segundo plano del journal con dirty flag
+
+    Cada mutación marca el estado como sucio; una tarea asyncio espera a que
+    haya cambios, agrupa todos los que lleguen durante `interval_ms` y los
+    escribe en un hilo (un fsync por lote). Nunca escribe más de una vez por
+    intervalo, así una ráfaga de clics se convierte en una sola escritura.
+    """
+
+    def __init__(self, journal, get_data, interval_ms=250):
+        self.journal = journal
+        self.get_data = get_data
+        self.interval = interval_ms / 1000
+
+        self._loop = None
+        self._event = None
+        self._task = None
+        self._last_flush = 0.0
+
+        # Métricas
+        self._flushes = 0
+        self._snapshots = 0
+        self._records_written = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._last_flush_at = None
+        self._last_error = None
+
+        journal.on_record = self.mark_dirty
+
+    def mark_dirty(self):
+        """Marca que hay cambios pendientes (seguro desde cualquier hilo)"""
+        if self._event is None or self._loop is None or self._loop.is_closed():
+            return  # Antes de start(): se escribirá en el primer ciclo
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    def start(self):
+        """Arranca la tarea en segundo plano (llamar con el event loop corriendo)"""
+        global _active_scheduler
+        if self._task is not None and not self._task.done():
+            return False
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._event.set()  # Escribir lo acumulado antes de arrancar
+        self._task = self._loop.create_task(self._run())
+        _active_scheduler = self
+        return True
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+
+            # Debounce: como mucho una escritura por intervalo
+            wait = self.interval - (time.monotonic() - self._last_flush)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._event.clear()
+
+            try:
+                await self._flush_async()
+            except Exception as e:
+                self._last_error = str(e)
+                print(f"❌ Error guardando datos: {e}")
+                self._event.set()  # Reintentar en el próximo intervalo
+            self._last_flush = time.monotonic()
+
+    async def _flush_async(self):
+        start = time.perf_counter()
+        written = 0
+        if self.journal.pending:
+            written = await asyncio.to_thread(self.journal.flush)
+        if self.journal.needs_compaction():
+            # Serializar en el event loop (foto consistente), escribir en un hilo
+            seq, blob = self.journal.snapshot_blob(self.get_data())
+            await asyncio.to_thread(self.journal.write_snapshot, seq, blob)
+            self._snapshots += 1
+        self._record_flush(start, written)
+
+    def flush_now(self, snapshot=True):
+        """Escritura forzada y síncrona (apagado del bot)"""
+        start = time.perf_counter()
+        written = self.journal.flush()
+        if snapshot:
+            self.journal.compact(self.get_data())
+            self._snapshots += 1
+        self._record_flush(start, written)
+
+    def _record_flush(self, start, written):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._flushes += 1
+        self._records_written += written
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+        self._last_flush_at = time.time()
+        self._last_error = None
+
+    def metrics(self):
+        return {
+            'pending_writes': self.journal.pending,
+            'flushes': self._flushes,
+            'snapshots': self._snapshots,
+            'records_written': self._records_written,
+            'last_flush_ms': round(self._last_flush_ms, 3),
+            'avg_flush_ms': round(self._total_flush_ms / self._flushes, 3) if self._flushes else 0.0,
+            'max_flush_ms': round(self._max_flush_ms, 3),
+            'last_flush_at': self._last_flush_at,
+            'interval_ms': self.interval * 1000,
+            'last_error': self._last_error
+        }
+
+def _parse_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) and 'seq' in entry else None
+
+def _atomic_write(path, content):
+    """Escribe en un archivo temporal y lo renombra (nunca deja el archivo a medias)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,224 @@
+"""
+Registros compactos para Papayas Tierlist
+Clases con __slots__ para jugadores, resultados, cooldowns y tickets:
+fechas como enteros (sin volver a parsear ISO en cada comprobación),
+modalidades y tiers internados, y conversión sin pérdidas al formato
+JSON de siempre (data.json, journal, backup)
+"""
+
+import sys
+from datetime import datetime, timedelta
+
+from waitlist import WaitlistQueue
+
+# Fechas: microsegundos desde 1970-01-01 sobre datetimes naive (hora local,
+# igual que datetime.now() en el resto del bot). Entero exacto: ida y vuelta
+# a isoformat() sin perder precisión
+_EPOCH = datetime(1970, 1, 1)
+_MICRO = timedelta(microseconds=1)
+
+def to_epoch(value):
+    """ISO string / datetime / None -> int (None si falta o es inválida)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, int):
+        return value
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return (value - _EPOCH) // _MICRO
+
+def from_epoch(ts):
+    """int -> datetime naive (None si ts es None)"""
+    return None if ts is None else _EPOCH + ts * _MICRO
+
+def to_iso(ts):
+    return None if ts is None else from_epoch(ts).isoformat()
+
+def now_epoch():
+    return to_epoch(datetime.now())
+
+def unix_seconds(ts):
+    """Timestamp Unix para <t:...> de Discord"""
+    return int(from_epoch(ts).timestamp())
+
+def intern(value):
+    """Modalidades, tiers e ids se repiten en miles de registros: una sola copia"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _intern_dict(values):
+    return {intern(k): intern(v) for k, v in (values or {}).items()}
+
+class Cooldown:
+    """data['cooldowns'][jugador_id][modalidad]"""
+
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(to_epoch(values.get('start_date')), to_epoch(values.get('end_date')))
+
+    @classmethod
+    def from_datetimes(cls, start_date, end_date):
+        return cls(to_epoch(start_date), to_epoch(end_date))
+
+    def to_dict(self):
+        return {'start_date': to_iso(self.start), 'end_date': to_iso(self.end)}
+
+    def is_expired(self, now_ts=None):
+        # Sin fecha de fin válida se trata como expirado (como antes al fallar fromisoformat)
+        if self.end is None:
+            return True
+        return (now_epoch() if now_ts is None else now_ts) >= self.end
+
+    @property
+    def end_date(self):
+        return from_epoch(self.end)
+
+class Resultado:
+    """Un test publicado (data['resultados'])"""
+
+    FIELDS = (
+        'nick_mc', 'jugador_id', 'jugador_name', 'tester_id', 'tester_name',
+        'modalidad', 'tier_antiguo', 'tier_nuevo', 'puntos_obtenidos',
+        'puntos_totales', 'fecha'
+    )
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, nick_mc=None, jugador_id=None, jugador_name=None, tester_id=None,
+                 tester_name=None, modalidad=None, tier_antiguo=None, tier_nuevo=None,
+                 puntos_obtenidos=None, puntos_totales=None, fecha=None, extra=None):
+        self.nick_mc = nick_mc
+        self.jugador_id = intern(jugador_id)
+        self.jugador_name = jugador_name
+        self.tester_id = intern(tester_id)
+        self.tester_name = tester_name
+        self.modalidad = intern(modalidad)
+        self.tier_antiguo = intern(tier_antiguo)
+        self.tier_nuevo = intern(tier_nuevo)
+        self.puntos_obtenidos = puntos_obtenidos
+        self.puntos_totales = puntos_totales
+        self.fecha = to_epoch(fecha)
+        self.extra = extra  # Claves desconocidas (p. ej. 'fake'), para no perderlas
+
+    @classmethod
+    def from_dict(cls, values):
+        known = {k: values[k] for k in cls.FIELDS if k in values}
+        extra = {k: v for k, v in values.items() if k not in cls.FIELDS} or None
+        return cls(extra=extra, **known)
+
+    def to_dict(self):
+        values = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if field == 'fecha':
+                value = to_iso(value)
+            values[field] = value
+        if self.extra:
+            values.update(self.extra)
+        return values
+
+    @property
+    def fecha_datetime(self):
+        return from_epoch(self.fecha)
+
+class Jugador:
+    """Perfil de un jugador (snapshot del ranking en memoria)"""
+
+    __slots__ = (
+        'nick_mc', 'discord_name', 'tier_por_modalidad',
+        'puntos_por_modalidad', 'puntos_totales', 'es_premium'
+    )
+
+    def __init__(self, nick_mc=None, discord_name=None, tier_por_modalidad=None,
+                 puntos_por_modalidad=None, puntos_totales=0, es_premium='no'):
+        self.nick_mc = nick_mc
+        self.discord_name = discord_name
+        self.tier_por_modalidad = _intern_dict(tier_por_modalidad)
+        self.puntos_por_modalidad = _intern_dict(puntos_por_modalidad)
+        self.puntos_totales = puntos_totales or 0
+        self.es_premium = intern(es_premium or 'no')
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(
+            nick_mc=values.get('nick_mc'),
+            discord_name=values.get('discord_name'),
+            tier_por_modalidad=values.get('tier_por_modalidad'),
+            puntos_por_modalidad=values.get('puntos_por_modalidad'),
+            puntos_totales=values.get('puntos_totales', 0),
+            es_premium=values.get('es_premium')
+        )
+
+    def to_dict(self):
+        return {
+            'nick_mc': self.nick_mc,
+            'discord_name': self.discord_name,
+            'tier_por_modalidad': dict(self.tier_por_modalidad),
+            'puntos_por_modalidad': dict(self.puntos_por_modalidad),
+            'puntos_totales': self.puntos_totales,
+            'es_premium': self.es_premium
+        }
+
+class Ticket:
+    """data['tickets'][channel_id]"""
+
+    __slots__ = ('jugador_id', 'tester_id', 'modalidad', 'fecha')
+
+    def __init__(self, jugador_id, tester_id, modalidad, fecha):
+        self.jugador_id = intern(jugador_id)
+        self.tester_id = intern(tester_id)
+        self.modalidad = intern(modalidad)
+        self.fecha = to_epoch(fecha)
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(values.get('jugador_id'), values.get('tester_id'),
+                   values.get('modalidad'), values.get('fecha'))
+
+    def to_dict(self):
+        return {
+            'jugador_id': self.jugador_id,
+            'tester_id': self.tester_id,
+            'modalidad': self.modalidad,
+            'fecha': to_iso(self.fecha)
+        }
+
+def to_json(value):
+    """Hook `default` de json.dumps: serializa los registros con su formato de siempre"""
+    if isinstance(value, (Cooldown, Resultado, Jugador, Ticket)):
+        return value.to_dict()
+    if isinstance(value, WaitlistQueue):
+        return value.to_list()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def load_cooldowns(cooldowns, game_modes=()):
+    """
+    {jugador_id: {modalidad: dict}} -> {jugador_id: {modalidad: Cooldown}}
+
+    El formato antiguo (un único cooldown global por jugador) se convierte
+    en un cooldown por cada modalidad de game_modes.
+    """
+    result = {}
+    for jugador_id, modes in (cooldowns or {}).items():
+        if not isinstance(modes, dict):
+            continue
+        if 'end_date' in modes:
+            cooldown = Cooldown.from_dict(modes)
+            modes = {mode: cooldown for mode in game_modes}
+        result[intern(jugador_id)] = {
+            intern(mode): value if isinstance(value, Cooldown) else Cooldown.from_dict(value)
+            for mode, value in modes.items()
+            if isinstance(value, (dict, Cooldown))
+        }
+    return result
@@ -0,0 +1,143 @@
+"""
+Caché de respuestas de la API para Papayas Tierlist
+Guarda el cuerpo ya serializado de cada ruta (clave = ruta + query string)
+con un TTL y un ETag fuerte, y se invalida entera cuando el bot publica un
+resultado o banea a un jugador (mismo proceso con main.py). Las entradas
+caducadas se conservan un tiempo para servirlas si PostgreSQL no responde
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class CachedResponse:
+    """Respuesta cacheada: cuerpo en bytes + ETag"""
+
+    __slots__ = ('body', 'mimetype', 'etag', 'created_at', 'expires_at')
+
+    def __init__(self, body, mimetype, ttl):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()
+        self.created_at = time.monotonic()
+        self.expires_at = self.created_at + ttl
+
+    def is_fresh(self):
+        return time.monotonic() < self.expires_at
+
+    def age(self):
+        return int(time.monotonic() - self.created_at)
+
+class ResponseCache:
+    """
+    Caché LRU con TTL, segura entre hilos (hilos de Waitress + bot)
+
+    Cada invalidate() incrementa `generation`: una respuesta calculada antes
+    de la invalidación no se guarda, así nunca se cachea un ranking viejo.
+
+    Una entrada caducada deja de servirse con get() pero sigue disponible
+    para get_stale() hasta `max_stale` segundos después (o hasta que la LRU
+    la expulse o se invalide la caché).
+    """
+
+    def __init__(self, ttl=30, max_entries=512, max_stale=600):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.is_fresh():
+                if entry is not None and self._too_stale(entry):
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_stale(self, key):
+        """Última respuesta guardada aunque haya caducado (None si es demasiado vieja)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._too_stale(entry):
+                del self._entries[key]
+                return None
+            self.stale_hits += 1
+            return entry
+
+    def _too_stale(self, entry):
+        return time.monotonic() >= entry.expires_at + self.max_stale
+
+    def set(self, key, body, mimetype, generation, ttl=None):
+        """
+        Guarda una respuesta calculada con la generación `generation`
+
+        Returns:
+            CachedResponse: La entrada (guardada o no, para responder igualmente)
+        """
+        entry = CachedResponse(body, mimetype, self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation == self.generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, prefix=None):
+        """Borra todas las entradas (o solo las de rutas que empiezan por prefix)"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            if prefix is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[key]
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'stale_hits': self.stale_hits,
+                'ttl': self.ttl,
+                'max_stale': self.max_stale
+            }
+
+def make_key(path, args):
+    """Clave de caché: ruta + parámetros ordenados (el orden en la URL no importa)"""
+    if not args:
+        return path
+    items = sorted((k, v) for k in args for v in args.getlist(k)) if hasattr(args, 'getlist') \
+        else sorted(args.items())
+    return path + "?" + "&".join(f"{k}={v}" for k, v in items)
+
+def invalidate(prefix=None):
+    """Invalida la caché de la API (llamar tras publicar resultados o banear)"""
+    api_cache.invalidate(prefix)
+
+# Instancia compartida por el bot y la API (mismo proceso con main.py)
+api_cache = ResponseCache(
+    ttl=int(os.getenv('API_CACHE_TTL', 30)),
+    max_stale=int(os.getenv('API_CACHE_MAX_STALE', 600))
+)
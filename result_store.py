@@ -0,0 +1,250 @@
+"""
+Almacén indexado de resultados para Papayas Tierlist
+Mantiene índices por tester, modalidad y mes sobre registros Resultado y
+contadores por tester actualizados en cada alta/baja, para que /toptester
+no tenga que recorrer todo data['resultados']. El histórico de PostgreSQL
+se carga solo como contadores agregados (add_aggregate), sin los registros
+"""
+
+from collections import Counter, defaultdict
+
+from records import Resultado, from_epoch
+
+OVERALL = 'Overall'
+
+class ResultStore:
+    """
+    Índices en memoria sobre la lista de resultados
+
+    La lista original (data['resultados']) se sigue usando para persistir;
+    el store la modifica en sitio (con registros Resultado) y mantiene a la vez:
+      - índices por tester_id, modalidad y (año, mes)
+      - el mes de cada resultado, calculado una sola vez
+      - contadores de tests por tester para cada (modalidad|Overall, mes|global)
+
+    Los tests cargados con add_aggregate() solo existen en los contadores:
+    cuentan en count()/top_testers()/tests_by_mode() pero no aparecen en
+    by_tester()/by_mode()/by_month(), que solo devuelven registros en memoria.
+    """
+
+    def __init__(self, resultados=None):
+        self.resultados = resultados if resultados is not None else []
+        self._reset()
+        for i, resultado in enumerate(self.resultados):
+            if not isinstance(resultado, Resultado):
+                resultado = self.resultados[i] = Resultado.from_dict(resultado)
+            self._index(resultado)
+
+    def _reset(self):
+        self._records = {}                      # key -> resultado
+        self._months = {}                       # key -> (año, mes) | None
+        self._by_tester = defaultdict(set)      # tester_id -> keys
+        self._by_mode = defaultdict(set)        # modalidad -> keys
+        self._by_month = defaultdict(set)       # (año, mes) -> keys
+        self._counts = defaultdict(Counter)     # (modalidad|OVERALL, (año, mes)|None) -> Counter
+        self._names = {}                        # tester_id -> último nombre conocido
+        self._tester_buckets = defaultdict(Counter)  # tester_id -> Counter((modalidad, mes) -> tests)
+        self._mode_totals = Counter()           # modalidad -> tests (registros + agregados)
+        self._key_of = {}                       # id(resultado) -> key
+        self._next_key = 0
+
+    # === ÍNDICES ===
+    def _count_keys(self, modalidad, month):
+        keys = [(OVERALL, None), (modalidad, None)]
+        if month is not None:
+            keys.append((OVERALL, month))
+            keys.append((modalidad, month))
+        return keys
+
+    def _index(self, resultado):
+        key = self._next_key
+        self._next_key += 1
+
+        tester_id = resultado.tester_id
+        modalidad = resultado.modalidad or ''
+        fecha = resultado.fecha_datetime
+        month = (fecha.year, fecha.month) if fecha else None
+
+        self._records[key] = resultado
+        self._key_of[id(resultado)] = key
+        self._months[key] = month
+        self._by_mode[modalidad].add(key)
+        if month is not None:
+            self._by_month[month].add(key)
+
+        if tester_id:
+            self._by_tester[tester_id].add(key)
+            self._names[tester_id] = resultado.tester_name or 'Unknown'
+        self._add_count(tester_id, modalidad, month, 1)
+        return key
+
+    def _unindex(self, key):
+        resultado = self._records.pop(key)
+        self._key_of.pop(id(resultado), None)
+        month = self._months.pop(key)
+        modalidad = resultado.modalidad or ''
+        tester_id = resultado.tester_id
+
+        _discard(self._by_mode, modalidad, key)
+        if month is not None:
+            _discard(self._by_month, month, key)
+
+        if tester_id:
+            _discard(self._by_tester, tester_id, key)
+        self._add_count(tester_id, modalidad, month, -1)
+        return resultado
+
+    def _add_count(self, tester_id, modalidad, month, delta):
+        """Suma (o resta) tests a todos los contadores afectados"""
+        _bump(self._mode_totals, modalidad, delta)
+        if not tester_id:
+            return
+        _bump(self._tester_buckets[tester_id], (modalidad, month), delta)
+        if not self._tester_buckets[tester_id]:
+            del self._tester_buckets[tester_id]
+        for count_key in self._count_keys(modalidad, month):
+            counter = self._counts[count_key]
+            _bump(counter, tester_id, delta)
+            if not counter:
+                del self._counts[count_key]
+
+    # === MUTACIONES ===
+    def add(self, resultado):
+        """Añade un resultado (dict o Resultado) a la lista y a los índices. Devuelve el Resultado"""
+        if not isinstance(resultado, Resultado):
+            resultado = Resultado.from_dict(resultado)
+        self.resultados.append(resultado)
+        self._index(resultado)
+        return resultado
+
+    def add_many(self, resultados):
+        """Añade varios resultados de una vez (una sola extensión de la lista). Devuelve los Resultado"""
+        nuevos = [r if isinstance(r, Resultado) else Resultado.from_dict(r) for r in resultados]
+        self.resultados.extend(nuevos)
+        for resultado in nuevos:
+            self._index(resultado)
+        return nuevos
+
+    def add_history(self, resultados):
+        """
+        Cuenta resultados históricos (p. ej. recién importados a PostgreSQL)
+        solo en los contadores, agrupados, sin guardar los registros
+        """
+        grupos = Counter()
+        names = {}
+        for r in resultados:
+            if not isinstance(r, Resultado):
+                r = Resultado.from_dict(r)
+            fecha = r.fecha_datetime
+            month = (fecha.year, fecha.month) if fecha else None
+            grupos[(r.tester_id, r.modalidad, month)] += 1
+            names[r.tester_id] = r.tester_name
+        for (tester_id, modalidad, month), tests in grupos.items():
+            self.add_aggregate(tester_id, names.get(tester_id), modalidad, month, tests)
+        return sum(grupos.values())
+
+    def add_aggregate(self, tester_id, tester_name, modalidad, month, tests):
+        """
+        Suma tests históricos a los contadores sin guardar los registros
+        (carga al arrancar desde un GROUP BY de PostgreSQL)
+
+        Args:
+            month: (año, mes) o None si los resultados no tienen fecha
+        """
+        if tests <= 0:
+            return
+        if tester_id and tester_name:
+            self._names.setdefault(tester_id, tester_name)
+        self._add_count(tester_id, modalidad or '', month, tests)
+
+    def replace_all(self, resultados):
+        """Sustituye todo el historial (p. ej. al cargar desde PostgreSQL)"""
+        self.resultados[:] = [
+            r if isinstance(r, Resultado) else Resultado.from_dict(r) for r in resultados
+        ]
+        self._reset()
+        for resultado in self.resultados:
+            self._index(resultado)
+
+    def remove_tester(self, tester_id):
+        """Elimina todos los resultados de un tester. Devuelve cuántos se quitaron"""
+        keys = set(self._by_tester.get(tester_id, ()))
+        removed_ids = {id(self._unindex(key)) for key in keys}
+        if removed_ids:
+            self.resultados[:] = [r for r in self.resultados if id(r) not in removed_ids]
+
+        # Lo que queda del tester son tests agregados (sin registro en memoria)
+        buckets = self._tester_buckets.get(tester_id)
+        aggregated = 0
+        for (modalidad, month), tests in list(buckets.items()) if buckets else ():
+            self._add_count(tester_id, modalidad, month, -tests)
+            aggregated += tests
+
+        self._names.pop(tester_id, None)
+        return len(keys) + aggregated
+
+    # === CONSULTAS ===
+    def __len__(self):
+        """Número total de tests (registros en memoria + agregados)"""
+        return sum(self._mode_totals.values())
+
+    def count(self, modalidad=OVERALL, month=None, tester_id=None):
+        """Número de tests (de un tester o de todos) en una modalidad y mes"""
+        counter = self._counts.get((modalidad, month))
+        if not counter:
+            return 0
+        if tester_id is not None:
+            return counter.get(tester_id, 0)
+        return sum(counter.values())
+
+    def top_testers(self, modalidad=OVERALL, month=None, limit=10):
+        """
+        Top de testers por número de tests (O(k log k) sobre testers)
+
+        Args:
+            modalidad: Modalidad o 'Overall'
+            month: (año, mes) o None para el histórico completo
+            limit: Número de testers a devolver
+
+        Returns:
+            list: [(tester_id, nombre, tests), ...] de mayor a menor
+        """
+        counter = self._counts.get((modalidad, month))
+        if not counter:
+            return []
+        return [
+            (tester_id, self._names.get(tester_id, 'Unknown'), count)
+            for tester_id, count in counter.most_common(limit)
+        ]
+
+    def tests_by_mode(self):
+        """Número de tests por modalidad"""
+        return dict(self._mode_totals)
+
+    def by_tester(self, tester_id):
+        """Resultados de un tester"""
+        return [self._records[key] for key in sorted(self._by_tester.get(tester_id, ()))]
+
+    def by_mode(self, modalidad):
+        """Resultados de una modalidad"""
+        return [self._records[key] for key in sorted(self._by_mode.get(modalidad, ()))]
+
+    def by_month(self, year, month):
+        """Resultados de un mes concreto"""
+        return [self._records[key] for key in sorted(self._by_month.get((year, month), ()))]
+
+    def fecha(self, resultado):
+        """Fecha (datetime) de un resultado del store"""
+        return from_epoch(resultado.fecha)
+
+def _discard(index, value, key):
+    keys = index.get(value)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+def _bump(counter, key, delta):
+    counter[key] += delta
+    if counter[key] <= 0:
+        del counter[key]
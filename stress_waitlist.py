@@ -0,0 +1,293 @@
+"""
+Prueba de carga de las waitlists de Papayas Tierlist
+Lanza miles de clics simulados (Join / Leave / Tester / Next) a la vez contra
+los botones reales de WaitlistView, con latencia aleatoria en cada llamada a
+Discord, y comprueba que las colas no se corrompen:
+
+  - Ningún jugador es llamado dos veces por Next
+  - Si Next falla antes de crear el ticket, el jugador vuelve a la cola
+  - Ninguna cola supera MAX_QUEUE_SIZE (salvo por los jugadores devueltos a ella)
+  - Cola final = unidos - salidos - llamados
+  - El journal reproducido coincide con el estado en memoria
+
+Uso (con las dependencias del bot instaladas, sin conectarse a Discord):
+    python stress_waitlist.py
+    python stress_waitlist.py --players 5000 --modes 8 --max-queue 500 --latency-ms 20
+
+Trabaja sobre un data.json temporal (DATA_FILE), nunca sobre el real.
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# === ARGUMENTOS ===
+parser = argparse.ArgumentParser(description="Prueba de carga de las waitlists")
+parser.add_argument('--players', type=int, default=2000, help="Jugadores (Join) por modalidad")
+parser.add_argument('--testers', type=int, default=5, help="Testers por modalidad")
+parser.add_argument('--nexts', type=int, default=None, help="Clics de Next por modalidad (por defecto players/2)")
+parser.add_argument('--leaves', type=int, default=None, help="Clics de Leave por modalidad (por defecto players/4)")
+parser.add_argument('--modes', type=int, default=4, help="Modalidades en paralelo")
+parser.add_argument('--max-queue', type=int, default=200, help="MAX_QUEUE_SIZE durante la prueba")
+parser.add_argument('--latency-ms', type=float, default=5.0, help="Latencia máxima simulada por llamada a Discord")
+parser.add_argument('--spread-ms', type=float, default=3000.0, help="Ventana en la que llegan todos los clics")
+parser.add_argument('--fail-rate', type=float, default=0.02, help="Probabilidad de que falle el defer o la creación del canal en Next")
+parser.add_argument('--seed', type=int, default=None)
+args = parser.parse_args()
+
+# Entorno aislado ANTES de importar el bot
+_tmp_dir = tempfile.mkdtemp(prefix="papayas-stress-")
+atexit.register(shutil.rmtree, _tmp_dir, True)
+os.environ['DATA_FILE'] = os.path.join(_tmp_dir, 'waitlist_data.json')
+os.environ['MAX_QUEUE_SIZE'] = str(args.max_queue)
+
+import discord_waitlist_bot as bot_module  # noqa: E402
+from discord_waitlist_bot import WaitlistView, data  # noqa: E402
+
+if args.seed is not None:
+    random.seed(args.seed)
+
+async def latency():
+    await asyncio.sleep(random.uniform(0, args.latency_ms) / 1000)
+
+async def flaky():
+    """Latencia y, a veces, un fallo de Discord (Next debe devolver al jugador a la cola)"""
+    await latency()
+    if random.random() < args.fail_rate:
+        raise ConnectionError("fallo simulado de Discord")
+
+# === DISCORD SIMULADO (solo lo que usan los botones) ===
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+
+class FakeUser:
+    def __init__(self, user_id, roles=()):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.roles = list(roles)
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def defer(self, ephemeral=False):
+        await (flaky() if self.interaction.flaky else latency())
+
+    async def send_message(self, content=None, embed=None, ephemeral=False, **kwargs):
+        await latency()
+        self.interaction.replies.append(content)
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, embed=None, ephemeral=False, **kwargs):
+        await latency()
+        self.interaction.replies.append(content if content is not None else embed.title)
+
+class FakeChannel:
+    _ids = iter(range(10_000_000, 10**12))
+
+    def __init__(self, name):
+        self.id = next(FakeChannel._ids)
+        self.name = name
+        self.mention = f"<#{self.id}>"
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await latency()
+
+class FakeCategory:
+    async def create_text_channel(self, name, overwrites=None):
+        await flaky()
+        return FakeChannel(name)
+
+class FakeGuild:
+    def __init__(self):
+        self.default_role = FakeRole(0)
+        self.me = FakeUser(1)
+        self.category = FakeCategory()
+
+    def get_channel(self, channel_id):
+        return self.category
+
+class FakeMessage:
+    def __init__(self, message_id):
+        self.id = message_id
+        self.edits = 0
+
+    async def edit(self, embed=None, **kwargs):
+        await latency()
+        self.edits += 1
+
+class FakeInteraction:
+    def __init__(self, user, guild, message, flaky=False):
+        self.user = user
+        self.guild = guild
+        self.message = message
+        self.flaky = flaky
+        self.replies = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+# === PRUEBA ===
+def called():
+    """Jugadores con ticket creado por Next (los ids no se repiten entre modalidades)"""
+    return [ticket.jugador_id for ticket in data['tickets'].values()]
+
+requeued = Counter()   # Jugadores devueltos a la cola por un Next fallido, por modalidad
+
+async def fake_resolve(user_id):
+    await latency()
+    return FakeUser(int(user_id))
+
+def patch_bot():
+    """Sin red: usuarios, DMs y paneles no salen del proceso"""
+    bot_module.users.resolve = fake_resolve
+    bot_module.notifier.enqueue = lambda *a, **k: True
+    bot_module.panel_renderer.interval = 0.05
+
+    requeue = WaitlistView._devolver_a_la_cola
+    async def counting_requeue(view, user_id):
+        requeued[view.modo] += 1
+        await requeue(view, user_id)
+    WaitlistView._devolver_a_la_cola = counting_requeue
+    data['config']['ticket_category_id'] = 1
+
+async def arrive(kind, coro):
+    """Cada clic llega en un momento aleatorio de la ventana (Next, cuando ya hay cola)"""
+    start = args.spread_ms / 3 if kind == 'next' else 0
+    await asyncio.sleep(random.uniform(start, args.spread_ms) / 1000)
+    return await coro
+
+async def run_mode(modo, guild, base_id):
+    view = WaitlistView(modo)
+    message = FakeMessage(base_id)
+    tester_role = FakeRole(bot_module.TESTER_ROLES_POR_MODALIDAD.get(modo, bot_module.TESTER_ROLE_ID))
+    testers = [FakeUser(base_id + i, [tester_role]) for i in range(1, args.testers + 1)]
+    players = [FakeUser(base_id + 100_000 + i) for i in range(args.players)]
+
+    def click(handler, user):
+        interaction = FakeInteraction(user, guild, message, flaky=handler is WaitlistView.next_button)
+        return interaction, handler(view, interaction, None)
+
+    # Abrir la waitlist y poner a los testers en turno
+    if not data['waitlists'][modo]['active']:
+        _, coro = click(WaitlistView.toggle_button, testers[0])
+        await coro
+    await asyncio.gather(*(click(WaitlistView.tester_button, t)[1] for t in testers))
+
+    nexts = args.players // 2 if args.nexts is None else args.nexts
+    leaves = args.players // 4 if args.leaves is None else args.leaves
+    clicks = [('join', click(WaitlistView.join_button, p)) for p in players]
+    clicks += [('leave', click(WaitlistView.leave_button, random.choice(players))) for _ in range(leaves)]
+    clicks += [('next', click(WaitlistView.next_button, random.choice(testers))) for _ in range(nexts)]
+    random.shuffle(clicks)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(arrive(kind, coro) for kind, (_, coro) in clicks), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    joined = {str(i.user.id) for kind, (i, _) in clicks
+              if kind == 'join' and any(r and r.startswith("✅ Te has unido") for r in i.replies)}
+    left = {str(i.user.id) for kind, (i, _) in clicks
+            if kind == 'leave' and any(r and r.startswith("✅ Has salido") for r in i.replies)}
+    positions = [int(r.rsplit('#', 1)[1].rstrip('*')) for kind, (i, _) in clicks if kind == 'join'
+                 for r in i.replies if r and r.startswith("✅ Te has unido")]
+    full = sum(1 for kind, (i, _) in clicks if kind == 'join'
+               and any(r and 'llena' in r for r in i.replies))
+    return {
+        'modo': modo,
+        'player_ids': {str(p.id) for p in players},
+        'clicks': len(clicks),
+        'elapsed': elapsed,
+        'errors': errors,
+        'joined': joined,
+        'left': left,
+        'full': full,
+        'max_position': max(positions, default=0),
+        'message': message
+    }
+
+def check(result):
+    """Lista de invariantes rotas para una modalidad"""
+    modo = result['modo']
+    problems = []
+    queue = data['waitlists'][modo]['queue']
+    popped = [uid for uid in called() if uid in result['player_ids']]
+
+    duplicated = [uid for uid, n in Counter(popped).items() if n > 1]
+    if duplicated:
+        problems.append(f"{len(duplicated)} jugadores llamados dos veces por Next")
+    # Un jugador devuelto a la cola recupera su sitio aunque esté llena
+    if len(queue) > args.max_queue + requeued[modo] or result['max_position'] > args.max_queue:
+        problems.append(f"cola por encima de MAX_QUEUE_SIZE ({len(queue)}, pos. máx {result['max_position']})")
+    expected = result['joined'] - result['left'] - set(popped)
+    if set(queue) != expected:
+        problems.append(f"cola final inconsistente: {len(queue)} en cola, {len(expected)} esperados")
+    if result['errors']:
+        problems.append(f"{len(result['errors'])} excepciones, p. ej. {result['errors'][0]!r}")
+    return problems
+
+def check_journal():
+    """Reproduce snapshot + journal y compara con el estado en memoria"""
+    bot_module.journal.flush()
+    replayed, _ = bot_module.journal.load()
+    problems = []
+    for modo, waitlist in data['waitlists'].items():
+        on_disk = (replayed.get('waitlists', {}).get(modo) or {}).get('queue', [])
+        if list(on_disk) != waitlist['queue'].to_list():
+            problems.append(f"{modo}: el journal no coincide con la cola en memoria")
+    return problems
+
+async def main():
+    modes = list(bot_module.GAME_MODES)[:args.modes]
+    guild = FakeGuild()
+    patch_bot()
+
+    print(f"🔥 {len(modes)} modalidades x ({args.players} joins + Leave/Next) "
+          f"| MAX_QUEUE_SIZE={args.max_queue} | latencia ≤ {args.latency_ms} ms")
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_mode(modo, guild, 1_000_000 * (n + 1)) for n, modo in enumerate(modes)
+    ))
+    total = time.perf_counter() - started
+
+    # Dejar que los paneles terminen su última edición
+    await asyncio.sleep(bot_module.panel_renderer.interval * 2 + args.latency_ms / 1000)
+
+    failed = False
+    for result in results:
+        problems = check(result)
+        failed = failed or bool(problems)
+        status = "✅" if not problems else "❌"
+        print(f"{status} {result['modo']:8} {result['clicks']:6} clics en {result['elapsed']:.2f}s | "
+              f"unidos {len(result['joined'])}, llena {result['full']}, salidos {len(result['left'])}, "
+              f"llamados {sum(1 for uid in called() if uid in result['player_ids'])}, devueltos {requeued[result['modo']]}, en cola {len(data['waitlists'][result['modo']]['queue'])} | "
+              f"ediciones del panel {result['message'].edits}")
+        for problem in problems:
+            print(f"   - {problem}")
+
+    journal_problems = check_journal()
+    failed = failed or bool(journal_problems)
+    for problem in journal_problems:
+        print(f"❌ {problem}")
+
+    print(f"🔒 Locks: {bot_module.waitlist_locks.metrics()}")
+    print(f"🖼️ Paneles: {bot_module.panel_renderer.metrics()}")
+    print(f"⏱️ Total: {sum(r['clicks'] for r in results)} clics en {total:.2f}s")
+    print("✅ Sin corrupción" if not failed else "❌ Se encontraron inconsistencias")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,189 @@
+"""
+Transcripts de tickets para Papayas Tierlist
+Escribe los mensajes de un ticket de forma incremental en un .zip,
+comprimiendo en un hilo aparte y con memoria acotada (se vuelca a disco
+si el transcript es muy largo)
+"""
+
+import asyncio
+import html
+import json
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+FORMAT_TXT = 'txt'
+FORMAT_JSON = 'json'
+FORMAT_HTML = 'html'
+FORMATS = (FORMAT_TXT, FORMAT_JSON, FORMAT_HTML)
+
+MAX_MEMORY_BYTES = 4 * 1024 * 1024  # A partir de aquí el .zip se escribe en disco
+CHUNK_BYTES = 64 * 1024             # Tamaño de cada bloque enviado al compresor
+
+# La compresión (zlib) nunca corre en el event loop
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="transcript")
+
+def message_from_discord(msg):
+    """Convierte un discord.Message al dict que usa el writer"""
+    return {
+        'timestamp': msg.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'author': msg.author.name,
+        'content': msg.content if msg.content else "[Sin texto]",
+        'attachments': [att.url for att in msg.attachments]
+    }
+
+class TranscriptWriter:
+    """
+    Writer incremental de transcripts comprimidos
+
+    Uso:
+        writer = TranscriptWriter("Ticket", [("Jugador", "x")], fmt='txt')
+        await writer.start()
+        await writer.add_message({...})
+        zip_file = await writer.finish()   # archivo listo para discord.File
+    """
+
+    def __init__(self, title, meta, fmt=FORMAT_TXT, entry_name='transcript'):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato de transcript no soportado: {fmt}")
+        self.title = title
+        self.meta = list(meta)
+        self.fmt = fmt
+        self.entry_name = f"{entry_name}.{fmt}"
+        self.message_count = 0
+
+        self._file = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_BYTES)
+        self._zip = None
+        self._entry = None
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    # === CICLO DE VIDA ===
+    async def start(self):
+        await self._run(self._open_entry)
+        self._write(self._render_header())
+
+    async def add_message(self, message):
+        self._write(self._render_message(message))
+        self.message_count += 1
+        if self._buffer_bytes >= CHUNK_BYTES:
+            await self._flush()
+
+    async def finish(self):
+        """Cierra el .zip y devuelve el archivo posicionado al inicio"""
+        self._write(self._render_footer())
+        await self._flush()
+        await self._run(self._close_entry)
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        """Libera el archivo temporal (si no se llegó a enviar)"""
+        self._file.close()
+
+    # === COMPRESIÓN EN HILO ===
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+
+    def _open_entry(self):
+        self._zip = zipfile.ZipFile(self._file, 'w', zipfile.ZIP_DEFLATED)
+        self._entry = self._zip.open(self.entry_name, 'w')
+
+    def _close_entry(self):
+        self._entry.close()
+        self._zip.close()
+
+    def _write(self, text):
+        encoded = text.encode('utf-8')
+        self._buffer.append(encoded)
+        self._buffer_bytes += len(encoded)
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        chunk = b''.join(self._buffer)
+        self._buffer = []
+        self._buffer_bytes = 0
+        await self._run(self._entry.write, chunk)
+
+    # === FORMATOS ===
+    def _render_header(self):
+        if self.fmt == FORMAT_JSON:
+            meta = {label: value for label, value in self.meta}
+            header = json.dumps({'title': self.title, 'meta': meta}, ensure_ascii=False, default=str)
+            # Abrir el objeto y la lista de mensajes; se cierran en el footer
+            return header[:-1] + ', "messages": ['
+
+        if self.fmt == FORMAT_HTML:
+            rows = "".join(
+                f"<dt>{html.escape(str(label))}</dt><dd>{html.escape(str(value))}</dd>"
+                for label, value in self.meta
+            )
+            return (
+                "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+                f"<title>{html.escape(self.title)}</title>"
+                "<style>body{font-family:sans-serif}.msg{margin:8px 0}"
+                ".ts{color:#888}.author{font-weight:bold}</style></head><body>"
+                f"<h1>{html.escape(self.title)}</h1><dl>{rows}</dl><hr>\n"
+            )
+
+        content = f"{self.title}\n"
+        content += f"{'=' * 70}\n"
+        for label, value in self.meta:
+            content += f"{label}: {value}\n"
+        content += f"{'=' * 70}\n\n"
+        return content
+
+    def _render_message(self, message):
+        if self.fmt == FORMAT_JSON:
+            prefix = ", " if self.message_count else ""
+            return prefix + json.dumps(message, ensure_ascii=False) + "\n"
+
+        if self.fmt == FORMAT_HTML:
+            attachments = "".join(
+                f"<div>📎 <a href=\"{html.escape(url)}\">{html.escape(url)}</a></div>"
+                for url in message.get('attachments', [])
+            )
+            return (
+                "<div class=\"msg\">"
+                f"<span class=\"ts\">[{html.escape(message['timestamp'])}]</span> "
+                f"<span class=\"author\">{html.escape(message['author'])}</span>"
+                f"<div>{html.escape(message['content'])}</div>{attachments}</div>\n"
+            )
+
+        content = f"[{message['timestamp']}] {message['author']}:\n"
+        content += f"  {message['content']}\n"
+        for url in message.get('attachments', []):
+            content += f"  📎 Archivo: {url}\n"
+        content += "\n"
+        return content
+
+    def _render_footer(self):
+        if self.fmt == FORMAT_JSON:
+            return "]}\n"
+        if self.fmt == FORMAT_HTML:
+            return "</body></html>\n"
+        return ""
+
+async def build_transcript_zip(title, meta, messages, fmt=FORMAT_TXT, entry_name='transcript'):
+    """
+    Genera un transcript comprimido a partir de un iterable (o async iterable)
+    de mensajes, p. ej. channel.history(...) que pagina de 100 en 100
+
+    Returns:
+        tuple: (archivo .zip listo para enviar, número de mensajes)
+    """
+    writer = TranscriptWriter(title, meta, fmt=fmt, entry_name=entry_name)
+    try:
+        await writer.start()
+        if hasattr(messages, '__aiter__'):
+            async for message in messages:
+                await writer.add_message(message)
+        else:
+            for message in messages:
+                await writer.add_message(message)
+        return await writer.finish(), writer.message_count
+    except Exception:
+        writer.close()
+        raise
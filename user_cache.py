@@ -0,0 +1,106 @@
+"""
+Resolución de usuarios de Discord para Papayas Tierlist
+Busca primero en la caché del gateway (miembros y usuarios ya conocidos),
+después en una LRU con TTL de usuarios descargados, y solo entonces hace
+fetch_user, agrupando las peticiones concurrentes por el mismo id
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+def mention(user_id):
+    """Mención clicable a partir del id, sin llamar a la API"""
+    return f"<@{user_id}>"
+
+class UserResolver:
+    """
+    Uso:
+        users = UserResolver(bot)
+        user = await users.resolve(user_id)            # None si no existe
+        found = await users.resolve_many(ids)          # {id: user}
+    """
+
+    def __init__(self, bot, ttl=900, max_entries=2048, max_concurrency=5):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()      # id -> (user, expira)
+        self._inflight = {}              # id -> Future del fetch en curso
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Métricas
+        self.gateway_hits = 0
+        self.cache_hits = 0
+        self.fetches = 0
+
+    def cached(self, user_id):
+        """Usuario sin tocar la API (gateway o LRU), o None"""
+        user_id = int(user_id)
+
+        user = self.bot.get_user(user_id)
+        if user is None:
+            for guild in self.bot.guilds:
+                user = guild.get_member(user_id)
+                if user is not None:
+                    break
+        if user is not None:
+            self.gateway_hits += 1
+            return user
+
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            user, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._cache.move_to_end(user_id)
+                self.cache_hits += 1
+                return user
+            del self._cache[user_id]
+        return None
+
+    async def resolve(self, user_id):
+        """Usuario por id: caché primero, fetch_user solo si hace falta (None si no existe)"""
+        user_id = int(user_id)
+        user = self.cached(user_id)
+        if user is not None:
+            return user
+
+        # Si ya hay un fetch en vuelo para este id, esperar ese mismo
+        future = self._inflight.get(user_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            async with self._semaphore:
+                self.fetches += 1
+                user = await self.bot.fetch_user(user_id)
+            self._store(user_id, user)
+        except Exception as e:
+            print(f"⚠️ No se pudo obtener el usuario {user_id}: {e}")
+            user = None
+        finally:
+            del self._inflight[user_id]
+            future.set_result(user)
+        return user
+
+    async def resolve_many(self, user_ids):
+        """{id: usuario} resolviendo en paralelo solo los que no están en caché"""
+        ids = list(dict.fromkeys(int(uid) for uid in user_ids))
+        users = await asyncio.gather(*(self.resolve(uid) for uid in ids))
+        return {uid: user for uid, user in zip(ids, users) if user is not None}
+
+    def _store(self, user_id, user):
+        self._cache[user_id] = (user, time.monotonic() + self.ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def metrics(self):
+        return {
+            'cached': len(self._cache),
+            'gateway_hits': self.gateway_hits,
+            'cache_hits': self.cache_hits,
+            'fetches': self.fetches
+        }
@@ -0,0 +1,248 @@
+"""
+Cola de la waitlist para Papayas Tierlist
+Orden de llegada con índice: entrar, salir, sacar al primero y comprobar si
+alguien está en la cola en O(1), y la posición de un jugador en O(log n)
+(árbol de Fenwick sobre el orden de llegada). En JSON sigue siendo una lista
+
+Cada modalidad tiene además su propio asyncio.Lock: las comprobaciones y
+mutaciones de una waitlist se serializan sin frenar a las demás modalidades
+"""
+
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+
+_MIN_CAPACITY = 64
+
+class WaitlistQueue:
+    """
+    data['waitlists'][modalidad]['queue']
+
+    Cada jugador recibe un número de llegada creciente; el árbol de Fenwick
+    cuenta cuántos de esos números siguen ocupados, así la posición es la
+    suma de prefijos hasta el suyo. Cuando los números se agotan se
+    renumeran los que quedan (coste amortizado O(1) por operación).
+
+    Uso:
+        queue = WaitlistQueue(["123", "456"])
+        queue.append("789")
+        "456" in queue            # True
+        queue.position("789")     # 3
+        queue.popleft()           # "123"
+        queue.to_list()           # ["456", "789"]
+    """
+
+    __slots__ = ('_order', '_tree', '_next')
+
+    def __init__(self, items=()):
+        self._order = OrderedDict()   # jugador_id -> número de llegada
+        self._rebuild(dict.fromkeys(items))
+
+    # === ÁRBOL DE FENWICK ===
+    def _rebuild(self, user_ids):
+        """Renumera 1..n y reconstruye el árbol en O(n)"""
+        user_ids = list(user_ids)
+        capacity = max(_MIN_CAPACITY, 2 * len(user_ids))
+        tree = [0] * (capacity + 1)
+        self._order = OrderedDict()
+        for slot, user_id in enumerate(user_ids, 1):
+            self._order[user_id] = slot
+            tree[slot] = 1
+        for slot in range(1, capacity + 1):
+            parent = slot + (slot & -slot)
+            if parent <= capacity:
+                tree[parent] += tree[slot]
+        self._tree = tree
+        self._next = len(user_ids) + 1
+
+    def _update(self, slot, delta):
+        tree = self._tree
+        while slot < len(tree):
+            tree[slot] += delta
+            slot += slot & -slot
+
+    def _prefix(self, slot):
+        total = 0
+        tree = self._tree
+        while slot > 0:
+            total += tree[slot]
+            slot -= slot & -slot
+        return total
+
+    # === OPERACIONES ===
+    def append(self, user_id):
+        """Añade al final. Devuelve False si ya estaba en la cola"""
+        if user_id in self._order:
+            return False
+        if self._next >= len(self._tree):
+            self._rebuild(self._order)
+        slot = self._next
+        self._next += 1
+        self._order[user_id] = slot
+        self._update(slot, 1)
+        return True
+
+    def appendleft(self, user_id):
+        """
+        Pone a un jugador el primero (p. ej. si falló su llamada con Next).
+        Devuelve False si ya estaba en la cola
+        """
+        if user_id in self._order:
+            return False
+        first = self.peek()
+        slot = 0 if first is None else self._order[first] - 1
+        if slot < 1:
+            # No queda hueco delante: renumerar con el jugador al principio
+            self._rebuild([user_id, *self._order])
+            return True
+        self._order[user_id] = slot
+        self._order.move_to_end(user_id, last=False)
+        self._update(slot, 1)
+        return True
+
+    def popleft(self):
+        """Saca al primero de la cola (IndexError si está vacía)"""
+        if not self._order:
+            raise IndexError("pop from empty WaitlistQueue")
+        user_id, slot = self._order.popitem(last=False)
+        self._update(slot, -1)
+        return user_id
+
+    def pop(self, index=0):
+        """Compatibilidad con list.pop: solo el primero (0) o el último (-1)"""
+        if index == 0:
+            return self.popleft()
+        if index == -1:
+            if not self._order:
+                raise IndexError("pop from empty WaitlistQueue")
+            user_id, slot = self._order.popitem(last=True)
+            self._update(slot, -1)
+            return user_id
+        raise IndexError("WaitlistQueue solo admite pop(0) y pop(-1)")
+
+    def remove(self, user_id):
+        """Quita a un jugador de cualquier posición (ValueError si no está, como list)"""
+        slot = self._order.pop(user_id, None)
+        if slot is None:
+            raise ValueError(f"{user_id} no está en la cola")
+        self._update(slot, -1)
+
+    def discard(self, user_id):
+        """Como remove() pero devuelve False en vez de fallar"""
+        if user_id not in self._order:
+            return False
+        self.remove(user_id)
+        return True
+
+    def position(self, user_id):
+        """Posición 1-based del jugador, o None si no está en la cola"""
+        slot = self._order.get(user_id)
+        return None if slot is None else self._prefix(slot)
+
+    def peek(self):
+        """Primero de la cola sin sacarlo (None si está vacía)"""
+        return next(iter(self._order), None)
+
+    def clear(self):
+        self._rebuild(())
+
+    def to_list(self):
+        return list(self._order)
+
+    def __contains__(self, user_id):
+        return user_id in self._order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __bool__(self):
+        return bool(self._order)
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __eq__(self, other):
+        if isinstance(other, WaitlistQueue):
+            return self.to_list() == other.to_list()
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"WaitlistQueue({self.to_list()!r})"
+
+def new_waitlist():
+    """Waitlist vacía de una modalidad"""
+    return {'active': False, 'queue': WaitlistQueue(), 'testers': []}
+
+def load_waitlists(waitlists, game_modes=()):
+    """
+    {modalidad: {'queue': [...]}} del JSON -> colas WaitlistQueue
+    (duplicados de versiones antiguas se descartan conservando el primero)
+    """
+    result = {}
+    for mode, waitlist in (waitlists or {}).items():
+        if not isinstance(waitlist, dict):
+            continue
+        waitlist = dict(waitlist)
+        waitlist.setdefault('active', False)
+        waitlist.setdefault('testers', [])
+        queue = waitlist.get('queue') or []
+        waitlist['queue'] = queue if isinstance(queue, WaitlistQueue) else WaitlistQueue(queue)
+        result[mode] = waitlist
+    for mode in game_modes:
+        result.setdefault(mode, new_waitlist())
+    return result
+
+class WaitlistLocks:
+    """
+    Un asyncio.Lock por modalidad
+
+    La sección crítica debe ser corta: comprobar y mutar data['waitlists']
+    (y registrar en el journal). Las llamadas a Discord (defer, followup,
+    crear canales) van fuera del lock para que una ráfaga de clics en una
+    modalidad no espere a la API.
+
+    Uso:
+        waitlist_locks = WaitlistLocks()
+        async with waitlist_locks.hold(modo):
+            ...comprobar y mutar la cola...
+    """
+
+    def __init__(self):
+        self._locks = {}
+
+        # Métricas
+        self.acquisitions = 0
+        self.contended = 0
+        self.max_wait_ms = 0.0
+
+    def __getitem__(self, modo):
+        lock = self._locks.get(modo)
+        if lock is None:
+            lock = self._locks[modo] = asyncio.Lock()
+        return lock
+
+    @contextlib.asynccontextmanager
+    async def hold(self, modo):
+        lock = self[modo]
+        self.acquisitions += 1
+        if lock.locked():
+            self.contended += 1
+            start = time.perf_counter()
+            async with lock:
+                self.max_wait_ms = max(self.max_wait_ms, (time.perf_counter() - start) * 1000)
+                yield
+        else:
+            async with lock:
+                yield
+
+    def metrics(self):
+        return {
+            'modes': len(self._locks),
+            'locked': sorted(modo for modo, lock in self._locks.items() if lock.locked()),
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'max_wait_ms': round(self.max_wait_ms, 3)
+        }